@@ -0,0 +1,188 @@
+"""
+Escrita em segundo plano (write-behind) das mutações enviadas ao backend.
+
+As mutações geradas pelas mensagens do chat são enfileiradas e enviadas em
+lotes, como um único documento graphql com uma mutação apelidada (alias)
+por item, sem que o processamento das mensagens precise esperar.
+"""
+import copy
+import asyncio
+import logging
+from collections import Counter, deque
+from core.external_requests import backend_client
+from luci.settings import (WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL,
+                           WRITE_BEHIND_MAX_PENDING)
+
+log = logging.getLogger()
+
+
+def merge_mutations(documents):
+    """
+    Combina documentos gql de mutação em um único documento, apelidando cada
+    campo raiz como m0, m1, ... na ordem recebida.
+
+    param : documents : <list> : documentos gql de mutação;
+    return : <Document>
+    """
+    fields = []
+    for document in documents:
+        for field in document.definitions[0].selection_set.selections:
+            field = copy.copy(field)
+            field.alias = type(field.name)(value=f'm{len(fields)}')
+            fields.append(field)
+
+    # copia a estrutura do primeiro documento preservando os tipos dos nós
+    first = documents[0]
+    operation = copy.copy(first.definitions[0])
+    selection_set = copy.copy(operation.selection_set)
+    selection_set.selections = type(selection_set.selections)(fields)
+    operation.selection_set = selection_set
+    operation.name = None
+
+    merged = copy.copy(first)
+    merged.definitions = type(first.definitions)([operation])
+
+    return merged
+
+
+class MutationBatcher:
+    """
+    Fila write-behind de mutações.
+
+    Os lotes são enviados quando a fila atinge `batch_size` itens ou a cada
+    `flush_interval` segundos, e também no encerramento do bot. A fila guarda
+    no máximo `max_pending` mutações: se o backend não acompanhar, as mais
+    antigas são descartadas e contabilizadas.
+
+    Um lote rejeitado por inteiro (uma mutação inválida invalida o documento)
+    é dividido ao meio e reenviado, até isolar a mutação inválida. Só as
+    mutações executadas sem erro contam como enviadas.
+    """
+    def __init__(self, client, batch_size=WRITE_BEHIND_BATCH_SIZE,
+                 flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+                 max_pending=WRITE_BEHIND_MAX_PENDING):
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.stats = Counter()
+        self._task = None
+        self._wakeup = None
+        self._lock = None
+
+    def put(self, document):
+        """
+        Enfileira uma mutação. Deve ser chamado de dentro do event loop.
+        """
+        if len(self.pending) >= self.max_pending:
+            self.pending.popleft()
+            self.stats['dropped'] += 1
+            log.warning('Write-behind queue is full, dropping oldest mutation')
+
+        self.pending.append(document)
+        self.stats['queued'] += 1
+        self._ensure_running()
+
+        if len(self.pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """
+        Envia todas as mutações pendentes, em lotes de até `batch_size`.
+        """
+        if self._lock is None:
+            return
+
+        async with self._lock:
+            while self.pending:
+                size = min(self.batch_size, len(self.pending))
+                batch = [self.pending.popleft() for _ in range(size)]
+                await self._send(batch)
+
+    async def _send(self, batch):
+        try:
+            response = await self.client.post(merge_mutations(batch))
+        except Exception as err:
+            if getattr(err, 'status', None) == 400 and len(batch) > 1:
+                # documento rejeitado pelo servidor: reenviado em partes
+                await self._split(batch)
+                return
+            self.stats['failed_flushes'] += 1
+            self.stats['lost'] += len(batch)
+            log.error('Write-behind flush of %d mutations failed: %s', len(batch), err)
+            return
+
+        errors = response.get('errors') or []
+        if errors and response.get('data') is None:
+            # o documento inteiro é validado antes de ser executado: uma
+            # mutação inválida impede todas as outras do lote
+            if len(batch) > 1:
+                await self._split(batch)
+                return
+            self.stats['rejected'] += 1
+            self.stats['mutation_errors'] += len(errors)
+            log.error('Write-behind mutation rejected: %s', errors[0].get('message'))
+            return
+
+        self.stats['flushes'] += 1
+
+        # cada erro aponta, pelo alias, qual mutação do lote falhou
+        owners = [
+            i for i, document in enumerate(batch)
+            for _ in document.definitions[0].selection_set.selections
+        ]
+        failed = set()
+        self.stats['mutation_errors'] += len(errors)
+        for error in errors:
+            alias = str((error.get('path') or ['?'])[0])
+            log.error('Write-behind mutation %s failed: %s', alias, error.get('message'))
+            if alias[1:].isdigit() and int(alias[1:]) < len(owners):
+                failed.add(owners[int(alias[1:])])
+
+        self.stats['sent'] += len(batch) - len(failed)
+
+    async def _split(self, batch):
+        """
+        Reenvia um lote rejeitado em duas metades, isolando a mutação
+        inválida sem perder as demais.
+        """
+        self.stats['split_flushes'] += 1
+        middle = len(batch) // 2
+        await self._send(batch[:middle])
+        await self._send(batch[middle:])
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['pending'] = len(self.pending)
+        return stats
+
+    async def close(self):
+        """
+        Interrompe o envio periódico e envia o que estiver pendente.
+        """
+        if self._task is not None:
+            # aguarda um envio em andamento antes de interromper a tarefa
+            async with self._lock:
+                self._task.cancel()
+
+        await self.flush()
+
+
+mutation_batcher = MutationBatcher(backend_client)
@@ -0,0 +1,252 @@
+"""
+Benchmarks executados pelo manage.py.
+"""
+import sys
+import json
+from random import Random
+from timeit import timeit
+from core.types import CompressedDict
+
+WORDS = ('oi', 'tudo', 'bem', 'luci', 'hoje', 'jogo', 'acho', 'que', 'não',
+         'sim', 'kkkk', 'alguém', 'vamos', 'jogar', 'mais', 'tarde', 'quem',
+         'ganhou', 'ontem', 'sério', 'isso', 'muito', 'bom', 'ruim', 'pizza')
+
+
+def sample_guild_memories(amount=100, seed=42):
+    """
+    Gera memórias de curto prazo de servers com o formato e o tamanho das
+    memórias reais: as últimas 10 mensagens do chat e os últimos 10 quotes.
+    """
+    rng = Random(seed)
+    authors = [f'membro_{i}' for i in range(20)]
+
+    def sentence(min_size, max_size):
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(min_size, max_size)))
+
+    return [{
+        'last_message_dt': f'2021-06-{rng.randint(10, 30)} 20:13:41.532000',
+        'last_quotes': [sentence(4, 16) for _ in range(10)],
+        'chat_log': [
+            {'author': rng.choice(authors), 'text': sentence(2, 30)}
+            for _ in range(10)
+        ]
+    } for _ in range(amount)]
+
+
+def redis_memory_usage(values):
+    """
+    Retorna o total de bytes ocupados no redis pelos valores, ou None caso o
+    redis não esteja acessível.
+    """
+    from redis.exceptions import RedisError
+    from core.short_memory import get_redis
+
+    redis = get_redis()
+    keys = [f'benchmark:compressed_dict:{i}' for i in range(len(values))]
+    try:
+        for key, value in zip(keys, values):
+            redis.set(key, value)
+        return sum(redis.memory_usage(key) for key in keys)
+    except RedisError:
+        return None
+    finally:
+        try:
+            redis.delete(*keys)
+        except RedisError:
+            pass
+
+
+def benchmark_compressed_dict(repeat=20):
+    """
+    Compara o json puro usado anteriormente com o codec do CompressedDict em
+    tamanho, memória ocupada no redis e tempo de codificação/decodificação.
+    """
+    memories = sample_guild_memories()
+    codecs = {
+        'json (legacy)': (
+            lambda data: json.dumps(data).encode('utf-8'),
+            lambda value: json.loads(value.decode('utf-8'))
+        ),
+        'CompressedDict': (CompressedDict.encode, CompressedDict.decode),
+    }
+
+    sys.stdout.write(f'{len(memories)} guild memories, {repeat} rounds\n\n')
+    sys.stdout.write(f'{"codec":<16}{"bytes":>10}{"redis":>10}{"encode µs":>12}{"decode µs":>12}\n')
+    for name, (encode, decode) in codecs.items():
+        values = [encode(memory) for memory in memories]
+        assert all(decode(value) == memory for value, memory in zip(values, memories))
+
+        total = repeat * len(memories)
+        encode_time = timeit(lambda: [encode(m) for m in memories], number=repeat)
+        decode_time = timeit(lambda: [decode(v) for v in values], number=repeat)
+        redis_bytes = redis_memory_usage(values)
+
+        sys.stdout.write(
+            f'{name:<16}{sum(map(len, values)):>10}'
+            f'{redis_bytes if redis_bytes is not None else "-":>10}'
+            f'{encode_time / total * 1e6:>12.1f}{decode_time / total * 1e6:>12.1f}\n'
+        )
+
+
+def benchmark_intentions(amount=2000, seed=42):
+    """
+    Compara, em microssegundos por mensagem, a classificação de intenções
+    pelos modelos sklearn (global + específico) com o classificador fundido,
+    verificando se as previsões são iguais.
+    """
+    import numpy as np
+    from core.classifiers import (get_global_intention, SPECIFIC_CLASSIFIERS,
+                                  classify_vector, get_fused_classifier)
+
+    # o custo da classificação não depende do conteúdo dos vetores
+    rng = np.random.RandomState(seed)
+    vectors = rng.normal(0, 1.5, (amount, 96)).astype(np.float32)
+
+    def sklearn_predict(vector):
+        global_intention = get_global_intention(vector)
+        return global_intention, SPECIFIC_CLASSIFIERS[global_intention](vector)
+
+    mismatches = sum(
+        sklearn_predict(vector) != classify_vector(vector) for vector in vectors
+    )
+    sklearn_time = timeit(lambda: [sklearn_predict(v) for v in vectors], number=1)
+    fused_time = timeit(lambda: [classify_vector(v) for v in vectors], number=1)
+
+    sys.stdout.write(f'{amount} messages\n\n')
+    sys.stdout.write(f'sklearn: {sklearn_time / amount * 1e6:.1f} µs/message\n')
+    sys.stdout.write(f'fused:   {fused_time / amount * 1e6:.1f} µs/message\n')
+    sys.stdout.write(f'mismatches: {mismatches}\n')
+    if get_fused_classifier() is not None:
+        sys.stdout.write(f'fused stats: {get_fused_classifier().get_stats()}\n')
+
+
+def benchmark_intentions_batch(path='core/training/json/intentions/global_intentions/'):
+    """
+    Compara, em textos por segundo, a classificação de intenções texto a
+    texto com a classificação em lote, sobre os textos de treino.
+    """
+    from os import listdir
+    from time import perf_counter
+    from core.classifiers import get_intentions, get_intentions_batch, intention_cache
+
+    texts = []
+    for dataset in listdir(path):
+        with open(f'{path}{dataset}', 'r') as f:
+            texts.extend(data['text'] for data in json.load(f))
+
+    # aquece o spaCy e os modelos antes das medições
+    get_intentions_batch(texts[:10])
+
+    results = {}
+    for name, run in (
+        ('one by one', lambda: [get_intentions(text) for text in texts]),
+        ('batch', lambda: get_intentions_batch(texts)),
+    ):
+        intention_cache.clear()
+        start = perf_counter()
+        results[name] = run()
+        elapsed = perf_counter() - start
+        sys.stdout.write(f'{name:<12}{len(texts) / elapsed:>10.0f} texts/s\n')
+
+    assert results['one by one'] == results['batch']
+
+
+def benchmark_neighbors(amount=4096, seed=42):
+    """
+    Compara, em microssegundos por consulta e para vários tamanhos de lote,
+    o modelo sklearn de intenções sobre a Luci com a busca de vizinhos por
+    força bruta, verificando se as previsões são iguais.
+    """
+    import numpy as np
+    from core.inference import BruteForceNeighbors
+    from core.model_loader import IntentionClassifierModels
+
+    model = IntentionClassifierModels.MYSELF_INTENTIONS_MODEL
+    backend = BruteForceNeighbors(model)
+
+    # consultas próximas aos vetores de treino, como as mensagens reais
+    rng = np.random.RandomState(seed)
+    points = model._fit_X[rng.randint(0, len(model._fit_X), amount)]
+    queries = (points + rng.normal(0, 0.5, points.shape)).astype(np.float32)
+
+    mismatches = (model.predict(queries.astype(np.float64)) != backend.predict(queries)).sum()
+    sys.stdout.write(f'{len(model._fit_X)} training points, mismatches: {mismatches}\n\n')
+    sys.stdout.write(f'{"batch":>6}{"sklearn µs":>14}{"brute µs":>12}\n')
+    for size in (1, 4, 16, 64, 256):
+        batches = [queries[i:i + size] for i in range(0, min(amount, size * 200), size)]
+        total = sum(len(batch) for batch in batches)
+        sklearn_time = timeit(
+            lambda: [model.predict(b.astype(np.float64)) for b in batches], number=1
+        )
+        brute_time = timeit(lambda: [backend.predict(b) for b in batches], number=1)
+        sys.stdout.write(
+            f'{size:>6}{sklearn_time / total * 1e6:>14.1f}{brute_time / total * 1e6:>12.1f}\n'
+        )
+    sys.stdout.write(f'\nbrute force stats: {backend.get_stats()}\n')
+
+
+def benchmark_generators(replies=200, seed=42):
+    """
+    Compara, em microssegundos por resposta, o `sample` usado no treino com
+    o CharRNNSampler para cada gerador de IntentionResponseGAN, verificando
+    se as respostas sorteadas a partir da mesma semente são iguais.
+    """
+    import numpy as np
+    from core.inference import CharRNNSampler
+    from core.model_loader import IntentionResponseGAN, model_registry
+    from core.training.text_gen import sample
+
+    names = [name for name in vars(IntentionResponseGAN) if name.endswith('_GAN')]
+    sys.stdout.write(f'{replies} replies per model\n\n')
+    sys.stdout.write(
+        f'{"model":<24}{"chars":>7}{"sample µs":>12}{"sampler µs":>12}{"same":>7}\n'
+    )
+    for name in names:
+        model = model_registry.get(name)
+        parameters, chars_to_idx, idx_to_chars = model
+        sampler = CharRNNSampler(model)
+
+        # o sampler sorteia os uniformes da resposta inteira de uma vez, então
+        # a semente é refeita a cada resposta
+        expected, same = [], 0
+        for i in range(replies):
+            np.random.seed(seed + i)
+            expected.append(sample(parameters, idx_to_chars, chars_to_idx, 1000))
+            np.random.seed(seed + i)
+            same += sampler.sample(1000) == expected[-1]
+
+        sample_time = timeit(
+            lambda: sample(parameters, idx_to_chars, chars_to_idx, 1000), number=replies
+        )
+        sampler_time = timeit(lambda: sampler.sample(1000), number=replies)
+        chars = sum(map(len, expected)) / replies
+
+        sys.stdout.write(
+            f'{name:<24}{chars:>7.1f}{sample_time / replies * 1e6:>12.1f}'
+            f'{sampler_time / replies * 1e6:>12.1f}{same:>7}\n'
+        )
+
+
+def benchmark_generators_batch(candidates=10, rounds=50):
+    """
+    Compara, em microssegundos por chamada e para cada gerador, uma
+    resposta com `candidates` respostas geradas em sequência e em lote.
+    """
+    from core.inference import CharRNNSampler
+    from core.model_loader import IntentionResponseGAN, model_registry
+
+    names = [name for name in vars(IntentionResponseGAN) if name.endswith('_GAN')]
+    sys.stdout.write(f'{rounds} rounds, {candidates} candidates\n\n')
+    sys.stdout.write(f'{"model":<24}{"one µs":>10}{"sequential µs":>16}{"batch µs":>12}\n')
+    for name in names:
+        sampler = CharRNNSampler(model_registry.get(name))
+        one_time = timeit(lambda: sampler.sample(1000), number=rounds)
+        sequential_time = timeit(
+            lambda: [sampler.sample(1000) for _ in range(candidates)], number=rounds
+        )
+        batch_time = timeit(lambda: sampler.sample_batch(candidates, 1000), number=rounds)
+
+        sys.stdout.write(
+            f'{name:<24}{one_time / rounds * 1e6:>10.0f}'
+            f'{sequential_time / rounds * 1e6:>16.0f}{batch_time / rounds * 1e6:>12.0f}\n'
+        )
@@ -0,0 +1,177 @@
+"""
+Caches em memória para resultados que se repetem no chat.
+
+O LRUCache guarda os resultados no próprio processo, com tamanho máximo e
+validade opcional. O TieredCache adiciona ao LRUCache uma segunda camada,
+compartilhada no redis, com validade definida.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from time import monotonic
+from redis.exceptions import RedisError
+from core.types import CompressedDict
+from core.short_memory import get_async_redis
+
+log = logging.getLogger()
+
+MISSING = object()
+
+
+def normalize_key(text, casefold=True):
+    """
+    Normaliza um texto para uso como chave de cache, ignorando espaços
+    repetidos e, se `casefold`, a caixa das letras.
+
+    param : text : <str>
+    param : casefold : <bool>
+    return : <str>
+    """
+    text = ' '.join(text.split())
+    return text.lower() if casefold else text
+
+
+def text_digest(text, casefold=True):
+    """
+    Retorna um hash estável do texto normalizado.
+
+    param : text : <str>
+    param : casefold : <bool>
+    return : <str>
+    """
+    key = normalize_key(text, casefold)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """
+    Cache com tamanho máximo, descartando os itens usados há mais tempo.
+    Caso `ttl` seja informado, os itens expiram após `ttl` segundos.
+
+    Pode ser usado tanto no event loop quanto nas threads do executor.
+    """
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = Counter()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        """
+        Retorna o valor guardado para a chave ou `default` (MISSING).
+        """
+        with self._lock:
+            item = self._data.get(key, MISSING)
+            if item is not MISSING and self.ttl and item[1] < monotonic():
+                del self._data[key]
+                self.stats['expired'] += 1
+                item = MISSING
+
+            if item is MISSING:
+                self.stats['misses'] += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return item[0]
+
+    def set(self, key, value):
+        expires_at = monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['size'] = len(self._data)
+        return stats
+
+
+class TieredCache:
+    """
+    Cache em duas camadas: um LRUCache local e, caso `redis_ttl` seja
+    maior que zero, uma camada compartilhada no redis.
+
+    Os valores são gravados no redis com `encode` e lidos com `decode`
+    (por padrão, o codec do CompressedDict). Falhas do redis são
+    contabilizadas e tratadas como ausência do valor.
+
+    Com `blocking_codec`, para valores grandes, `encode` e `decode` rodam no
+    executor padrão do event loop.
+    """
+    def __init__(self, name, maxsize, ttl=None, redis_ttl=0,
+                 encode=CompressedDict.encode, decode=CompressedDict.decode,
+                 blocking_codec=False):
+        self.name = name
+        self.local = LRUCache(maxsize, ttl)
+        self.redis_ttl = redis_ttl
+        self.encode = encode
+        self.decode = decode
+        self.blocking_codec = blocking_codec
+        self.stats = Counter()
+
+    async def _codec(self, func, value):
+        if not self.blocking_codec:
+            return func(value)
+        return await asyncio.get_event_loop().run_in_executor(None, func, value)
+
+    def redis_key(self, key):
+        return f'cache:{self.name}:{key}'
+
+    async def get(self, key):
+        """
+        Retorna o valor guardado para a chave ou None.
+        """
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+
+        if not self.redis_ttl:
+            return None
+
+        try:
+            stored = await get_async_redis().get(self.redis_key(key))
+        except RedisError as err:
+            self.stats['redis_errors'] += 1
+            log.warning('Cache %s: redis read failed: %s', self.name, err)
+            return None
+
+        if stored is None:
+            self.stats['redis_misses'] += 1
+            return None
+
+        self.stats['redis_hits'] += 1
+        value = await self._codec(self.decode, stored)
+        self.local.set(key, value)
+        return value
+
+    async def set(self, key, value):
+        self.local.set(key, value)
+        if not self.redis_ttl:
+            return
+
+        encoded = await self._codec(self.encode, value)
+        try:
+            await get_async_redis().set(self.redis_key(key), encoded, ex=self.redis_ttl)
+        except RedisError as err:
+            self.stats['redis_errors'] += 1
+            log.warning('Cache %s: redis write failed: %s', self.name, err)
+
+    def get_stats(self):
+        stats = self.local.get_stats()
+        stats.update(self.stats)
+        return stats
@@ -1,20 +1,28 @@
 from random import choice
-from core.utils import get_text_vector
+from collections import defaultdict
+import asyncio
+import numpy as np
+from core.context import MessageContext
+from core.utils import run_blocking
 from core.intentions import Intentions
 from core.enums import GlobalIntentions
-from core.output_vectors import intention_responses
-from core.model_loader import IntentionClassifierModels
+from core.output_vectors import intention_responses, response_data
+from core.model_loader import (IntentionClassifierModels, get_model_generation,
+                               model_registry)
+from core.cache import LRUCache, MISSING, text_digest
+from core.inference import (FusedLinearClassifier, BruteForceNeighbors,
+                            is_fusable, is_brute_forceable)
+from luci.settings import INTENTION_CACHE_SIZE, NEIGHBORS_BACKEND
+
+# Intenções já previstas, por geração dos modelos e texto normalizado
+intention_cache = LRUCache(INTENTION_CACHE_SIZE)
+
+# previsões de modelos antigos nunca mais serão lidas
+model_registry.add_reload_listener(intention_cache.clear)
 
 
 def classifiers_map():
-    return {
-        GlobalIntentions.ABOUT_MYSELF: get_myself_intention,
-        GlobalIntentions.ABOUT_MY_PARENTS: get_my_parents_intention,
-        GlobalIntentions.ABOUT_MY_FRIENDS: get_my_friends_intention,
-        GlobalIntentions.STUFF_I_LIKE: get_stuff_i_like_intention,
-        GlobalIntentions.GOOD_INTENTION: get_good_intention,
-        GlobalIntentions.BAD_INTENTION: get_bad_intention
-    }
+    return SPECIFIC_CLASSIFIERS
 
 
 def get_global_intention(text_vector):
@@ -37,7 +45,7 @@ def get_myself_intention(text_vector):
     param : :text_vector : <list>
     return <Enum>
     """
-    recognizer = IntentionClassifierModels.MYSELF_INTENTIONS_MODEL
+    recognizer = get_myself_recognizer()
     return Intentions.about_myself_intentions.get(
         recognizer.predict([text_vector])[0]
     )
@@ -104,7 +112,260 @@ def get_bad_intention(text_vector):
     return Intentions.bad_intentions.get(recognizer.predict([text_vector])[0])
 
 
-def naive_response(text, **kwargs):
+SPECIFIC_CLASSIFIERS = {
+    GlobalIntentions.ABOUT_MYSELF: get_myself_intention,
+    GlobalIntentions.ABOUT_MY_PARENTS: get_my_parents_intention,
+    GlobalIntentions.ABOUT_MY_FRIENDS: get_my_friends_intention,
+    GlobalIntentions.STUFF_I_LIKE: get_stuff_i_like_intention,
+    GlobalIntentions.GOOD_INTENTION: get_good_intention,
+    GlobalIntentions.BAD_INTENTION: get_bad_intention
+}
+
+
+def neighbors_backend(model):
+    """
+    Returns the nearest neighbours backend set on NEIGHBORS_BACKEND for a
+    KNeighborsClassifier model: the vectorized brute force search ("brute")
+    or the sklearn model itself ("sklearn").
+    """
+    if NEIGHBORS_BACKEND == 'brute' and is_brute_forceable(model):
+        return BruteForceNeighbors(model)
+    return model
+
+
+# specific models and label maps of each global intention
+SPECIFIC_MODELS = {
+    GlobalIntentions.ABOUT_MYSELF: (
+        'MYSELF_INTENTIONS_MODEL',
+        Intentions.about_myself_intentions
+    ),
+    GlobalIntentions.ABOUT_MY_PARENTS: (
+        'PARENTS_INTENTION_MODEL',
+        Intentions.about_my_parents_intentions
+    ),
+    GlobalIntentions.ABOUT_MY_FRIENDS: (
+        'FRIENDS_INTENTION_MODEL',
+        Intentions.about_my_friends_intentions
+    ),
+    GlobalIntentions.STUFF_I_LIKE: (
+        'STUFF_I_LIKE_INTENTIONS_MODEL',
+        Intentions.stuff_i_like_intentions
+    ),
+    GlobalIntentions.GOOD_INTENTION: (
+        'GOOD_INTENTIONS_MODEL',
+        Intentions.good_intentions
+    ),
+    GlobalIntentions.BAD_INTENTION: (
+        'BAD_INTENTIONS_MODEL',
+        Intentions.bad_intentions
+    ),
+}
+
+# objects built from the loaded models: {name: (models generation, object)}
+_derived_models = {}
+
+
+def derived_model(name, build):
+    """
+    Returns an object built from the loaded models, building it on the first
+    access and again whenever the models are reloaded.
+
+    param : name : <str>
+    param : build : <function> : builds the object;
+    """
+    generation = get_model_generation()
+    derived = _derived_models.get(name)
+    if derived is None or derived[0] != generation:
+        derived = generation, build()
+        _derived_models[name] = derived
+
+    return derived[1]
+
+
+def get_myself_recognizer():
+    return derived_model(
+        'myself_recognizer',
+        lambda: neighbors_backend(IntentionClassifierModels.MYSELF_INTENTIONS_MODEL)
+    )
+
+
+def get_fused_classifier():
+    return derived_model('fused_classifier', build_fused_classifier)
+
+
+def specific_recognizer(global_intention):
+    """
+    Returns the model that predicts the specific intentions of a global
+    intention.
+    """
+    if global_intention == GlobalIntentions.ABOUT_MYSELF:
+        return get_myself_recognizer()
+
+    name, _ = SPECIFIC_MODELS[global_intention]
+    return getattr(IntentionClassifierModels, name)
+
+
+def build_fused_classifier():
+    """
+    Fuses the global model with every linear specific model, keyed by the
+    global model label. Specific models that are not linear (the myself
+    KNN) keep being predicted by their own classifier functions.
+
+    return : <FusedLinearClassifier> or None
+    """
+    global_model = IntentionClassifierModels.GLOBAL_INTENTIONS_MODEL
+    if not is_fusable(global_model):
+        return None
+
+    labels = {intention: label for label, intention in Intentions.global_intentions.items()}
+    models = {intention: specific_recognizer(intention) for intention in SPECIFIC_MODELS}
+    branches = {
+        labels[intention]: model
+        for intention, model in models.items()
+        if is_fusable(model)
+    }
+
+    return FusedLinearClassifier(global_model, branches)
+
+
+def classify_vector(vector):
+    """
+    Predicts the global and specific intentions of a text vector, through
+    the fused classifier when available.
+
+    param : vector : <np.array>
+    return : <tuple> : (<Enum>, <Enum>)
+    """
+    fused_classifier = get_fused_classifier()
+    if fused_classifier is None:
+        global_intention = get_global_intention(vector)
+        return global_intention, SPECIFIC_CLASSIFIERS[global_intention](vector)
+
+    global_label, specific_label = fused_classifier.predict(vector)
+    global_intention = Intentions.global_intentions.get(global_label)
+
+    if specific_label is None:
+        return global_intention, SPECIFIC_CLASSIFIERS[global_intention](vector)
+
+    _, specific_intentions = SPECIFIC_MODELS[global_intention]
+    return global_intention, specific_intentions.get(specific_label)
+
+
+def classify_matrix(vectors):
+    """
+    Predicts the global and specific intentions of every row of a matrix of
+    text vectors. The global model runs once over the whole matrix and each
+    specific model runs once over the rows of its global intention.
+
+    param : vectors : <np.array> : one text vector per row;
+    return : <list> : [(<Enum>, <Enum>), ...] in the rows order
+    """
+    fused_classifier = get_fused_classifier()
+    if fused_classifier is not None:
+        global_labels, specific_labels = fused_classifier.predict_batch(vectors)
+    else:
+        recognizer = IntentionClassifierModels.GLOBAL_INTENTIONS_MODEL
+        global_labels = recognizer.predict(vectors)
+        specific_labels = [None] * len(vectors)
+
+    results = [None] * len(vectors)
+    groups = defaultdict(list)
+    for row, (global_label, specific_label) in enumerate(zip(global_labels, specific_labels)):
+        global_intention = Intentions.global_intentions.get(global_label)
+        if specific_label is None:
+            groups[global_intention].append(row)
+        else:
+            _, specific_intentions = SPECIFIC_MODELS[global_intention]
+            results[row] = global_intention, specific_intentions.get(specific_label)
+
+    # the rows without a fused prediction are grouped by global intention
+    for global_intention, rows in groups.items():
+        _, specific_intentions = SPECIFIC_MODELS[global_intention]
+        recognizer = specific_recognizer(global_intention)
+        for row, label in zip(rows, recognizer.predict(vectors[rows])):
+            results[row] = global_intention, specific_intentions.get(label)
+
+    return results
+
+
+def predict_intentions_batch(contexts):
+    """
+    Predicts the intentions of many message contexts at once, parsing the
+    uncached texts with nlp.pipe and classifying them as a single matrix.
+
+    param : contexts : <list> : list of <MessageContext>;
+    return : <list> : [(<Enum>, <Enum>), ...] in the input order
+    """
+    generation = get_model_generation()
+    pending = {}
+    for context in contexts:
+        if context.intentions is not None:
+            continue
+
+        key = generation, text_digest(context.clean_text, casefold=False)
+        intentions = intention_cache.get(key)
+        if intentions is MISSING:
+            pending.setdefault(key, []).append(context)
+        else:
+            context.intentions = intentions
+
+    if pending:
+        keys = list(pending)
+        firsts = [pending[key][0] for key in keys]
+        MessageContext.parse_all(firsts)
+
+        vectors = np.array([context.vector for context in firsts], dtype=np.float32)
+        for key, intentions in zip(keys, classify_matrix(vectors)):
+            intention_cache.set(key, intentions)
+            for context in pending[key]:
+                context.intentions = intentions
+
+    return [context.intentions for context in contexts]
+
+
+def predict_intentions(context):
+    """
+    Predicts the global and specific intentions of a message context,
+    storing them on the context so later stages reuse the prediction.
+
+    Predictions are cached by the hash of the normalized text, so repeated
+    phrases skip spaCy and the classifiers. The key carries the models
+    generation, so reloaded models never answer with stale predictions.
+
+    param : context : <MessageContext>
+    return : <tuple> : (<Enum>, <Enum>)
+    """
+    if context.intentions is None:
+        # the text case is kept since the word vectors are case sensitive
+        key = (
+            get_model_generation(),
+            text_digest(context.clean_text, casefold=False)
+        )
+        intentions = intention_cache.get(key)
+
+        if intentions is MISSING:
+            # extracts the text vector (parsed once per context) and predicts
+            # the global and specific intentions
+            intentions = classify_vector(context.vector)
+            intention_cache.set(key, intentions)
+
+        context.intentions = intentions
+
+    return context.intentions
+
+
+def respond(intentions, **kwargs):
+    """
+    Escolhe uma resposta aleatória para as intenções (global, específica).
+
+    param: intentions: <tuple> : (<GlobalIntentions>, <Enum>)
+    return: <str>
+    """
+    global_intention, specific_intention = intentions
+    return intention_responses[global_intention][specific_intention](**kwargs)
+
+
+def naive_response(message, **kwargs):
     """
     Mecanismo de resposta inocente.
     Recebe um texto e responde com uma resposta aleatoria para esta intenção.
@@ -112,45 +373,104 @@ def naive_response(text, **kwargs):
     Descrito na documentação como "Algoritmo encadeado simples"
     https://github.com/brunolcarli/Luci/wiki/Arquitetura-do-sistema#algoritmo-encadeado-simples
 
-    param: text: <str>
+    Respostas que dependem do backend recebem seus dados via kwargs; no event
+    loop, use naive_answer, que os busca antes de responder.
+
+    param: message: <str> or <MessageContext>
     return: <Str>
     """
-    # extracts the text vector
-    vector = get_text_vector(text)
-    # maps the possible intentions
-    network = classifiers_map()
+    return respond(predict_intentions(MessageContext.of(message)), **kwargs)
 
-    # predict the global intention
-    global_intention = get_global_intention(vector)
 
-    # get the specific intention classifier function
-    specs = network.get(global_intention)
+def naive_response_batch(messages, **kwargs):
+    """
+    Batch version of naive_response: answers many messages classifying them
+    all at once.
 
-    # predict the specifc intention
-    specific_intention = specs(vector)
+    param: messages: <list> : <str> or <MessageContext> items;
+    return: <list> : answers in the input order
+    """
+    contexts = [MessageContext.of(message) for message in messages]
 
-    # gets a random answer for the specific intention
-    response = intention_responses[global_intention][specific_intention]
+    return [
+        respond(intentions, **kwargs)
+        for intentions in predict_intentions_batch(contexts)
+    ]
 
-    return response(**kwargs)
 
+async def fetch_response_data(intentions, **kwargs):
+    """
+    Busca no event loop os dados de backend da resposta às intenções, se ela
+    depender deles.
 
-def get_intentions(text):
+    return: <dict> : argumentos extras para o responder
     """
-    Returns both global and specifi intentions from a text.
+    fetch = response_data.get(tuple(intentions))
+    if fetch is None:
+        return {}
+
+    return await fetch(**kwargs)
+
+
+async def naive_answer(message, **kwargs):
+    """
+    naive_response para o event loop: classifica no executor, busca os dados
+    de backend da resposta no loop e então monta a resposta no executor.
+
+    param: message: <str> or <MessageContext>
+    return: <str>
     """
-    # extracts the text vector
-    vector = get_text_vector(text)
-    # maps the possible intentions
-    network = classifiers_map()
+    intentions = await run_blocking(predict_intentions, MessageContext.of(message))
+    data = await fetch_response_data(intentions, **kwargs)
 
-    # predict the global intention
-    global_intention = get_global_intention(vector)
+    # os geradores de texto podem esperar pelo executor de CPU
+    return await run_blocking(respond, intentions, **kwargs, **data)
 
-    # get the specific intention classifier function
-    specs = network.get(global_intention)
 
-    # predict the specifc intention
-    specific_intention = specs(vector)
+async def naive_answer_batch(messages, **kwargs):
+    """
+    Batch version of naive_answer.
+
+    param: messages: <list> : <str> or <MessageContext> items;
+    return: <list> : answers in the input order
+    """
+    contexts = [MessageContext.of(message) for message in messages]
+    batch = await run_blocking(predict_intentions_batch, contexts)
+    data = await asyncio.gather(*(
+        fetch_response_data(intentions, **kwargs) for intentions in batch
+    ))
+
+    return await asyncio.gather(*(
+        run_blocking(respond, intentions, **kwargs, **extra)
+        for intentions, extra in zip(batch, data)
+    ))
+
+
+def get_intentions(message):
+    """
+    Returns both global and specifi intentions from a text.
+
+    param: message: <str> or <MessageContext>
+    return: <tuple> : (<str>, <str>)
+    """
+    global_intention, specific_intention = predict_intentions(
+        MessageContext.of(message)
+    )
 
     return global_intention.value, specific_intention.value
+
+
+def get_intentions_batch(messages):
+    """
+    Batch version of get_intentions: returns both global and specific
+    intentions of many texts, in the input order.
+
+    param: messages: <list> : <str> or <MessageContext> items;
+    return: <list> : [(<str>, <str>), ...]
+    """
+    contexts = [MessageContext.of(message) for message in messages]
+
+    return [
+        (global_intention.value, specific_intention.value)
+        for global_intention, specific_intention in predict_intentions_batch(contexts)
+    ]
@@ -1,33 +1,99 @@
-import re
+import asyncio
 from collections import Counter
 import logging
 from random import choice, randint, random
 import requests
-import spacy
-import redis
 import discord
 from discord.ext import commands, tasks
 from dateutil import parser
 from datetime import datetime, timezone
-from core.classifiers import naive_response, get_intentions
+from time import monotonic
+from core.classifiers import (naive_answer, get_intentions, intention_cache,
+                              get_fused_classifier, get_myself_recognizer)
 from core.output_vectors import (offended, indifference, positive_answers,
                                  negative_answers, bored_messages)
 from core.reinforcement import generate_answer
-from core.external_requests import Query, Mutation
-from core.emotions import change_humor_values, EmotionHourglass
-from core.utils import (validate_text_offense, extract_sentiment,
-                        make_hash, get_gql_client, remove_id, get_wiki,
+from core.external_requests import Query, Mutation, backend_client, lisa_client
+from core.emotions import change_humor_values, EmotionHourglass, emotion_accumulator
+from core.batching import mutation_batcher
+from core.short_memory import (get_pool_stats, close_pools, append_chat_message,
+                               get_last_message_dt, set_last_message_dt,
+                               get_last_quotes, remember_quote)
+from core.utils import (analyze_text, validate_text_offense, extract_sentiment,
+                        make_hash, get_wiki,
                         get_random_blahblahblah, extract_user_id,
                         evaluate_math_expression, known_language_codes, translate_text,
-                        get_short_memory_value, set_short_memory_value, score)
-from core.gans import ResponseGenerator
-from luci.settings import __version__, BACKEND_URL, REDIS_HOST, REDIS_PORT
+                        score,
+                        run_blocking, lisa_cache)
+from core.gans import response_pools, sample_response
+from core.executor import cpu_executor
+from core.pipeline import normalize_text, rejection_reason
+from core.context import MessageContext
+from core.model_loader import model_registry
+from core.nlp import get_nlp
+from luci.settings import (__version__, EMOTION_FLUSH_INTERVAL, MODELS_WARM_UP,
+                           MODELS_WATCH_INTERVAL, RESPONSE_POOL_SIZE)
+
+
+
+class Luci(commands.Bot):
+    """
+    Bot da Luci. Mantém as tarefas de segundo plano e libera os recursos
+    compartilhados ao ser encerrado.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.background_tasks = []
+
+    def start_background_tasks(self):
+        """
+        Inicia, uma única vez, as tarefas periódicas da Luci.
+        """
+        if self.background_tasks:
+            return
+
+        # os processos de trabalho são iniciados antes das threads de carga
+        # dos modelos
+        cpu_executor.start()
+        self.background_tasks = [
+            asyncio.ensure_future(flush_emotion_deltas()),
+        ]
+        if MODELS_WARM_UP:
+            self.background_tasks.append(asyncio.ensure_future(warm_up_models()))
+        if MODELS_WATCH_INTERVAL:
+            self.background_tasks.append(asyncio.ensure_future(watch_models()))
+        if RESPONSE_POOL_SIZE:
+            self.background_tasks.append(asyncio.ensure_future(response_pools.run()))
+
+    async def close(self):
+        for task in self.background_tasks:
+            task.cancel()
+
+        # envia os deltas e as mutações pendentes antes de fechar as conexões
+        queue_emotion_deltas()
+        await mutation_batcher.close()
+        cpu_executor.shutdown()
+        await asyncio.gather(
+            lisa_client.close(),
+            backend_client.close(),
+            close_pools()
+        )
+        await super().close()
 
 
-nlp = spacy.load('pt')
-client = commands.Bot(command_prefix='!')
+client = Luci(command_prefix='!')
 log = logging.getLogger()
 
+# configuração usada quando o server não possui uma customizada
+DEFAULT_SERVER_CONFIG = {
+    'main_channel': None,
+    'allow_auto_send_messages': False,
+    'filter_offensive_messages': True,
+    'allow_learning_from_chat': True,
+}
+SERVER_CONFIG_TTL = 60
+server_configs = {}
+
 
 class GuildTracker(commands.Cog):
     """
@@ -39,7 +105,6 @@ class GuildTracker(commands.Cog):
     Luci também diminuirá seu valor de aptitude por ficar aborrecida.
     """
     def __init__(self):
-        self.short_memory = redis.Redis(REDIS_HOST, REDIS_PORT, decode_responses=True)
         self.window = 8  # janela de tempo = 8 horas
         self.guilds = client.guilds
         self.track.start()
@@ -48,7 +113,6 @@ class GuildTracker(commands.Cog):
     async def track(self):
         """ Tracking task """
         log.info('tracking...')
-        gql_client = get_gql_client(BACKEND_URL)
 
         for guild in self.guilds:
             log.info(guild.name)
@@ -57,7 +121,7 @@ class GuildTracker(commands.Cog):
             # recupera a configuração do server
             query = Query.get_custom_config(server)
             try:
-                response = gql_client.execute(query)
+                response = await backend_client.execute(query)
             except:
                 log.error(f'Cant get server {guild.name} config. Skipping!')
                 continue
@@ -71,10 +135,10 @@ class GuildTracker(commands.Cog):
             channel = client.get_channel(int(main_channel))
 
             # data da última mensagem enviada no server
-            guild_memory = self.short_memory.get(guild.id)
-            if guild_memory:
+            guild_last_message_dt = await get_last_message_dt(server)
+            if guild_last_message_dt:
                 try:
-                    last_message_dt = parser.parse(g)
+                    last_message_dt = parser.parse(guild_last_message_dt)
                 except:
                     last_message_dt = None
 
@@ -94,20 +158,10 @@ class GuildTracker(commands.Cog):
                             await channel.send(choice(bored_messages))
 
                         # Renova a data de última mensagem para a data atual
-                        memory = get_short_memory_value(server)
-                        memory['last_message_dt'] = str(now.astimezone(tz=timezone.utc))
-                        set_short_memory_value(server, memory)
+                        await set_last_message_dt(server, str(now.astimezone(tz=timezone.utc)))
 
                         log.info('Renewed datetime to %s', str(now))
-                        payload = Mutation.update_emotion(
-                            server=server,
-                            aptitude=-0.1
-                        )
-                        try:
-                            response = gql_client.execute(payload)
-                            log.info('Updated aptitude')
-                        except Exception as err:
-                            log.error(f'Erro: {str(err)}\n\n')
+                        emotion_accumulator.add_emotion(server, {'aptitude': -0.1})
 
         self.guilds = client.guilds
 
@@ -117,13 +171,16 @@ async def on_member_join(member):
     """
     Greets the new member.
     """
-    # Gets an hello
-    message = ResponseGenerator.get_greeting_response()
+    # Gets an hello, generated on the spot only if none is ready
+    message = response_pools.pop('GREETING_GAN')
+    if message is None:
+        message = await cpu_executor.run(
+            'greeting', sample_response, 'GREETING_GAN', timeout=1, fallback=lambda: 'Oi'
+        )
     server_reference = make_hash('id', int(member.guild.id))
     query = Query.get_custom_config(server_reference)
-    gql_client = get_gql_client(BACKEND_URL)
     try:
-        response = gql_client.execute(query)
+        response = await backend_client.execute(query)
     except:
         log.error(f'Cant get server {server_reference} config. Skipping!')
         return None
@@ -139,142 +196,267 @@ async def on_member_join(member):
 async def on_ready():
     guilds = client.guilds
     client.add_cog(GuildTracker())
+    client.start_background_tasks()
 
     log.info('Ok!')
 
 
-@client.event
-async def on_message(message):
+async def warm_up_models():
     """
-    Handler para mensagens do chat.
+    Carrega em segundo plano o spaCy e os modelos treinados, para que as
+    primeiras mensagens não esperem pelo carregamento.
     """
-    channel = message.channel
-    if message.author.bot:
-        return
+    try:
+        await run_blocking(get_nlp)
+        await run_blocking(model_registry.warm_up)
+    except Exception as err:
+        log.error('Models warm up failed: %s', err)
 
-    await client.process_commands(message)
 
-    text = message.content
-    noises = ['\n', '"', "'"]
-    for noise in noises:
-        text = re.sub(noise, ' ', text).strip()
-    global_intention, specific_intention = get_intentions(text)
-    is_offensive = validate_text_offense(text)
-    text_pol = extract_sentiment(text)
-    user_name = message.author.name
-    new_humor = change_humor_values(text_pol, is_offensive)
-    friendshipness = (randint(-1, 1) * random()) + text_pol
-    msg = {
-        'global_intention': global_intention,
-        'specific_intention': specific_intention,
-        'text': text
-    }
-    gql_client = get_gql_client(BACKEND_URL)
+async def reload_models():
+    """
+    Recarrega em segundo plano os modelos treinados. As mensagens continuam
+    sendo respondidas pelos modelos atuais até a troca.
 
-    # não processa comandos
-    for punct in '.>@,/?:;!}{[]|)(*&^%$#~':
-        if text.startswith(punct):
-            log.info('Skipping command text process.')
-            return None
+    return : <list> : nomes dos modelos recarregados
+    """
+    return await run_blocking(model_registry.reload)
 
-    # não processa links
-    if text.startswith('http'):
-        log.info('Skipping hyperlink text process.')
-        return None
 
-    server = make_hash('id', message.guild.id).decode('utf-8')
-    memory = get_short_memory_value(server)
-
-    # guarda a data da mensagem como valor para o id da guilda
-    memory['last_message_dt'] = str(message.created_at)
-    chat_log = memory.get('chat_log', [])
-    log.info(memory)
-    # caso a mensagem seja do mesmo usuario da mensagem anterior, anexa o texto
-    if len(chat_log) > 1:
-        if chat_log[-1]['author'] == message.author.name:
-            chat_log[-1]['text'] += f' {text}'
-        else:
-            previous = chat_log[-1]
-            chat_log.append({
-                'author': message.author.name,
-                'text': text
-            })
-
-            # assume a mensagem do proximo membro como resposta
-            payload = Mutation.assign_response(
-                text=previous['text'],
-                possible_response=msg
-            )
-            try:
-                gql_client.execute(payload)
-            except Exception as err:
-                log.error(f'Erro: {str(err)}\n\n')
-            else:
-                log.info('Saved a possible response.')
+async def watch_models():
+    """
+    Tarefa periódica que recarrega os modelos quando seus arquivos mudam.
+    A recarga espera os arquivos ficarem iguais por uma verificação inteira,
+    para não ler um modelo ainda sendo escrito.
+    """
+    loaded = model_registry.fingerprint()
+    while True:
+        await asyncio.sleep(MODELS_WATCH_INTERVAL)
+        current = model_registry.fingerprint()
+        if current == loaded:
+            continue
 
-    else:
-        chat_log.append({
-            'author': message.author.name,
-            'text': text
-        })
+        await asyncio.sleep(MODELS_WATCH_INTERVAL)
+        if model_registry.fingerprint() != current:
+            continue
 
-    # mantem um maximo de 10 mensagens do chat na lembrança
-    if len(chat_log) > 10:
-        chat_log.pop(0)
+        try:
+            names = await reload_models()
+            log.info('Models changed on disk, reloaded: %s', ', '.join(names))
+        except Exception as err:
+            log.error('Models reload failed: %s', err)
+        loaded = current
 
-    memory['chat_log'] = chat_log
-    set_short_memory_value(server, memory)
 
-    user_id = make_hash(server, message.author.id).decode('utf-8')
+def queue_emotion_deltas():
+    """
+    Envia para a fila write-behind os deltas de humor acumulados: uma
+    mutação por server e uma por membro, com os deltas somados do membro e
+    suas últimas mensagens do intervalo. Uma mutação que não pode ser
+    montada é descartada sem afetar as demais.
+    """
+    guilds, users = emotion_accumulator.drain()
+    for server, deltas in guilds.items():
+        try:
+            mutation_batcher.put(Mutation.update_emotion(server=server, **deltas))
+        except Exception as err:
+            log.error('Skipping emotion deltas of server %s: %s', server, err)
+
+    for user_id, user in users.items():
+        messages = user['messages'] or [None]
+        try:
+            mutation_batcher.put(Mutation.update_user(
+                user_id,
+                user['name'],
+                user['friendshipness'],
+                user['emotions'],
+                messages[0],
+                messages=messages[1:]
+            ))
+        except Exception as err:
+            log.error('Skipping deltas of user %s: %s', user_id, err)
 
-    # Atualiza o humor da Luci
-    payload = Mutation.update_emotion(server=server, **new_humor)
+
+async def flush_emotion_deltas():
+    """
+    Tarefa periódica que envia os deltas de humor acumulados.
+    """
+    while True:
+        await asyncio.sleep(EMOTION_FLUSH_INTERVAL)
+        try:
+            queue_emotion_deltas()
+        except Exception as err:
+            log.error('Emotion deltas flush failed: %s', err)
+
+
+async def execute_gql(payload):
+    """
+    Executa uma requisição graphql no backend, registrando no log eventuais
+    falhas. Retorna None em caso de erro.
+    """
     try:
-        gql_client.execute(payload)
+        return await backend_client.execute(payload)
     except Exception as err:
         log.error(f'Erro: {str(err)}\n\n')
 
-    # Atualiza o humor status do usuario
-    payload = Mutation.update_user(
-        user_id,
-        user_name,
-        friendshipness,
-        new_humor,
-        msg
+
+async def get_server_config(server):
+    """
+    Recupera a configuração customizada do servidor, mantendo-a em cache
+    local por SERVER_CONFIG_TTL segundos para não consultar o backend a cada
+    mensagem. Caso o server não possua configuração, retorna os valores
+    padrão.
+    """
+    cached = server_configs.get(server)
+    if cached and cached[0] > monotonic():
+        return cached[1]
+
+    response = await execute_gql(Query.get_custom_config(server))
+    config = dict(DEFAULT_SERVER_CONFIG)
+    if response and response.get('custom_config'):
+        config.update({
+            key: value for key, value in response['custom_config'].items()
+            if value is not None
+        })
+
+    server_configs[server] = (monotonic() + SERVER_CONFIG_TTL, config)
+    return config
+
+
+async def analyze_message(context, learn, check_offense):
+    """
+    Estágio de análise: classifica as intenções e consulta a LISA apenas
+    quando os estágios seguintes vão utilizar o resultado.
+    """
+    async def nothing(value):
+        return value
+
+    # uma única requisição à LISA com todos os campos necessários
+    intentions, analysis = await asyncio.gather(
+        run_blocking(get_intentions, context) if learn else nothing((None, None)),
+        analyze_text(context.text, offense=check_offense, sentiment=learn)
     )
 
-    try:
-        gql_client.execute(payload)
-    except Exception as err:
-        log.error(f'Erro: {str(err)}\n\n')
+    return intentions, validate_text_offense(analysis), extract_sentiment(analysis)
+
+
+async def learn_from_message(message, context, server, intentions, is_offensive, text_pol):
+    """
+    Estágio de aprendizado: atualiza a memória de curto prazo, o humor da
+    Luci, o relacionamento com o autor e as possíveis respostas conhecidas.
+    """
+    text = context.text
+    global_intention, specific_intention = intentions
+    user_name = message.author.name
+    new_humor = change_humor_values(text_pol, is_offensive)
+    friendshipness = (randint(-1, 1) * random()) + text_pol
+    msg = {
+        'global_intention': global_intention,
+        'specific_intention': specific_intention,
+        'text': text
+    }
+
+    # as mutações são enviadas em lote pela fila write-behind
+    payloads = []
+
+    # guarda a mensagem no histórico do chat e a data da mensagem na memória
+    # de curto prazo; caso a mensagem seja do mesmo usuario da mensagem
+    # anterior, o texto é anexado a ela
+    previous = await append_chat_message(
+        server, user_name, text, str(message.created_at)
+    )
+    if previous is not None:
+        # assume a mensagem do proximo membro como resposta
+        payloads.append(Mutation.assign_response(
+            text=previous,
+            possible_response=msg
+        ))
+
+    user_id = make_hash(server, message.author.id).decode('utf-8')
+
+    # Acumula o humor da Luci e o humor status do usuario, enviados
+    # periodicamente ao backend
+    emotion_accumulator.add_emotion(server, new_humor)
+    emotion_accumulator.add_user(user_id, user_name, friendshipness, new_humor, msg)
 
     # Atualiza reconhecimento de respostas, se for resposta à outra mensagem
     if message.reference:
-        payload = Mutation.assign_response(
+        payloads.append(Mutation.assign_response(
             text=message.reference.resolved.content,
             possible_response=msg
-        )
+        ))
+
+    for payload in payloads:
+        mutation_batcher.put(payload)
 
-        try:
-            gql_client.execute(payload)
-        except Exception as err:
-            log.error(f'Erro: {str(err)}\n\n')
+
+async def respond_to_message(message, context, server, is_offensive):
+    """
+    Estágio de resposta: responde menções à Luci e reage a mensagens
+    ofensivas.
+    """
+    channel = message.channel
 
     # process @Luci mentions
-    if str(channel.guild.me.id) in text:
-        answer = generate_answer(text)
+    if str(channel.guild.me.id) in context.text:
+        answer = await generate_answer(context)
         if answer:
             return await channel.send(answer)
 
         # Caso não conheça nenhuma resposta, use o classificador inocente
-        return await channel.send(
-            naive_response(remove_id(text), reference=server)
-        )
+        answer = await naive_answer(context, reference=server)
+
+        return await channel.send(answer)
 
     if is_offensive and choice([1, 0]) and choice([1, 0]):
         return await channel.send(f'{message.author.mention} {choice(offended)}')
 
 
+@client.event
+async def on_message(message):
+    """
+    Handler para mensagens do chat.
+
+    A mensagem percorre os estágios: normalização, filtros de rejeição
+    (sem custo de modelo ou rede), análise, aprendizado e resposta.
+    """
+    if message.author.bot:
+        return
+
+    await client.process_commands(message)
+
+    text = normalize_text(message.content)
+
+    # descarta emojis, comandos, links e mensagens de uma só palavra
+    reason = rejection_reason(text)
+    if reason:
+        log.info('Skipping %s text process.', reason)
+        return None
+
+    # o contexto acompanha a mensagem pelos estágios seguintes
+    context = MessageContext(text)
+    server = make_hash('id', message.guild.id).decode('utf-8')
+    config = await get_server_config(server)
+    learn = config['allow_learning_from_chat']
+
+    intentions, is_offensive, text_pol = await analyze_message(
+        context,
+        learn=learn,
+        check_offense=config['filter_offensive_messages']
+    )
+
+    if learn:
+        await learn_from_message(
+            message, context, server, intentions, is_offensive, text_pol
+        )
+    else:
+        # a data da última mensagem mantém o server ativo para o GuildTracker;
+        # no aprendizado, ela é registrada junto com a mensagem no chat_log
+        await set_last_message_dt(server, str(message.created_at))
+
+    return await respond_to_message(message, context, server, is_offensive)
+
+
 @client.command(aliases=['v'])
 async def version(discord):
     """
@@ -290,17 +472,20 @@ async def status(bot):
     """
     server = make_hash('id', bot.guild.id)
     payload = Query.get_emotions(server.decode('utf-8'))
-    client = get_gql_client(BACKEND_URL)
 
     try:
-        response = client.execute(payload)
+        response = await backend_client.execute(payload)
     except Exception as err:
         print(f'Erro: {str(err)}\n\n')
         return await bot.send('Buguei')
 
     humor = response.get('emotions')
     if humor:
-        luci_humor = humor[0]
+        # considera os deltas ainda não enviados ao backend
+        luci_humor = dict(humor[0])
+        pending = emotion_accumulator.pending_emotion(server.decode('utf-8'))
+        for emotion, delta in pending.items():
+            luci_humor[emotion] += delta
 
         embed = discord.Embed(color=0x1E1E1E, type='rich')
 
@@ -339,10 +524,9 @@ async def random_quote(bot):
     """
     server = make_hash('id', bot.guild.id)
     payload = Query.get_quotes(server.decode('utf-8'))
-    client = get_gql_client(BACKEND_URL)
 
     try:
-        response = client.execute(payload)
+        response = await backend_client.execute(payload)
     except Exception as err:
         print(f'Erro: {str(err)}\n\n')
         return await bot.send('Buguei')
@@ -354,15 +538,12 @@ async def random_quote(bot):
     # sorteia um quote vindo da memória de longo rpazo
     chosen_quote = choice(quotes)
     # recupera os últimos quotes ditos nesse server da memória de curto prazo
-    server_memory = get_short_memory_value(server)
+    last_quotes = await get_last_quotes(server.decode('utf-8'))
 
     # se o quote sorteado não for um quote repetido
-    if chosen_quote['quote'] not in server_memory.get('last_quotes', []):
+    if chosen_quote['quote'] not in last_quotes:
         # atualiza memória de curto prazo e retorna o quote sorteado
-        server_memory['last_quotes'].append(chosen_quote['quote'])
-        if len(server_memory['last_quotes']) > 10:
-            server_memory['last_quotes'].pop(0)
-        set_short_memory_value(server, server_memory)
+        await remember_quote(server.decode('utf-8'), chosen_quote['quote'])
         return await bot.send(f'{chosen_quote["quote"]} ~ {chosen_quote["author"]}')
 
     # se ela souber menos que 10 quotes nesse server pode retornar o quote repetido mesmo
@@ -370,14 +551,11 @@ async def random_quote(bot):
         return await bot.send(f'{chosen_quote["quote"]} ~ {chosen_quote["author"]}')
 
     # Se não tem que ir sorteando quotes até não ser repetido
-    while chosen_quote['quote'] in server_memory['last_quotes']:
+    while chosen_quote['quote'] in last_quotes:
         chosen_quote = choice(quotes)
 
     # Atualiza a memória de curto rpazo ao selecionar o quote
-    server_memory['last_quotes'].append(chosen_quote['quote'])
-    if len(server_memory['last_quotes']) > 10:
-        server_memory['last_quotes'].pop(0)
-    set_short_memory_value(server, server_memory)
+    await remember_quote(server.decode('utf-8'), chosen_quote['quote'])
 
     return await bot.send(f'{chosen_quote["quote"]} ~ {chosen_quote["author"]}')
 
@@ -403,10 +581,9 @@ async def quote(ctx, *args):
 
     server = make_hash('id', ctx.guild.id)
     payload = Mutation.create_quote(message, server.decode('utf-8'), author)
-    client = get_gql_client(BACKEND_URL)
 
     try:
-        response = client.execute(payload)
+        response = await backend_client.execute(payload)
     except Exception as err:
         print(f'Erro: {str(err)}\n\n')
         return await ctx.send('Buguei')
@@ -437,7 +614,7 @@ async def listen(bot, *args):
     """
     text = ' '.join(token for token  in args)
 
-    text_polarity = extract_sentiment(text)
+    text_polarity = extract_sentiment(await analyze_text(text, offense=False))
     if text_polarity > 0:
         return await bot.send(''.join(choice(i) for i in positive_answers))
     elif text_polarity < 0:
@@ -456,7 +633,7 @@ async def question(bot, *args):
           !? O que é um príncipe?
     """
     text = ' '.join(i for i in args)
-    responses = get_wiki(text)
+    responses = await get_wiki(text)
 
     for response in responses:
         await bot.send(response)
@@ -480,10 +657,9 @@ async def user_status(ctx):
     server = make_hash('id', ctx.message.guild.id).decode('utf-8')
     user_id = make_hash(server, mentions[0].id).decode('utf-8')
     payload = Query.get_user(user_id)
-    gql_client = get_gql_client(BACKEND_URL)
 
     try:
-        response = gql_client.execute(payload)
+        response = await backend_client.execute(payload)
     except Exception as err:
         log.error(f'Erro: {str(err)}\n\n')
         return
@@ -495,8 +671,14 @@ async def user_status(ctx):
     # monta a resposta
     embed = discord.Embed(color=0x1E1E1E, type='rich')
     name = data[0].get('name')
-    friendshipness = data[0].get('friendshipness', 0)
-    emotions = data[0].get('emotion_resume', {})
+    # considera os deltas ainda não enviados ao backend
+    pending_friendshipness, pending_emotions = emotion_accumulator.pending_user(
+        data[0]['reference']
+    )
+    friendshipness = data[0].get('friendshipness', 0) + pending_friendshipness
+    emotions = dict(data[0].get('emotion_resume') or {})
+    for emotion, delta in pending_emotions.items():
+        emotions[emotion] = emotions.get(emotion, 0) + delta
     user_id = extract_user_id(data[0]['reference'])
 
     pleasantness_status = EmotionHourglass.get_pleasantness(
@@ -545,9 +727,8 @@ async def friendship(ctx, opt=None):
     # consulta os membros no backend
     server = make_hash('id', ctx.message.guild.id).decode('utf-8')    
     payload = Query.get_users(server)
-    gql_client = get_gql_client(BACKEND_URL)
     try:
-        response = gql_client.execute(payload)
+        response = await backend_client.execute(payload)
     except Exception as err:
         print(f'Erro: {str(err)}\n\n')
         return
@@ -557,6 +738,12 @@ async def friendship(ctx, opt=None):
     if not members:
         return await ctx.send('Acho que ainda não gosto muito de ninguém')
 
+    # considera os deltas ainda não enviados ao backend
+    for member in members:
+        member['friendshipness'] += emotion_accumulator.pending_user(
+            member['reference']
+        )[0]
+
     if opt and opt == '-':
         members = [m for m in members if m['friendshipness'] < 0]
 
@@ -593,9 +780,8 @@ async def source(ctx, *args):
         return await ctx.send('Ué você não disse nada ...')
 
     query = Query.get_message_authors(text)
-    gql_client = get_gql_client(BACKEND_URL)
     try:
-        response = gql_client.execute(query)
+        response = await backend_client.execute(query)
     except Exception as err:
         log.error(f'Erro: {str(err)}\n\n')
         return
@@ -655,7 +841,8 @@ async def translate(ctx, code=None, *args):
         return await ctx.send('Não conheço esse código dessa linguagem. '\
                               'Manda um !help translate pra ver os códigos que eu sei.')
 
-    return await ctx.send(f'Acho que se traduz como:\n > {translate_text(text, code)}')
+    translation = await run_blocking(translate_text, text, code)
+    return await ctx.send(f'Acho que se traduz como:\n > {translation}')
 
 
 @client.command()
@@ -689,6 +876,54 @@ async def list_guilds(ctx):
     await ctx.send('Lista de servers que eu estou:', embed=embed)
 
 
+@client.command(name='reload_models')
+@commands.is_owner()
+async def reload_models_command(ctx):
+    """
+    Comando restrito: Recarrega os modelos treinados sem reiniciar a Luci.
+    """
+    try:
+        names = await reload_models()
+    except Exception as err:
+        log.error('Models reload failed: %s', err)
+        return await ctx.send(f'Não consegui recarregar os modelos: {err}')
+
+    await ctx.send(f':ok_hand: recarreguei {len(names)} modelos')
+
+
+def metrics_sections():
+    """
+    Retorna as seções de métricas internas como pares (nome, métricas).
+    """
+    return [
+        ('HTTP LISA', lisa_client.get_stats()),
+        ('HTTP Backend', backend_client.get_stats()),
+        ('Write-behind', mutation_batcher.get_stats()),
+        ('Redis pool', get_pool_stats()),
+        ('Cache LISA', lisa_cache.get_stats()),
+        ('Cache intenções', intention_cache.get_stats()),
+        ('Classificador fundido', getattr(get_fused_classifier(), 'get_stats', dict)()),
+        ('Vizinhos (myself)', getattr(get_myself_recognizer(), 'get_stats', dict)()),
+        ('Modelos', model_registry.get_stats()),
+        ('Respostas pré-geradas', response_pools.get_stats()),
+        ('Executor CPU', cpu_executor.get_stats()),
+    ]
+
+
+@client.command()
+@commands.is_owner()
+async def metrics(ctx):
+    """
+    Comando restrito: Exibe as métricas internas da Luci.
+    """
+    embed = discord.Embed(color=0x1E1E1E, type='rich')
+    for name, stats in metrics_sections():
+        value = '\n'.join(f'{key}: {stats[key]}' for key in sorted(stats))
+        embed.add_field(name=name, value=value or '-', inline=False)
+
+    await ctx.send('Métricas:', embed=embed)
+
+
 @client.command(aliases=['agm'])
 async def anagram(ctx, word=None):
     """
@@ -707,10 +942,9 @@ async def anagram(ctx, word=None):
 
     word = word.lower()
     payload = Query.words_for_anagram(word)
-    client = get_gql_client(BACKEND_URL)
 
     try:
-        response = client.execute(payload)
+        response = await backend_client.execute(payload)
     except Exception as err:
         print(f'Erro: {str(err)}\n\n')
         return await ctx.send('Buguei')
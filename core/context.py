@@ -0,0 +1,60 @@
+"""
+Contexto de processamento de uma mensagem do chat.
+"""
+from core.nlp import get_nlp
+from core.utils import remove_id
+
+
+class MessageContext:
+    """
+    Carrega uma mensagem por todos os estágios do pipeline, guardando o
+    texto normalizado, o documento do spaCy e as intenções previstas para que
+    cada mensagem seja analisada uma única vez.
+
+    O documento do spaCy é construído sobre o texto sem menções e ids
+    (`clean_text`), na primeira vez que for solicitado.
+    """
+    def __init__(self, text):
+        self.text = text
+        self.clean_text = remove_id(text)
+        self.intentions = None
+        self._doc = None
+
+    @property
+    def doc(self):
+        if self._doc is None:
+            self._doc = get_nlp()(self.clean_text)
+        return self._doc
+
+    @property
+    def vector(self):
+        return self.doc.vector
+
+    @staticmethod
+    def parse_all(contexts, batch_size=256):
+        """
+        Constrói, em lote (nlp.pipe), os documentos dos contextos que ainda
+        não foram analisados pelo spaCy.
+
+        param : contexts : <list> : lista de <MessageContext>;
+        param : batch_size : <int>
+        """
+        pending = [context for context in contexts if context._doc is None]
+        docs = get_nlp().pipe(
+            (context.clean_text for context in pending), batch_size=batch_size
+        )
+        for context, doc in zip(pending, docs):
+            context._doc = doc
+
+    @staticmethod
+    def of(message):
+        """
+        Retorna o próprio contexto ou um novo contexto para o texto recebido.
+
+        param : message : <str> or <MessageContext>
+        return : <MessageContext>
+        """
+        if isinstance(message, MessageContext):
+            return message
+
+        return MessageContext(message)
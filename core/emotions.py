@@ -1,4 +1,6 @@
 from random import random
+from collections import Counter, defaultdict
+from luci.settings import EMOTION_MESSAGES_PER_USER
 
 
 class EmotionHourglass:
@@ -136,3 +138,84 @@ def change_humor_values(text_pol, is_offensive):
         'aptitude': aptitude,
         'sensitivity': sensitivity
     }
+
+
+EMOTIONS = ('pleasantness', 'attention', 'sensitivity', 'aptitude')
+
+
+class EmotionAccumulator:
+    """
+    Acumula localmente os deltas de humor de cada server e os deltas de
+    amizade e humor de cada membro, para que sejam enviados ao backend
+    somados, uma vez por intervalo, em vez de um por mensagem.
+
+    De cada membro são guardadas apenas as `max_messages` mensagens mais
+    recentes do intervalo.
+    """
+    def __init__(self, max_messages=EMOTION_MESSAGES_PER_USER):
+        self.max_messages = max_messages
+        self.guilds = defaultdict(Counter)
+        self.users = {}
+
+    def add_emotion(self, server, deltas):
+        """
+        Soma um delta de humor da Luci em um server.
+
+        param : server : <str> : referência do server;
+        param : deltas : <dict> : valores de change_humor_values;
+        """
+        self.guilds[server].update({
+            emotion: deltas.get(emotion, 0) for emotion in EMOTIONS
+        })
+
+    def add_user(self, user_id, name, friendshipness, deltas, message=None):
+        """
+        Soma os deltas de amizade e humor de um membro, guardando a mensagem
+        que os originou.
+        """
+        user = self.users.setdefault(user_id, {
+            'name': name,
+            'friendshipness': 0,
+            'emotions': Counter(),
+            'messages': []
+        })
+        user['name'] = name
+        user['friendshipness'] += friendshipness
+        user['emotions'].update({
+            emotion: deltas.get(emotion, 0) for emotion in EMOTIONS
+        })
+        if message:
+            user['messages'].append(message)
+            del user['messages'][:len(user['messages']) - self.max_messages]
+
+    def pending_emotion(self, server):
+        """
+        Retorna o delta de humor ainda não enviado de um server.
+        """
+        pending = self.guilds.get(server, {})
+        return {emotion: pending.get(emotion, 0) for emotion in EMOTIONS}
+
+    def pending_user(self, user_id):
+        """
+        Retorna os deltas ainda não enviados de um membro: (amizade, humor).
+        """
+        user = self.users.get(user_id)
+        if not user:
+            return 0, {emotion: 0 for emotion in EMOTIONS}
+
+        return user['friendshipness'], {
+            emotion: user['emotions'].get(emotion, 0) for emotion in EMOTIONS
+        }
+
+    def drain(self):
+        """
+        Retorna e zera os deltas acumulados: (servers, membros).
+        """
+        guilds, users = self.guilds, self.users
+        self.guilds, self.users = defaultdict(Counter), {}
+
+        return guilds, users
+
+
+emotion_accumulator = EmotionAccumulator()
+
@@ -0,0 +1,162 @@
+"""
+Execução de tarefas pesadas de CPU fora do processo do bot.
+
+As respostas geradas por aprendizado por reforço e pelos geradores de texto
+ocupam a CPU por tempo imprevisível. Executadas em threads, disputam o GIL
+com o event loop; aqui elas rodam em um pool de processos, com prazo: se o
+resultado não chegar a tempo, o chamador recebe uma resposta mais barata.
+"""
+import asyncio
+import logging
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from time import perf_counter
+from luci.settings import CPU_EXECUTOR_WORKERS, CPU_EXECUTOR_TIMEOUT
+
+log = logging.getLogger()
+
+
+def timed_call(func, *args, **kwargs):
+    """
+    Executa a função no processo de trabalho, retornando também o tempo de
+    execução (sem o tempo na fila).
+
+    return : <tuple> : (<float> segundos, resultado)
+    """
+    start = perf_counter()
+    result = func(*args, **kwargs)
+    return perf_counter() - start, result
+
+
+class CPUExecutor:
+    """
+    Pool de processos para funções pesadas de CPU, com prazo por chamada e
+    métricas por tipo de chamada (chamadas, fila, tempos, prazos estourados).
+
+    As funções e argumentos precisam ser serializáveis (funções de módulo).
+    Com `workers` 0 as funções rodam no executor padrão do event loop.
+
+    Os processos de trabalho partem do servidor de fork configurado em
+    main.py (método "forkserver"), e não do bot: um fork do bot herdaria os
+    locks presos pelas suas threads (carga de modelos, spaCy) e travaria.
+
+    param : workers : <int> : número de processos;
+    param : timeout : <float> : prazo padrão, em segundos;
+    """
+    def __init__(self, workers=CPU_EXECUTOR_WORKERS, timeout=CPU_EXECUTOR_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self.stats = defaultdict(Counter)
+        self._pool = None
+        self._loop = None
+        self._loop_thread = None
+
+    def _executor(self):
+        if self.workers and self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def start(self):
+        """
+        Inicia os processos de trabalho e guarda o event loop do bot, para
+        chamadas vindas de threads (run_threadsafe). Deve ser chamado no
+        event loop.
+        """
+        self._loop = asyncio.get_event_loop()
+        self._loop_thread = threading.get_ident()
+        executor = self._executor()
+        if executor is not None:
+            executor.submit(int)
+
+    async def run(self, kind, func, *args, timeout=None, fallback=None, **kwargs):
+        """
+        Executa `func(*args, **kwargs)` no pool de processos.
+
+        Caso o prazo estoure ou a execução falhe, retorna `fallback()` (ou
+        None, sem fallback). Uma execução que estourou o prazo continua no
+        processo de trabalho até terminar, mas seu resultado é descartado.
+
+        param : kind : <str> : tipo da chamada, usado nas métricas;
+        param : func : função de módulo;
+        param : timeout : <float> : prazo em segundos (padrão: self.timeout);
+        param : fallback : função sem argumentos que gera a resposta barata;
+        """
+        stats = self.stats[kind]
+        stats['calls'] += 1
+        stats['pending'] += 1
+        stats['max_pending'] = max(stats['max_pending'], stats['pending'])
+
+        loop = asyncio.get_event_loop()
+        start = perf_counter()
+        try:
+            elapsed, result = await asyncio.wait_for(
+                loop.run_in_executor(
+                    self._executor(), partial(timed_call, func, *args, **kwargs)
+                ),
+                timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            stats['timeouts'] += 1
+            log.warning('%s did not finish in %.1fs', kind, timeout or self.timeout)
+            return fallback() if fallback else None
+        except BrokenProcessPool as err:
+            # um processo de trabalho morreu: o pool é recriado na próxima chamada
+            self._pool = None
+            stats['errors'] += 1
+            log.error('%s failed, restarting the CPU executor: %s', kind, err)
+            return fallback() if fallback else None
+        except Exception as err:
+            stats['errors'] += 1
+            log.error('%s failed: %s', kind, err)
+            return fallback() if fallback else None
+        finally:
+            stats['pending'] -= 1
+
+        stats['completed'] += 1
+        stats['execution_ms'] += elapsed * 1000
+        stats['wait_ms'] += (perf_counter() - start - elapsed) * 1000
+        return result
+
+    def run_threadsafe(self, kind, func, *args, timeout=None, fallback=None, **kwargs):
+        """
+        Versão de `run` para código bloqueante que roda em threads (como as
+        de run_blocking): agenda a chamada no event loop e espera o seu
+        resultado, com o mesmo prazo e fallback.
+
+        Sem o executor iniciado, ou se chamado no próprio event loop, executa
+        `func` diretamente.
+        """
+        loop = self._loop
+        if (loop is None or not loop.is_running()
+                or threading.get_ident() == self._loop_thread):
+            return func(*args, **kwargs)
+
+        return asyncio.run_coroutine_threadsafe(
+            self.run(kind, func, *args, timeout=timeout, fallback=fallback, **kwargs),
+            loop
+        ).result()
+
+    def get_stats(self):
+        """
+        Retorna as métricas achatadas como "<tipo> <métrica>", com os tempos
+        médios por chamada concluída.
+        """
+        stats = {}
+        for kind, counters in self.stats.items():
+            completed = counters['completed'] or 1
+            for key in ('calls', 'completed', 'timeouts', 'errors', 'pending', 'max_pending'):
+                stats[f'{kind} {key}'] = counters[key]
+            stats[f'{kind} execution_ms'] = round(counters['execution_ms'] / completed, 1)
+            stats[f'{kind} wait_ms'] = round(counters['wait_ms'] / completed, 1)
+        return stats
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+cpu_executor = CPUExecutor()
@@ -2,10 +2,116 @@
 Defines requests, queries and connections to external platforms and services.
 """
 import json
-import requests
+import asyncio
+import logging
+from collections import Counter
+from random import random
 from typing import Generic
+import aiohttp
 from gql import gql
-from luci.settings import LISA_URL
+from graphql.language.printer import print_ast
+from luci.settings import (LISA_URL, BACKEND_URL, HTTP_TIMEOUT, HTTP_POOL_SIZE,
+                           HTTP_MAX_CONCURRENCY, HTTP_RETRIES, HTTP_BACKOFF,
+                           HTTP_KEEPALIVE_TIMEOUT)
+
+log = logging.getLogger()
+
+
+class GraphQLClient:
+    """
+    Client graphql assíncrono para um upstream (LISA ou backend).
+
+    Mantém um pool de conexões keep-alive por upstream, com timeout,
+    concorrência limitada e novas tentativas com backoff exponencial e
+    jitter. Mutações só são repetidas quando a conexão nem chegou a ser
+    estabelecida, para não aplicar a mesma alteração duas vezes.
+    """
+    def __init__(self, url, timeout=HTTP_TIMEOUT, pool_size=HTTP_POOL_SIZE,
+                 max_concurrency=HTTP_MAX_CONCURRENCY, retries=HTTP_RETRIES,
+                 backoff=HTTP_BACKOFF):
+        self.url = url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = Counter()
+        self._session = None
+        self._semaphore = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._count('connections_created'))
+            trace.on_connection_reuseconn.append(self._count('connections_reused'))
+
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.pool_size,
+                    keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[trace]
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        return self._session
+
+    def _count(self, stat):
+        async def on_event(session, context, params):
+            self.stats[stat] += 1
+        return on_event
+
+    async def post(self, document):
+        """
+        Envia um documento graphql (gql ou string) ao upstream e retorna o
+        payload completo da resposta, contendo `data` e `errors`.
+        """
+        query = document if isinstance(document, str) else print_ast(document)
+        is_mutation = query.lstrip().startswith('mutation')
+        session = self._get_session()
+
+        async with self._semaphore:
+            attempt = 0
+            while True:
+                try:
+                    self.stats['requests'] += 1
+                    async with session.post(self.url, json={'query': query}) as response:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    retryable = isinstance(err, aiohttp.ClientConnectorError) \
+                        or not is_mutation
+                    if not retryable or attempt >= self.retries:
+                        self.stats['failures'] += 1
+                        raise
+
+                    # backoff exponencial com jitter completo
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(self.backoff * (2 ** attempt) * random())
+                    attempt += 1
+
+    async def execute(self, document):
+        """
+        Executa um documento graphql e retorna o conteúdo de `data`.
+        Lança uma exceção caso o upstream responda com erros.
+        """
+        result = await self.post(document)
+        if result.get('errors'):
+            self.stats['graphql_errors'] += 1
+            raise Exception(str(result['errors'][0]))
+
+        return result.get('data')
+
+    def get_stats(self):
+        """
+        Retorna as métricas de requisições e de reuso de conexões.
+        """
+        return dict(self.stats)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
 
 
 class Query:
@@ -13,42 +119,35 @@ class Query:
     Groups GraphQl queries as static methods.
     """
     @staticmethod
-    def get_text_offense(message):
+    def get_text_analysis(message, offense=True, sentiment=True, pos=False):
         """
-        Request LISA to verify if the text is offensive.
+        Request LISA, in a single document, every analysis a message needs:
+        offense level, sentiment polarity and/or part of speech.
         """
-        query = f'''
-        query{{
-            textOffenseLevel(text: {json.dumps(message)}) {{
-                text
+        text = json.dumps(message)
+        fields = []
+        if offense:
+            fields.append(f'''
+            textOffenseLevel(text: {text}) {{
                 average
                 isOffensive
-            }}
-        }}
-        '''
-        request = requests.post(LISA_URL, json={'query': query})
-
-        if request.status_code == 200:
-            return json.loads(request.text)
-
-        return None
+            }}''')
+        if sentiment:
+            fields.append(f'''
+            sentimentExtraction(text: {text})''')
+        if pos:
+            fields.append(f'''
+            partOfSpeech(text: {text}) {{
+                token
+                description
+            }}''')
 
-    @staticmethod
-    def get_text_sentiment(message):
-        """
-        Request LISA to extract the text sentiment polarity from message.
-        """
         query = f'''
-        query{{
-            sentimentExtraction(text: {json.dumps(message)})
+        query{{{''.join(fields)}
         }}
         '''
-        request = requests.post(LISA_URL, json={'query': query})
 
-        if request.status_code == 200:
-            return json.loads(request.text)
-
-        return 0
+        return gql(query)
 
     @staticmethod
     def get_quotes(server):
@@ -86,26 +185,6 @@ class Query:
 
         return gql(query)
 
-    @staticmethod
-    def get_pos(text):
-        """
-        Solicita o PART OF SPEECH de um texto para LISA.
-        """
-        query = f'''
-        query{{
-            partOfSpeech(text: "{text}") {{
-                token
-                description
-            }}
-        }}
-        '''
-        request = requests.post(LISA_URL, json={'query': query})
-
-        if request.status_code == 200:
-            return json.loads(request.text)
-
-        return ''
-
     @staticmethod
     def get_user(reference):
         """
@@ -273,31 +352,41 @@ class Mutation:
         return gql(mutation)
 
     @staticmethod
-    def update_user(user_id, name, friendshipness, emotions, message=None):
+    def message_input(message, field='message'):
         """
-        Solicita a atualização do estado de um membro (usuário) do server.
+        Campo com a mensagem (intenções e texto) do input de update_user e
+        assign_response, vazio sem mensagem. Os valores são escapados como
+        strings JSON, também válidas em graphql.
+        """
+        if not message:
+            return ''
+
+        global_intention = json.dumps(str(message.get('global_intention')))
+        specific_intention = json.dumps(str(message.get('specific_intention')))
+        text = json.dumps(str(message.get('text')))
+
+        return f'''
+            {field}: {{
+                global_intention: {global_intention}
+                specific_intention: {specific_intention}
+                text: {text}
+            }}
+            '''
+
+    @staticmethod
+    def update_user_field(user_id, name, friendshipness, emotions, message=None, alias=''):
+        """
+        Campo update_user de uma mutação, opcionalmente apelidado.
         """
         pleasantness = emotions.get('pleasantness', 0)
         attention = emotions.get('attention', 0)
         sensitivity = emotions.get('sensitivity', 0)
         aptitude = emotions.get('aptitude', 0)
 
-        if message:
-            message_input = f'''
-            message: {{
-                global_intention: "{message.get('global_intention')}"
-                specific_intention: "{message.get('specific_intention')}"
-                text: "{message.get('text')}"
-            }}
-            '''
-        else:
-            message_input = ''
-
-        mutation = f'''
-        mutation {{
-            update_user(input:{{
-                reference: "{user_id}"
-                name: "{name}"
+        return f'''
+            {alias + ': ' if alias else ''}update_user(input:{{
+                reference: {json.dumps(str(user_id))}
+                name: {json.dumps(str(name))}
                 friendshipness: {friendshipness}
                 emotion_resume: {{
                     pleasantness: {pleasantness}
@@ -305,7 +394,7 @@ class Mutation:
                     sensitivity: {sensitivity}
                     aptitude: {aptitude}
                 }}
-                {message_input}
+                {Mutation.message_input(message)}
             }}){{
                 user {{
                 reference
@@ -320,6 +409,27 @@ class Mutation:
                     }}
                 }}
             }}
+            '''
+
+    @staticmethod
+    def update_user(user_id, name, friendshipness, emotions, message=None, messages=()):
+        """
+        Solicita a atualização do estado de um membro (usuário) do server.
+
+        Mensagens adicionais em `messages` são registradas no mesmo documento,
+        em campos com deltas de amizade e humor zerados, de modo que os deltas
+        são aplicados uma única vez.
+        """
+        fields = [
+            Mutation.update_user_field(user_id, name, friendshipness, emotions, message)
+        ]
+        fields.extend(
+            Mutation.update_user_field(user_id, name, 0, {}, msg, alias=f'message_{i}')
+            for i, msg in enumerate(messages, 1) if msg
+        )
+
+        mutation = f'''
+        mutation {{{''.join(fields)}
         }}
         '''
 
@@ -331,18 +441,12 @@ class Mutation:
         Requisição GraphQL para anexar uma possível resposta
         à uma determinada mensagem.
         """
-        possible_response_input = f'''
-        response: {{
-            global_intention: "{possible_response.get('global_intention')}"
-            specific_intention: "{possible_response.get('specific_intention')}"
-            text: "{possible_response.get('text')}"
-        }}
-        '''
+        possible_response_input = Mutation.message_input(possible_response, 'response')
 
         mutation = f'''
         mutation {{
             assign_response(input:{{
-                text: "{text}"
+                text: {json.dumps(str(text))}
                 {possible_response_input}
             }}){{
                 messages {{
@@ -358,3 +462,8 @@ class Mutation:
         '''
 
         return gql(mutation)
+
+
+# Clients compartilhados, um pool de conexões por upstream
+lisa_client = GraphQLClient(LISA_URL)
+backend_client = GraphQLClient(BACKEND_URL)
@@ -1,5 +1,73 @@
-from core.model_loader import IntentionResponseGAN
-from core.training.text_gen import sample
+from core.inference import CharRNNSampler
+from core.model_loader import IntentionResponseGAN, model_registry
+from core.executor import cpu_executor
+from core.response_pool import ResponsePools
+
+# Resposta dos geradores quando a geração na hora estoura o prazo
+FALLBACK_RESPONSE = 'Hmm... deu branco aqui'
+
+
+def response_sampler(name):
+    """
+    Retorna o amostrador do gerador de respostas `name`. O amostrador (com
+    cópias float32 dos parâmetros) é mantido pelo model_registry junto ao
+    gerador: conta no limite de memória dos geradores e é descartado quando
+    o gerador é descarregado ou recarregado.
+
+    param : name : <str> : nome do atributo em IntentionResponseGAN;
+    return : <CharRNNSampler>
+    """
+    return model_registry.get_derived(name, CharRNNSampler)
+
+
+def response_candidates(name, count, n=1000):
+    """
+    Gera, em lote, `count` respostas candidatas do gerador `name`.
+
+    param : name : <str> : nome do atributo em IntentionResponseGAN;
+    param : count : <int> : número de respostas;
+    return : <list> : respostas
+    """
+    return response_sampler(name).sample_batch(count, n)
+
+
+# Respostas prontas de cada gerador, abastecidas em segundo plano
+response_pools = ResponsePools(
+    [name for name in vars(IntentionResponseGAN) if name.endswith('_GAN')],
+    generate=response_candidates,
+    executor=cpu_executor
+)
+model_registry.add_reload_listener(response_pools.clear)
+# os processos de trabalho têm cópias dos modelos antigos: novos processos
+# são criados na próxima chamada
+model_registry.add_reload_listener(cpu_executor.shutdown)
+
+
+def sample_response(name, n=1000):
+    """
+    Gera na hora uma resposta do gerador `name`.
+    """
+    return response_sampler(name).sample(n)
+
+
+def generate_response(name):
+    """
+    Retorna uma resposta do gerador `name`: uma resposta pronta da pool ou,
+    se ela estiver vazia, uma resposta gerada na hora no executor de CPU,
+    com prazo. Estourado o prazo, retorna FALLBACK_RESPONSE.
+
+    Deve ser chamado fora do event loop (run_blocking).
+
+    param : name : <str> : nome do atributo em IntentionResponseGAN;
+    return : <str>
+    """
+    response = response_pools.pop(name)
+    if response is None:
+        response = cpu_executor.run_threadsafe(
+            'response', sample_response, name,
+            fallback=lambda: FALLBACK_RESPONSE
+        )
+    return response
 
 
 class ResponseGenerator:
@@ -8,120 +76,80 @@ class ResponseGenerator:
     """
     @staticmethod
     def get_who_am_i_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.WHO_AM_I_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('WHO_AM_I_GAN')
 
     @staticmethod
     def get_acknowledge_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.ACKNOWLEDGEMENT_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('ACKNOWLEDGEMENT_GAN')
 
     @staticmethod
     def get_forbidden_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.FORBIDDEN_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('FORBIDDEN_GAN')
 
     @staticmethod
     def get_funny_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.FUNNY_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('FUNNY_GAN')
 
     @staticmethod
     def get_greeting_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.GREETING_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('GREETING_GAN')
 
     @staticmethod
     def get_helpful_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.HELPFUL_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('HELPFUL_GAN')
 
     @staticmethod
     def get_illegal_stuff_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.ILLEGAL_STUFF_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('ILLEGAL_STUFF_GAN')
 
     @staticmethod
     def get_music_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.MUSIC_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('MUSIC_GAN')
 
     @staticmethod
     def get_my_age_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.MY_AGE_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('MY_AGE_GAN')
 
 
     def get_my_gender_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.MY_GENDER_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('MY_GENDER_GAN')
 
     @staticmethod
     def get_praise_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.PRAISE
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('PRAISE_GAN')
 
     @staticmethod
     def get_racism_xenophobia_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.RACISM_XENOPHOBIA_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('RACISM_XENOPHOBIA_GAN')
 
     @staticmethod
     def get_sexual_abuse_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.SEXUAL_ABUSE_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('SEXUAL_ABUSE_GAN')
 
     @staticmethod
     def get_sorry_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.SORRY_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('SORRY_GAN')
 
     @staticmethod
     def get_sports_and_playing_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.SPORTS_AND_PLAYING_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('SPORTS_AND_PLAYING_GAN')
 
     @staticmethod
     def get_suicide_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.SUICIDE_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('SUICIDE_GAN')
 
     @staticmethod
     def get_threat_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.TRHEAT_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('TRHEAT_GAN')
 
     @staticmethod
     def get_verbal_offense_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.VERBAL_OFFENSE_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('VERBAL_OFFENSE_GAN')
 
     @staticmethod
     def get_what_am_i_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.WHAT_AM_I_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('WHAT_AM_I_GAN')
 
     @staticmethod
     def get_goodbye_response(**kwargs):
-        model, idx_to_chars, chars_to_idx = IntentionResponseGAN.WHAT_AM_I_GAN
-
-        return sample(model, chars_to_idx, idx_to_chars, 1000)
+        return generate_response('WHAT_AM_I_GAN')
@@ -0,0 +1,433 @@
+"""
+Fast inference paths for the trained models.
+
+The sklearn models stay loaded as the reference implementation; the classes
+here evaluate their parameters with plain NumPy on float32 arrays and fall
+back to sklearn whenever the float32 result could differ from it. The
+char-RNN sampler draws from the same distribution as `text_gen.sample`.
+"""
+import numpy as np
+
+# Float32 rounding error bound, relative to sum(|w * x|) + |b| (or to the
+# L1 norms for distances), for the 96-d sums (~ n * eps32, with a safety
+# factor)
+FLOAT32_ERROR = 2e-5
+
+# Same bound for float64, used to recheck the float32 near ties
+FLOAT64_ERROR = 1e-13
+
+# Queries per chunk on the brute force neighbours search, bounding the
+# (chunk, points, features) difference tensor
+NEIGHBORS_CHUNK_SIZE = 16
+
+# From this many queries per call, the sklearn tree search is faster than
+# the brute force one and the queries are sent to it
+NEIGHBORS_SKLEARN_BATCH = 256
+
+
+def is_fusable(model):
+    """
+    Checks whether a model is a multiclass linear model whose prediction is
+    the argmax of `x @ coef.T + intercept`, such as LogisticRegression.
+    """
+    coef = getattr(model, 'coef_', None)
+    classes = getattr(model, 'classes_', None)
+    return (
+        coef is not None and classes is not None and
+        coef.ndim == 2 and coef.shape[0] == len(classes) > 2
+    )
+
+
+class FusedLinearClassifier:
+    """
+    Evaluates a root linear classifier and its linear branch classifiers
+    (one per root label) with a single float32 matmul.
+
+    The coefficients of every model are stacked into one weights matrix, so a
+    vector is scored by the root model and all branches at once; the branch
+    of the predicted root label is then read from its rows. Whenever the
+    best and second best scores of a stage are closer than the float32
+    rounding error, the stage is predicted by the sklearn model instead, so
+    the predictions are always the same as sklearn's.
+
+    param : root : <LogisticRegression>
+    param : branches : <dict> : {root label: <LogisticRegression>}
+    """
+    def __init__(self, root, branches):
+        self.root = root
+        self.branches = {}
+
+        models = [root] + list(branches.values())
+        self.weights = np.vstack([m.coef_ for m in models]).astype(np.float32)
+        self.bias = np.concatenate([m.intercept_ for m in models]).astype(np.float32)
+        self.abs_weights = np.abs(self.weights)
+        self.abs_bias = np.abs(self.bias)
+
+        start = len(root.classes_)
+        self.root_slice = slice(0, start)
+        for label, model in branches.items():
+            end = start + len(model.classes_)
+            self.branches[label] = (model, slice(start, end))
+            start = end
+
+        self.stats = {'predictions': 0, 'fallbacks': 0}
+
+    @staticmethod
+    def _argmax(scores, errors):
+        """
+        Returns the index of the best score, or None when it can not be told
+        apart from the second best one within the rounding error.
+        """
+        best, second = np.argpartition(-scores, 1)[:2]
+        # ties are always within the error, so sklearn decides them
+        if scores[best] - scores[second] <= errors[best] + errors[second]:
+            return None
+        return best
+
+    def _stage(self, model, scores, errors, vector):
+        index = self._argmax(scores, errors)
+        if index is None:
+            self.stats['fallbacks'] += 1
+            return model.predict(vector.reshape(1, -1).astype(np.float64))[0]
+        return model.classes_[index]
+
+    def _stage_batch(self, model, scores, errors, vectors):
+        rows = np.arange(len(scores))
+        top = np.argpartition(-scores, 1, axis=1)
+        best, second = top[:, 0], top[:, 1]
+        ambiguous = (
+            scores[rows, best] - scores[rows, second] <=
+            errors[rows, best] + errors[rows, second]
+        )
+
+        labels = model.classes_[best]
+        if ambiguous.any():
+            self.stats['fallbacks'] += int(ambiguous.sum())
+            labels[ambiguous] = model.predict(vectors[ambiguous].astype(np.float64))
+        return labels
+
+    def predict_batch(self, vectors):
+        """
+        Predicts the root and branch labels of every row of a matrix, with a
+        single matmul for the whole batch.
+
+        param : vectors : <np.array> : 2-d matrix, one vector per row;
+        return : <tuple> : (root labels, branch labels, None where the root
+                            label has no fused branch)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scores = vectors @ self.weights.T + self.bias
+        errors = FLOAT32_ERROR * (np.abs(vectors) @ self.abs_weights.T + self.abs_bias)
+        self.stats['predictions'] += len(vectors)
+
+        root_labels = self._stage_batch(
+            self.root, scores[:, self.root_slice], errors[:, self.root_slice], vectors
+        )
+        branch_labels = np.full(len(vectors), None, dtype=object)
+        for label, (model, columns) in self.branches.items():
+            rows = np.flatnonzero(root_labels == label)
+            if rows.size:
+                branch_labels[rows] = self._stage_batch(
+                    model, scores[rows, columns], errors[rows, columns], vectors[rows]
+                )
+
+        return root_labels, list(branch_labels)
+
+    def predict(self, vector):
+        """
+        Predicts the root label and, if the root label has a fused branch,
+        the branch label.
+
+        param : vector : <np.array> : 1-d feature vector;
+        return : <tuple> : (root label, branch label or None)
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        scores = self.weights @ vector + self.bias
+        errors = FLOAT32_ERROR * (self.abs_weights @ np.abs(vector) + self.abs_bias)
+        self.stats['predictions'] += 1
+
+        root_label = self._stage(
+            self.root, scores[self.root_slice], errors[self.root_slice], vector
+        )
+        if root_label not in self.branches:
+            return root_label, None
+
+        model, rows = self.branches[root_label]
+        return root_label, self._stage(model, scores[rows], errors[rows], vector)
+
+    def get_stats(self):
+        return dict(self.stats)
+
+
+def is_brute_forceable(model):
+    """
+    Checks whether a model is a uniform weighted L1 KNeighborsClassifier,
+    whose predictions the BruteForceNeighbors backend reproduces.
+    """
+    metric = getattr(model, 'effective_metric_', None)
+    fit_x = getattr(model, '_fit_X', None)
+    return (
+        metric in ('manhattan', 'cityblock', 'l1') and
+        getattr(model, 'weights', None) == 'uniform' and
+        fit_x is not None and len(fit_x) > model.n_neighbors
+    )
+
+
+class BruteForceNeighbors:
+    """
+    Nearest neighbours backend for L1 KNeighborsClassifier models: the
+    training vectors are kept as one contiguous float32 matrix and each
+    chunk of queries is compared to all of them with vectorized NumPy,
+    instead of walking the sklearn tree one query at a time.
+
+    Whenever points of different classes are as close to a query as its
+    k-th nearest neighbour, within the float32 rounding error, the vote
+    could differ from sklearn's: the query is then rechecked in float64
+    and, if still ambiguous (a real tie), predicted by the sklearn model.
+
+    Has the same predict interface as the sklearn model it replaces.
+
+    param : model : <KNeighborsClassifier>
+    """
+    def __init__(self, model):
+        self.model = model
+        self.classes_ = model.classes_
+        self.k = model.n_neighbors
+        self.points = np.ascontiguousarray(model._fit_X, dtype=np.float32)
+        self.point_norms = np.abs(self.points).sum(axis=1)
+        self.points64 = np.asarray(model._fit_X, dtype=np.float64)
+        self.point_norms64 = np.abs(self.points64).sum(axis=1)
+        self.labels = np.asarray(model._y)
+        self.stats = {'predictions': 0, 'rechecks': 0, 'fallbacks': 0, 'sklearn_batches': 0}
+
+    def _predict_chunk(self, vectors, points, point_norms, error):
+        rows = np.arange(len(vectors))
+        distances = np.abs(vectors[:, None, :] - points[None, :, :]).sum(axis=2)
+        errors = error * (
+            np.abs(vectors).sum(axis=1)[:, None] + point_norms[None, :]
+        )
+
+        # the k nearest points and the farthest of them
+        nearest = np.argpartition(distances, self.k - 1, axis=1)[:, :self.k]
+        near_distances = np.take_along_axis(distances, nearest, axis=1)
+        last = nearest[rows, near_distances.argmax(axis=1)]
+
+        # points as close as the k-th nearest one, within the rounding error,
+        # may be in or out of the sklearn neighbourhood; this only matters
+        # when some of them are left out and their labels disagree
+        band = (
+            np.abs(distances - distances[rows, last][:, None]) <=
+            errors + errors[rows, last][:, None]
+        )
+        left_out = band.sum(axis=1) > band[rows[:, None], nearest].sum(axis=1)
+        highest = np.where(band, self.labels, -1).max(axis=1)
+        lowest = np.where(band, self.labels, len(self.classes_)).min(axis=1)
+        ambiguous = left_out & (highest != lowest)
+
+        # majority vote, ties going to the first class as in sklearn
+        votes = self.labels[nearest]
+        counts = (votes[:, :, None] == np.arange(len(self.classes_))).sum(axis=1)
+        return self.classes_[counts.argmax(axis=1)], ambiguous
+
+    def _predict(self, vectors, points, point_norms, error):
+        chunks = [
+            self._predict_chunk(
+                vectors[start:start + NEIGHBORS_CHUNK_SIZE], points, point_norms, error
+            )
+            for start in range(0, len(vectors), NEIGHBORS_CHUNK_SIZE)
+        ]
+        predictions = np.concatenate([chunk[0] for chunk in chunks])
+        ambiguous = np.concatenate([chunk[1] for chunk in chunks])
+        return predictions, ambiguous
+
+    def predict(self, vectors):
+        """
+        Predicts the class of every query vector.
+
+        param : vectors : <np.array> or <list> : one vector per row;
+        return : <np.array>
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.points.shape[1])
+        self.stats['predictions'] += len(vectors)
+        if not len(vectors):
+            return self.classes_[:0]
+
+        if len(vectors) >= NEIGHBORS_SKLEARN_BATCH:
+            self.stats['sklearn_batches'] += 1
+            return self.model.predict(vectors.astype(np.float64))
+
+        predictions, ambiguous = self._predict(
+            vectors, self.points, self.point_norms, FLOAT32_ERROR
+        )
+        if not ambiguous.any():
+            return predictions
+
+        # float32 near ties are rechecked in float64
+        rows = np.flatnonzero(ambiguous)
+        self.stats['rechecks'] += len(rows)
+        queries = vectors[rows].astype(np.float64)
+        predictions[rows], ties = self._predict(
+            queries, self.points64, self.point_norms64, FLOAT64_ERROR
+        )
+
+        # a single sklearn call for the remaining ties
+        if ties.any():
+            self.stats['fallbacks'] += int(ties.sum())
+            predictions[rows[ties]] = self.model.predict(queries[ties])
+
+        return predictions
+
+    def get_stats(self):
+        return dict(self.stats)
+
+
+class CharRNNSampler:
+    """
+    Inference sampler for the char-RNN text generators, equivalent to
+    `core.training.text_gen.sample` but without its per character costs:
+
+    - the input of each step is read as a column of Wxh (kept as the rows of
+      its transpose) instead of multiplying Wxh by a one-hot vector;
+    - the biases are folded into Whh and Why as an extra column, matched by
+      a constant 1 at the end of the hidden state;
+    - the parameters are kept as contiguous float32 arrays and every step
+      writes to buffers allocated once per text;
+    - the uniforms of the whole sequence are drawn at once and each
+      character is sampled by inverse CDF, as `np.random.choice` does;
+    - the text is built from an index to char array.
+
+    The uniforms come from the global NumPy random state, in the same order
+    as `sample` draws them, so both return the same text for the same seed
+    (though the sampler draws n + 1 uniforms per text).
+
+    param : model : <list> : [parameters, chars_to_idx, idx_to_chars], as
+                             loaded from the generator file;
+    param : dtype : numpy float type of the parameters;
+    """
+    def __init__(self, model, dtype=np.float32):
+        parameters, chars_to_idx, idx_to_chars = model
+        whh, wxh, why = parameters['Whh'], parameters['Wxh'], parameters['Why']
+        n_h, vocab_size = wxh.shape
+
+        self.whh = np.ascontiguousarray(np.hstack([whh, parameters['b']]), dtype=dtype)
+        self.why = np.ascontiguousarray(np.hstack([why, parameters['c']]), dtype=dtype)
+        # one row per input char, plus a zero row for the first step
+        self.inputs = np.zeros((vocab_size + 1, n_h), dtype=dtype)
+        self.inputs[:vocab_size] = wxh.T
+        self.start = vocab_size
+
+        # |h| <= 1, so the logits are bounded by the Why row norms; only
+        # models whose logits could overflow exp are shifted by their max
+        bound = (np.abs(why).sum(axis=1) + np.abs(parameters['c'].ravel())).max()
+        self.shift = bound > np.log(np.finfo(dtype).max) / 2
+
+        self.chars = np.array([idx_to_chars[idx] for idx in range(vocab_size)], dtype=object)
+        self.end = chars_to_idx['\n']
+        self.stats = {'samples': 0, 'chars': 0}
+
+    def sample(self, n):
+        """
+        Samples a text of at most n + 1 characters, ending at the first line
+        break.
+
+        param : n : <int>
+        return : <str>
+        """
+        whh, why, inputs = self.whh, self.why, self.inputs
+        last, end, shift = len(self.chars) - 1, self.end, self.shift
+
+        # buffers reused by every step (per call, as the generators may be
+        # sampled by several threads at once)
+        state = np.zeros(len(whh) + 1, dtype=whh.dtype)
+        state[-1] = 1
+        hidden = state[:-1]
+        pre_activation = np.empty(len(whh), dtype=whh.dtype)
+        logits = np.empty(last + 1, dtype=whh.dtype)
+        cdf = np.empty(last + 1, dtype=whh.dtype)
+        uniforms = np.random.random_sample(n + 1)
+        indices = np.empty(n + 1, dtype=np.intp)
+
+        idx = self.start
+        size = 0
+        while size <= n and idx != end:
+            np.dot(whh, state, out=pre_activation)
+            pre_activation += inputs[idx]
+            np.tanh(pre_activation, out=hidden)
+
+            np.dot(why, state, out=logits)
+            if shift:
+                logits -= logits.max()
+            np.exp(logits, out=logits)
+            np.cumsum(logits, out=cdf)
+
+            idx = int(cdf.searchsorted(uniforms[size] * cdf[last], side='right'))
+            if idx > last:
+                idx = last
+            indices[size] = idx
+            size += 1
+
+        self.stats['samples'] += 1
+        self.stats['chars'] += size
+        indices = indices[:size]
+        return ''.join(self.chars[indices[indices != 0]])
+
+    def sample_batch(self, count, n):
+        """
+        Samples `count` independent texts at once, as `sample` would: their
+        hidden states advance together as one (n_h + 1, count) matrix, so
+        each step costs two matmuls for all the texts. Texts that reached the
+        line break keep being computed with the others, but their characters
+        are ignored; the steps stop when every text has finished.
+
+        param : count : <int> : number of texts;
+        param : n : <int>
+        return : <list> : texts
+        """
+        whh, why, inputs = self.whh, self.why, self.inputs
+        last, end, shift = len(self.chars) - 1, self.end, self.shift
+
+        state = np.zeros((len(whh) + 1, count), dtype=whh.dtype)
+        state[-1] = 1
+        hidden = state[:-1]
+        pre_activation = np.empty((len(whh), count), dtype=whh.dtype)
+        logits = np.empty((last + 1, count), dtype=whh.dtype)
+        cdf = np.empty_like(logits)
+        uniforms = np.random.random_sample((n + 1, count))
+        indices = np.empty((n + 1, count), dtype=np.intp)
+        finished = np.zeros(count, dtype=bool)
+
+        idx = np.full(count, self.start)
+        steps = 0
+        while steps <= n and not finished.all():
+            np.dot(whh, state, out=pre_activation)
+            pre_activation += inputs[idx].T
+            np.tanh(pre_activation, out=hidden)
+
+            np.dot(why, state, out=logits)
+            if shift:
+                logits -= logits.max(axis=0)
+            np.exp(logits, out=logits)
+            np.cumsum(logits, axis=0, out=cdf)
+
+            # inverse CDF of every column: the number of cdf values <= target
+            idx = (cdf[:last] <= uniforms[steps] * cdf[last]).sum(axis=0)
+            indices[steps] = idx
+            finished |= idx == end
+            steps += 1
+
+        # each text ends at its first line break
+        ends = indices[:steps] == end
+        sizes = np.where(ends.any(axis=0), ends.argmax(axis=0) + 1, steps)
+
+        texts = []
+        for column, size in enumerate(sizes):
+            text = indices[:size, column]
+            texts.append(''.join(self.chars[text[text != 0]]))
+
+        self.stats['samples'] += count
+        self.stats['chars'] += int(sizes.sum())
+        return texts
+
+    def get_stats(self):
+        return dict(self.stats)
+
@@ -0,0 +1,172 @@
+"""
+Bundle format for the trained models.
+
+A bundle is a directory next to the model file (`<model>.bundle/`) holding a
+`manifest.json` with the model type, parameters and metadata, plus one raw
+`.npy` file per array. The arrays are loaded without pickle and may be
+memory mapped, so processes on the same host share their pages through the
+OS page cache.
+"""
+import json
+import os
+import shutil
+import numpy as np
+
+BUNDLE_SUFFIX = '.bundle'
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+CHAR_RNN = 'char_rnn'
+LOGISTIC_REGRESSION = 'logistic_regression'
+KNEIGHBORS = 'kneighbors'
+
+
+def bundle_path(fpath):
+    return f'{fpath}{BUNDLE_SUFFIX}'
+
+
+def has_bundle(fpath):
+    return os.path.isfile(os.path.join(bundle_path(fpath), MANIFEST))
+
+
+def _json_params(model):
+    """
+    Returns the estimator constructor parameters that can be stored as json.
+    """
+    params = {}
+    for key, value in model.get_params().items():
+        try:
+            json.dumps(value)
+        except TypeError:
+            continue
+        params[key] = value
+    return params
+
+
+def _estimator(cls, params):
+    """
+    Instantiates an estimator with the stored parameters it still accepts.
+    """
+    accepted = cls().get_params()
+    return cls(**{key: value for key, value in params.items() if key in accepted})
+
+
+def describe_model(model):
+    """
+    Splits a model into its manifest (type, metadata) and its arrays.
+
+    param : model : char-RNN list, LogisticRegression or KNeighborsClassifier;
+    return : <tuple> : (<dict> manifest, <dict> arrays)
+    """
+    if isinstance(model, (list, tuple)) and len(model) == 3:
+        parameters, chars_to_idx, idx_to_chars = model
+        return {
+            'type': CHAR_RNN,
+            'chars_to_idx': chars_to_idx,
+            'idx_to_chars': {str(idx): char for idx, char in idx_to_chars.items()},
+        }, dict(parameters)
+
+    name = type(model).__name__
+    if name == 'LogisticRegression':
+        return {'type': LOGISTIC_REGRESSION, 'params': _json_params(model)}, {
+            'coef': model.coef_,
+            'intercept': model.intercept_,
+            'classes': model.classes_,
+        }
+
+    if name == 'KNeighborsClassifier':
+        return {'type': KNEIGHBORS, 'params': _json_params(model)}, {
+            'fit_x': model._fit_X,
+            'y': model.classes_[model._y],
+        }
+
+    raise ValueError(f'Model type {name} has no bundle format')
+
+
+def export_bundle(model, fpath):
+    """
+    Writes a model as a bundle next to `fpath`. The bundle is written to a
+    temporary directory and then moved over the previous one.
+
+    param : model : model object;
+    param : fpath : <str> : model file path (without the bundle suffix);
+    return : <str> : bundle path
+    """
+    manifest, arrays = describe_model(model)
+    manifest['format'] = FORMAT_VERSION
+    manifest['arrays'] = {}
+
+    path = bundle_path(fpath)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        np.save(os.path.join(tmp_path, f'{name}.npy'), array, allow_pickle=False)
+        manifest['arrays'][name] = {
+            'file': f'{name}.npy',
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+        }
+
+    with open(os.path.join(tmp_path, MANIFEST), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, ensure_ascii=False)
+
+    old_path = f'{path}.old-{os.getpid()}'
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    return path
+
+
+def load_bundle(fpath, mmap_mode='r'):
+    """
+    Loads a model from its bundle, without unpickling anything.
+
+    param : fpath : <str> : model file path (without the bundle suffix);
+    param : mmap_mode : <str> or None : numpy memory map mode;
+    return : model object, as it was exported
+    """
+    path = bundle_path(fpath)
+    with open(os.path.join(path, MANIFEST)) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f'Unsupported bundle format {manifest.get("format")} at {path}')
+
+    arrays = {}
+    for name, spec in manifest['arrays'].items():
+        array = np.load(
+            os.path.join(path, spec['file']), mmap_mode=mmap_mode, allow_pickle=False
+        )
+        if array.dtype.str != spec['dtype'] or list(array.shape) != spec['shape']:
+            raise ValueError(f'Array {name} does not match the manifest at {path}')
+        arrays[name] = array
+
+    model_type = manifest['type']
+    if model_type == CHAR_RNN:
+        idx_to_chars = {int(idx): char for idx, char in manifest['idx_to_chars'].items()}
+        return [arrays, manifest['chars_to_idx'], idx_to_chars]
+
+    if model_type == LOGISTIC_REGRESSION:
+        from sklearn.linear_model import LogisticRegression
+
+        model = _estimator(LogisticRegression, manifest['params'])
+        model.coef_ = arrays['coef']
+        model.intercept_ = arrays['intercept']
+        model.classes_ = arrays['classes']
+        model.n_features_in_ = arrays['coef'].shape[1]
+        return model
+
+    if model_type == KNEIGHBORS:
+        from sklearn.neighbors import KNeighborsClassifier
+
+        # the search tree is rebuilt from the stored points, which is cheap
+        # and gives the same neighbours as the exported model
+        model = _estimator(KNeighborsClassifier, manifest['params'])
+        return model.fit(arrays['fit_x'], arrays['y'])
+
+    raise ValueError(f'Unknown bundle model type {model_type} at {path}')
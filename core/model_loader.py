@@ -1,55 +1,397 @@
 """
-Contains the trained models loaded and encapsulated in a class.
+Contains the trained models, loaded on first access and encapsulated in a
+class.
 """
+import logging
+import os
 import pickle
+import threading
+from collections import OrderedDict
+from time import perf_counter
+import numpy as np
+from core.model_bundle import (has_bundle, load_bundle, export_bundle,
+                               bundle_path, MANIFEST)
+from luci.settings import MODELS_DIR, MODELS_GENERATORS_MEMORY_MB, MODELS_MMAP
+
+log = logging.getLogger()
+
+# Geração dos modelos carregados. É incrementada sempre que os modelos são
+# recarregados, invalidando os resultados guardados em cache.
+_model_generation = 0
+
+
+def get_model_generation():
+    return _model_generation
+
+
+def new_model_generation():
+    """
+    Marca os modelos carregados como uma nova geração.
+
+    return : <int> : nova geração
+    """
+    global _model_generation
+    _model_generation += 1
+    return _model_generation
 
 
 def load_model(fpath):
     """
-    Loads a trained machine learning model.
+    Loads a trained machine learning model, from its bundle when exported
+    (memory mapped if MODELS_MMAP is set) or else from the pickle file.
 
     param : fpath: <str> : file path to the model
     """
+    if has_bundle(fpath):
+        return load_bundle(fpath, mmap_mode='r' if MODELS_MMAP else None)
+
     with open(fpath, 'rb') as trained_model:
         model = pickle.load(trained_model)
 
     return model
 
 
+def validate_model(kind, model, current=None):
+    """
+    Smoke tests a freshly loaded model before it replaces the current one,
+    raising ValueError if it can not predict or generate.
+
+    param : kind : <str> : ModelRegistry.CLASSIFIER or GENERATOR;
+    param : model : loaded model;
+    param : current : model being replaced, if loaded;
+    """
+    if kind == ModelRegistry.GENERATOR:
+        from core.training.text_gen import sample
+
+        parameters, chars_to_idx, idx_to_chars = model
+        vocab_size = parameters['c'].shape[0]
+        if parameters['Wxh'].shape[1] != vocab_size or len(idx_to_chars) != vocab_size:
+            raise ValueError('Generator vocabulary does not match its parameters')
+        if '\n' not in chars_to_idx:
+            raise ValueError('Generator vocabulary has no line break')
+        if not isinstance(sample(parameters, idx_to_chars, chars_to_idx, 20), str):
+            raise ValueError('Generator did not sample a text')
+        return
+
+    n_features = getattr(model, 'n_features_in_', None)
+    if n_features is None:
+        n_features = model.coef_.shape[1] if hasattr(model, 'coef_') else model._fit_X.shape[1]
+    if current is not None:
+        current_features = getattr(current, 'n_features_in_', None)
+        if current_features is not None and current_features != n_features:
+            raise ValueError(
+                f'Classifier expects {n_features} features instead of {current_features}'
+            )
+
+    label = model.predict(np.zeros((1, n_features)))[0]
+    if label not in model.classes_:
+        raise ValueError('Classifier predicted an unknown class')
+
+
+def model_size(model):
+    """
+    Returns the bytes taken by the numpy arrays of a loaded model.
+
+    param : model : a model object or a list/dict of them
+    return : <int>
+    """
+    if isinstance(model, np.ndarray):
+        return model.nbytes
+    if isinstance(model, dict):
+        return sum(model_size(value) for value in model.values())
+    if isinstance(model, (list, tuple)):
+        return sum(model_size(value) for value in model)
+    if hasattr(model, '__dict__'):
+        return model_size(vars(model))
+    return 0
+
+
+class ModelRegistry:
+    """
+    Loads each registered model from MODELS_DIR on its first access.
+
+    Classifiers stay loaded once used. Generators (the char-RNNs) are
+    unloaded, least recently used first, whenever the loaded ones take more
+    than `generators_memory` bytes; they are loaded again on their next use.
+
+    Objects derived from a model (such as its inference sampler) are kept
+    with it, counted in its size, and dropped when it is unloaded or
+    reloaded.
+    """
+    CLASSIFIER = 'classifier'
+    GENERATOR = 'generator'
+
+    def __init__(self, models_dir=MODELS_DIR,
+                 generators_memory=MODELS_GENERATORS_MEMORY_MB * 1024 * 1024):
+        self.models_dir = models_dir
+        self.generators_memory = generators_memory
+        self.files = {}
+        self.kinds = {}
+        self.models = {}
+        self.sizes = {}
+        self.derived = {}
+        self.generators = OrderedDict()
+        self.stats = {'loads': 0, 'unloads': 0, 'reloads': 0, 'failed_reloads': 0}
+        self.reload_listeners = []
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._model_locks = {}
+
+    def register(self, name, fname, kind):
+        self.files[name] = fname
+        self.kinds[name] = kind
+        self._model_locks[name] = threading.Lock()
+
+    def path(self, name):
+        return f'{self.models_dir}/{self.files[name]}'
+
+    def load(self, name):
+        """
+        Loads a model from its file, without registering it as loaded.
+        """
+        start = perf_counter()
+        model = load_model(self.path(name))
+        log.info(
+            'Loaded model %s in %.1f ms (%.1f KB)',
+            name, (perf_counter() - start) * 1000, model_size(model) / 1024
+        )
+        return model
+
+    def get(self, name):
+        """
+        Returns a model, loading it on the first access.
+
+        param : name : <str> : registered model name;
+        """
+        model = self.models.get(name)
+        if model is None:
+            # one thread loads each model while the others wait for it
+            with self._model_locks[name]:
+                model = self.models.get(name)
+                if model is None:
+                    model = self.load(name)
+                    self._store(name, model)
+
+        if self.kinds[name] == self.GENERATOR:
+            with self._lock:
+                if name in self.generators:
+                    self.generators.move_to_end(name)
+
+        return model
+
+    def get_derived(self, name, build):
+        """
+        Returns an object derived from a model, built by `build(model)` on
+        its first use and kept while the model stays loaded.
+
+        param : name : <str> : registered model name;
+        param : build : function from the model to the derived object;
+        """
+        model = self.get(name)
+        with self._lock:
+            entry = self.derived.get(name)
+        if entry is not None and entry[0] is model:
+            return entry[1]
+
+        derived = build(model)
+        with self._lock:
+            # the model may have been unloaded or reloaded meanwhile
+            if self.models.get(name) is model:
+                previous = self.derived.get(name)
+                if previous is not None:
+                    self.sizes[name] -= model_size(previous[1])
+                self.derived[name] = (model, derived)
+                self.sizes[name] += model_size(derived)
+                if self.kinds[name] == self.GENERATOR:
+                    self._unload_generators(keep=name)
+
+        return derived
+
+    def _store(self, name, model):
+        with self._lock:
+            self.models[name] = model
+            self.sizes[name] = model_size(model)
+            self.stats['loads'] += 1
+
+            if self.kinds[name] == self.GENERATOR:
+                self.generators[name] = True
+                self.generators.move_to_end(name)
+                self._unload_generators(keep=name)
+
+    def _unload_generators(self, keep):
+        loaded = sum(self.sizes[name] for name in self.generators)
+        for name in list(self.generators):
+            if loaded <= self.generators_memory:
+                break
+            if name == keep:
+                continue
+
+            del self.generators[name]
+            del self.models[name]
+            self.derived.pop(name, None)
+            loaded -= self.sizes.pop(name)
+            self.stats['unloads'] += 1
+            log.info('Unloaded model %s', name)
+
+    def fingerprint(self):
+        """
+        Returns the modification times of the registered model files, which
+        change whenever the models are retrained or exported.
+        """
+        times = {}
+        for name in self.files:
+            path = self.path(name)
+            for fpath in (os.path.join(bundle_path(path), MANIFEST), path):
+                try:
+                    times[fpath] = os.stat(fpath).st_mtime
+                except OSError:
+                    pass
+        return times
+
+    def add_reload_listener(self, listener):
+        """
+        Registers a function called after the models are reloaded (such as
+        flushing caches built from model predictions).
+        """
+        self.reload_listeners.append(listener)
+
+    def reload(self):
+        """
+        Loads again every loaded model from its current file, validates the
+        new models with a smoke prediction and swaps them all at once.
+
+        The models in use keep answering while the new ones are loaded, and
+        are kept if any new model fails to load or validate.
+
+        return : <list> : reloaded model names
+        """
+        with self._reload_lock:
+            names = list(self.models)
+            try:
+                new_models = {}
+                for name in names:
+                    model = self.load(name)
+                    validate_model(self.kinds[name], model, self.models.get(name))
+                    new_models[name] = model
+            except Exception:
+                self.stats['failed_reloads'] += 1
+                raise
+
+            with self._lock:
+                # generators unloaded meanwhile are not brought back
+                new_models = {
+                    name: model for name, model in new_models.items()
+                    if name in self.models
+                }
+                models = dict(self.models)
+                models.update(new_models)
+                # a single reference swap: readers see the old or new models
+                self.models = models
+                for name, model in new_models.items():
+                    self.sizes[name] = model_size(model)
+                    self.derived.pop(name, None)
+                self.stats['reloads'] += 1
+
+            generation = new_model_generation()
+            log.info('Reloaded %d models (generation %d)', len(names), generation)
+
+        for listener in self.reload_listeners:
+            listener()
+
+        return names
+
+    def export_bundles(self):
+        """
+        Exports every registered model to the bundle format.
+        """
+        for name in self.files:
+            path = export_bundle(load_model(self.path(name)), self.path(name))
+            log.info('Exported model %s to %s', name, path)
+
+    def warm_up(self, kinds=(CLASSIFIER, GENERATOR)):
+        """
+        Loads every registered model of the given kinds (generators up to
+        the memory cap).
+        """
+        start = perf_counter()
+        for name, kind in self.kinds.items():
+            if kind in kinds:
+                self.get(name)
+        log.info('Models warm up done in %.2fs', perf_counter() - start)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['loaded'] = len(self.models)
+            stats['generators_loaded'] = len(self.generators)
+            stats['generators_kb'] = round(
+                sum(self.sizes[name] for name in self.generators) / 1024
+            )
+        return stats
+
+
+model_registry = ModelRegistry()
+
+
+class RegisteredModel:
+    """
+    Class attribute resolved, on each access, to a model of the registry.
+    """
+    def __init__(self, fname, kind, registry=model_registry):
+        self.fname = fname
+        self.kind = kind
+        self.registry = registry
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.registry.register(name, self.fname, self.kind)
+
+    def __get__(self, instance, owner):
+        return self.registry.get(self.name)
+
+
+def classifier(fname):
+    return RegisteredModel(fname, ModelRegistry.CLASSIFIER)
+
+
+def generator(fname):
+    return RegisteredModel(fname, ModelRegistry.GENERATOR)
+
+
 class IntentionClassifierModels:
     """
     Models for intention classification.
     """
-    GLOBAL_INTENTIONS_MODEL = load_model('luci/models/global_intentions')  # TODO get path from settings
-    MYSELF_INTENTIONS_MODEL = load_model('luci/models/myself_intentions')  # TODO get path from settings
-    PARENTS_INTENTION_MODEL = load_model('luci/models/parents_intentions')  # TODO get path from settings
-    FRIENDS_INTENTION_MODEL = load_model('luci/models/friends_intentions')  # TODO get path from settings
-    STUFF_I_LIKE_INTENTIONS_MODEL = load_model('luci/models/stuff_i_like_intentions')  # TODO get path form settings
-    GOOD_INTENTIONS_MODEL = load_model('luci/models/good_intentions')  # TODO get path from settings
-    BAD_INTENTIONS_MODEL = load_model('luci/models/bad_intentions')  # TODO get path from settings
+    GLOBAL_INTENTIONS_MODEL = classifier('global_intentions')
+    MYSELF_INTENTIONS_MODEL = classifier('myself_intentions')
+    PARENTS_INTENTION_MODEL = classifier('parents_intentions')
+    FRIENDS_INTENTION_MODEL = classifier('friends_intentions')
+    STUFF_I_LIKE_INTENTIONS_MODEL = classifier('stuff_i_like_intentions')
+    GOOD_INTENTIONS_MODEL = classifier('good_intentions')
+    BAD_INTENTIONS_MODEL = classifier('bad_intentions')
 
 
 class IntentionResponseGAN:
     """
     Models for text response generation.
     """
-    WHO_AM_I_GAN = load_model('luci/models/who_am_i_gan')
-    ACKNOWLEDGEMENT_GAN = load_model('luci/models/acknowledgement')
-    FORBIDDEN_GAN = load_model('luci/models/forbidden')
-    FUNNY_GAN = load_model('luci/models/funny')
-    GREETING_GAN = load_model('luci/models/greeting')
-    HELPFUL_GAN = load_model('luci/models/helpful')
-    ILLEGAL_STUFF_GAN = load_model('luci/models/illegal_stuff')
-    MUSIC_GAN = load_model('luci/models/music')
-    MY_AGE_GAN = load_model('luci/models/my_age')
-    MY_GENDER_GAN = load_model('luci/models/my_gender')
-    PRAISE_GAN = load_model('luci/models/praise')
-    RACISM_XENOPHOBIA_GAN = load_model('luci/models/racism_xenophobia')
-    SEXUAL_ABUSE_GAN = load_model('luci/models/sexual_abuse')
-    SORRY_GAN = load_model('luci/models/sorry')
-    SPORTS_AND_PLAYING_GAN = load_model('luci/models/sports_and_playing')
-    SUICIDE_GAN = load_model('luci/models/suicide')
-    TRHEAT_GAN = load_model('luci/models/threat')
-    VERBAL_OFFENSE_GAN = load_model('luci/models/verbal_offense')
-    WHAT_AM_I_GAN = load_model('luci/models/what_am_i')
-    GOODBYE_GAN = load_model('luci/models/goodbye')
+    WHO_AM_I_GAN = generator('who_am_i_gan')
+    ACKNOWLEDGEMENT_GAN = generator('acknowledgement')
+    FORBIDDEN_GAN = generator('forbidden')
+    FUNNY_GAN = generator('funny')
+    GREETING_GAN = generator('greeting')
+    HELPFUL_GAN = generator('helpful')
+    ILLEGAL_STUFF_GAN = generator('illegal_stuff')
+    MUSIC_GAN = generator('music')
+    MY_AGE_GAN = generator('my_age')
+    MY_GENDER_GAN = generator('my_gender')
+    PRAISE_GAN = generator('praise')
+    RACISM_XENOPHOBIA_GAN = generator('racism_xenophobia')
+    SEXUAL_ABUSE_GAN = generator('sexual_abuse')
+    SORRY_GAN = generator('sorry')
+    SPORTS_AND_PLAYING_GAN = generator('sports_and_playing')
+    SUICIDE_GAN = generator('suicide')
+    TRHEAT_GAN = generator('threat')
+    VERBAL_OFFENSE_GAN = generator('verbal_offense')
+    WHAT_AM_I_GAN = generator('what_am_i')
+    GOODBYE_GAN = generator('goodbye')
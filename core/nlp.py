@@ -0,0 +1,42 @@
+"""
+Registro do modelo de linguagem (spaCy) compartilhado por todo o processo.
+
+O modelo é carregado uma única vez, no primeiro uso, apenas com os
+componentes necessários para vetorizar textos.
+"""
+import logging
+import resource
+from threading import Lock
+from time import perf_counter
+import spacy
+from luci.settings import SPACY_MODEL, SPACY_DISABLED_PIPES
+
+log = logging.getLogger()
+
+_nlp = None
+_lock = Lock()
+
+
+def get_nlp():
+    """
+    Retorna o pipeline do spaCy do processo, carregando-o na primeira
+    chamada. Registra no log o tempo e a memória gastos no carregamento.
+    """
+    global _nlp
+
+    if _nlp is None:
+        with _lock:
+            if _nlp is None:
+                rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                start = perf_counter()
+                _nlp = spacy.load(SPACY_MODEL, disable=SPACY_DISABLED_PIPES)
+                rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                log.info(
+                    'Loaded spacy model %s (pipes: %s) in %.2fs, +%.1f MB',
+                    SPACY_MODEL,
+                    ', '.join(_nlp.pipe_names),
+                    perf_counter() - start,
+                    (rss_after - rss_before) / 1024
+                )
+
+    return _nlp
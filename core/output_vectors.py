@@ -6,32 +6,55 @@ from random import choice
 from core.enums import (GlobalIntentions, MyselfIntentions, GoodIntentions,
                         BadIntentions, AboutMyFriends, AboutMyParents, StuffILike)
 from core.gans import ResponseGenerator
-from core.emotions import EmotionHourglass
-from core.external_requests import Query
-from gql.transport.requests import RequestsHTTPTransport
-from gql import Client
-from luci.settings import BACKEND_URL
+from core.emotions import EmotionHourglass, emotion_accumulator
+from core.external_requests import Query, backend_client
 
 
-def get_how_im_feeling(**kwargs):
+async def fetch_emotions(reference):
+    """
+    Busca no backend as emoções da Luci no servidor.
+
+    param : reference : <str> : referência do servidor;
+    return : <dict> : emoções, ou None se o backend falhar
+    """
+    try:
+        response = await backend_client.execute(Query.get_emotions(reference))
+    except:
+        return None
+
+    return response.get('emotions', [None])[0]
 
+
+async def fetch_feelings(**kwargs):
+    """
+    Dados de backend para get_how_im_feeling, buscados no event loop.
+    """
     if not kwargs.get('reference'):
-        return 'Acho que não sei, to meio sei la...'
+        return {}
 
-    transport = RequestsHTTPTransport(url=BACKEND_URL, use_json=True)
-    client = Client(transport=transport, fetch_schema_from_transport=False)
-    payload = Query.get_emotions(kwargs['reference'])
+    return {'emotions': await fetch_emotions(kwargs['reference'])}
 
-    try:
-        response = client.execute(payload)
-    except:
-        return 'Buguei...'
 
-    emotions = response.get('emotions', [None])[0]
+def get_how_im_feeling(**kwargs):
+    """
+    Descreve o humor da Luci no servidor a partir das emoções já buscadas
+    por fetch_feelings (argumento `emotions`).
+    """
+    if not kwargs.get('reference'):
+        return 'Acho que não sei, to meio sei la...'
+
+    emotions = kwargs.get('emotions')
 
     if not emotions:
         return 'Buguei...'
 
+    # considera os deltas ainda não enviados ao backend
+    pending = emotion_accumulator.pending_emotion(kwargs['reference'])
+    emotions = {
+        emotion: emotions.get(emotion, 0) + delta
+        for emotion, delta in pending.items()
+    }
+
     pleasantness = choice(emotion_messages.get(
         EmotionHourglass.get_pleasantness(emotions.get('pleasantness', 0))
     ))
@@ -690,7 +713,7 @@ intention_responses = {
     GlobalIntentions.ABOUT_MYSELF: {
         MyselfIntentions.WHO_AM_I: ResponseGenerator.get_who_am_i_response,
         MyselfIntentions.WHAT_AM_I: ResponseGenerator.get_what_am_i_response,
-        MyselfIntentions.HOW_IM_FEELING: get_how_im_feeling,  # TODO: get_feeling()
+        MyselfIntentions.HOW_IM_FEELING: get_how_im_feeling,
         MyselfIntentions.MY_AGE: ResponseGenerator.get_my_age_response,
         MyselfIntentions.MY_GENDER: ResponseGenerator.get_my_gender_response,
     },
@@ -733,6 +756,12 @@ intention_responses = {
     }
 }
 
+# Respostas que dependem do backend: a coroutine associada à intenção busca,
+# no event loop, os argumentos extras do responder, que continua síncrono
+response_data = {
+    (GlobalIntentions.ABOUT_MYSELF, MyselfIntentions.HOW_IM_FEELING): fetch_feelings,
+}
+
 bored_messages = [
     'Então, será que chove?',
     'Então, que silêncio...',
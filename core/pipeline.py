@@ -0,0 +1,98 @@
+"""
+Estágios baratos do processamento de mensagens do chat.
+
+Toda mensagem passa primeiro pela normalização e pelos filtros de rejeição
+definidos aqui, antes de qualquer trabalho de modelo ou requisição de rede.
+Os estágios de aprendizado e resposta ficam em `core.commands`.
+"""
+import re
+import unicodedata
+
+NOISES = ['\n', '"', "'"]
+
+# Emojis customizados do discord: <:nome:id> ou <a:nome:id>
+CUSTOM_EMOJI = re.compile(r'<a?:\w+:\d+>')
+
+# Categorias unicode que compõem emojis (símbolos, modificadores,
+# seletores de variação e zero width joiners)
+EMOJI_CATEGORIES = {'So', 'Sk', 'Mn', 'Cf'}
+
+COMMAND_PREFIXES = '.>@,/?:;!}{[]|)(*&^%$#~'
+
+
+def normalize_text(text):
+    """
+    Remove ruídos (quebras de linha e aspas) do texto da mensagem.
+
+    param : text : <str>
+    return : <str>
+    """
+    for noise in NOISES:
+        text = re.sub(noise, ' ', text).strip()
+
+    return text
+
+
+def is_empty(text):
+    """
+    Verifica se a mensagem não possui texto (ex: apenas anexos).
+    """
+    return not text
+
+
+def is_command(text):
+    """
+    Verifica se o texto é um comando (de qualquer bot) ou começa com
+    pontuação.
+    """
+    return text.startswith(tuple(COMMAND_PREFIXES))
+
+
+def is_link(text):
+    """
+    Verifica se o texto é um link.
+    """
+    return text.startswith('http')
+
+
+def is_emoji_only(text):
+    """
+    Verifica se o texto é composto apenas por emojis.
+    """
+    remaining = CUSTOM_EMOJI.sub('', text)
+    return all(
+        char.isspace() or unicodedata.category(char) in EMOJI_CATEGORIES
+        for char in remaining
+    )
+
+
+def is_single_token(text):
+    """
+    Verifica se o texto possui menos de duas palavras.
+    """
+    return len(text.split()) < 2
+
+
+REJECTION_GATES = (
+    ('empty', is_empty),
+    ('emoji', is_emoji_only),
+    ('command', is_command),
+    ('hyperlink', is_link),
+    ('single token', is_single_token),
+)
+
+
+def rejection_reason(text):
+    """
+    Aplica os filtros baratos de rejeição em ordem, retornando o nome do
+    primeiro filtro que rejeitou o texto ou None caso o texto deva ser
+    processado.
+
+    param : text : <str> : texto normalizado;
+    return : <str> or None
+    """
+    for name, gate in REJECTION_GATES:
+        if gate(text):
+            return name
+
+    return None
@@ -1,10 +1,33 @@
+import hashlib
 from collections import Counter
 from random import randint
 import random
 import numpy as np
-from core.external_requests import Query
-from core.utils import get_gql_client, remove_id
-from luci.settings import BACKEND_URL
+from core.external_requests import Query, backend_client
+from core.context import MessageContext
+from core.executor import cpu_executor
+from core.cache import TieredCache
+from core.types import AnswerModel, CompressedDict
+from core.utils import run_blocking
+from luci.settings import (ANSWER_MODEL_CACHE_SIZE, ANSWER_MODEL_CACHE_TTL,
+                           ANSWER_MODEL_CACHE_REDIS_TTL)
+
+# Limite de passos de um episódio de treino e de uma resposta gerada: sem
+# ele, um ciclo de tokens sem saída prenderia o agente
+MAX_STEPS = 1000
+
+# Tamanho máximo de uma resposta (limite de caracteres de uma mensagem do
+# discord)
+MAX_ANSWER_LENGTH = 2000
+
+# Agentes já treinados, pelo digest das mensagens candidatas filtradas
+answer_model_cache = TieredCache(
+    'answer_model', ANSWER_MODEL_CACHE_SIZE, ttl=ANSWER_MODEL_CACHE_TTL,
+    redis_ttl=ANSWER_MODEL_CACHE_REDIS_TTL,
+    encode=lambda model: CompressedDict.encode(model.to_json()),
+    decode=lambda value: AnswerModel.from_json(CompressedDict.decode(value)),
+    blocking_codec=True
+)
 
 
 def filter_messages(messages):
@@ -47,145 +70,136 @@ def get_map(relations):
     return i_to_actions, actions_to_i
 
 
-def get_environment(relations, i_to_actions, actions_to_i):
-    environment = {}
-    for state, action in i_to_actions.items():
-        environment[state] = []
-        for fate, prob in relations[action].items():
-            if fate == 'EOS':
-                environment[-2] = [('EOS',[[-1,-1,1]])]
-            else:
-                environment[state].append((
-                    fate,
-                    [[actions_to_i[fate], randint(-3, 0), prob]]
-                ))
-    return environment
-
-
-def get_q_matrix(environment):
-    q_matrix = []
-    for _ in range(len(environment)):
-        q_matrix.append([0 for _ in range(len(environment))])
-    return q_matrix
+def get_environment(relations, actions_to_i):
+    """
+    Monta o grafo de transições entre os tokens em formato CSR: as ações do
+    estado (token) s são as arestas indptr[s]:indptr[s + 1]. Cada ação leva
+    sempre ao estado do token seguinte, next_states[e], com a recompensa
+    rewards[e]. A memória ocupada cresce com o número de pares de tokens
+    vizinhos, e não com o quadrado do vocabulário.
+
+    return : <tuple> : (<np.array> indptr, <np.array> next_states,
+                        <np.array> rewards)
+    """
+    indptr = [0]
+    next_states = []
+    rewards = []
+    for token in relations:
+        for fate in relations[token]:
+            if fate != 'EOS':
+                next_states.append(actions_to_i[fate])
+                rewards.append(randint(-3, 0))
+        indptr.append(len(next_states))
+
+    return (
+        np.array(indptr, dtype=np.int64),
+        np.array(next_states, dtype=np.int32),
+        np.array(rewards, dtype=np.int8),
+    )
 
 
 def get_exit_states(relations, actions_to_i):
-    exit_states = []
+    """
+    Retorna a máscara dos estados finais: tokens cuja continuação mais
+    frequente é o fim da mensagem.
+
+    return : <np.array> : bool, por estado
+    """
+    exit_states = np.zeros(len(actions_to_i), dtype=bool)
     for token, fates in relations.items():
         fate = list({k: v for k, v in sorted(fates.items(), key=lambda item: item[1])}.keys())
         if fate[-1] == 'EOS':
-            exit_states.append(actions_to_i[token])
+            exit_states[actions_to_i[token]] = True
 
-    exit_states += [-1, -2]
     return exit_states
 
 
-def get_possible_next_actions(cur_pos, environment):
-    if cur_pos in environment:
-        return environment[cur_pos]
-    else:
-        return []
+def train(indptr, next_states, rewards, exit_states, learning_rate=0.1, epochs=200,
+          discount=0.99, max_steps=MAX_STEPS):
+    """
+    Q-learning sobre o grafo CSR, partindo do estado 0 em cada episódio. A
+    ação de cada passo é sorteada uniformemente, em O(1), como um
+    deslocamento aleatório dentro das arestas do estado.
+
+    return : <np.array> : valor Q de cada aresta
+    """
+    # listas são mais rápidas que arrays para o acesso item a item
+    indptr, next_states = indptr.tolist(), next_states.tolist()
+    rewards, exit_states = rewards.tolist(), exit_states.tolist()
+    q_values = [0.0] * len(next_states)
+
+    for _ in range(epochs):
+        state = 0
+        for _ in range(max_steps):
+            start, end = indptr[state], indptr[state + 1]
+            if exit_states[state] or start == end:
+                break
 
+            edge = start + random.randrange(end - start)
+            next_state = next_states[edge]
 
-def get_next_state(action):
-    # word = action[0]
-    possible_states = action[1]
-    fate = {}
-    for p in possible_states:
-        s = p[0]
-        r = p[1]
-        l = p[2]
-        fate[s] = [r, l]
-    
-    # normalize
-    p = [v[1] for v in fate.values()]
-    p = np.array(p)
-    p /= p.sum()
-    next_state = np.random.choice(list(fate.keys()), 1, p=p)
-    reward = fate[next_state[0]][0]
-    return next_state[0], reward
+            next_start, next_end = indptr[next_state], indptr[next_state + 1]
+            max_value = max(q_values[next_start:next_end]) if next_start < next_end else 0
 
+            q_values[edge] += learning_rate * (
+                rewards[edge] + discount * max_value - q_values[edge]
+            )
+            state = next_state
 
-def game_over(cur_pos, exit_states):
-    return cur_pos in exit_states or cur_pos == []
+    return np.array(q_values)
 
 
-def train(environment, q_matrix, actions_to_i, exit_states, learning_rate=0.1, epochs=200):
-    discount = 0.99
-    learning_rate = 0.1
+def gen_text(model, state=0, max_steps=MAX_STEPS, max_length=MAX_ANSWER_LENGTH):
+    """
+    Gera um texto percorrendo o grafo a partir de `state`, seguindo a ação
+    de maior valor Q (ou uma ação aleatória, se o estado não foi treinado).
 
-    for _ in range(epochs):
-        # while goal state is not reached
-        cur_pos = 0
-        episode_return = 0
-        while(not game_over(cur_pos, exit_states)):
-            # get all possible next states from cur_step
-            possible_actions = get_possible_next_actions(cur_pos, environment)
-            # select any one action randomly
-            if not possible_actions:
-                break
-            action = random.choice(possible_actions)
-            word = action[0]
-            action_i = actions_to_i[word]
-            # find the next state corresponding to the action selected
-            next_state,reward = get_next_state(action)
-            episode_return+=reward
-
-            # update the q_matrix
-            next_state_possible_actions = get_possible_next_actions(next_state, environment)
-            action_values = []
-            max_value = 0
-            if next_state_possible_actions != []:
-                for action in next_state_possible_actions:
-                    action_values.append(q_matrix[next_state][actions_to_i[action[0]]])
-                max_value = max(action_values)
-            
-            q_matrix[cur_pos][action_i] = q_matrix[cur_pos][action_i] + learning_rate * (reward + discount * max_value - q_matrix[cur_pos][action_i])
-            # go to next state
-            cur_pos = next_state
-    
-    return q_matrix
-
-def gen_text(environment, q_matrix, exit_states, actions_to_i, cur_pos=0):
+    Não há resposta (texto None) se o caminho voltar a um estado do qual já
+    seguiu a ação de maior valor, pois repetiria o mesmo ciclo, nem se
+    passar de `max_length` caracteres ou de `max_steps` passos sem chegar a
+    um estado final.
+
+    param : model : <AnswerModel>
+    return : <tuple> : (<str> texto ou None, <int> recompensa total)
+    """
     episode_return = 0
     output = []
-    while(not game_over(cur_pos, exit_states)):
-        # get all possible next states from cur_step
-        possible_actions = get_possible_next_actions(cur_pos, environment)
-    
-        # select the *possible* action with highest Q value
-        action = None
-        if np.linalg.norm(q_matrix[cur_pos]) == 0:
-            action = random.choice(possible_actions)
+    length = -1
+    greedy_states = set()
+    for _ in range(max_steps):
+        start, end = model.indptr[state], model.indptr[state + 1]
+        if model.exit_states[state] or start == end:
+            break
+
+        values = model.q_values[start:end]
+        if not values.any():
+            edge = start + random.randrange(end - start)
+        elif state in greedy_states:
+            return None, episode_return
         else:
-            action = actions_to_i[possible_actions[0][0]]
-            c = 0
-            action_i = c
-            for a in possible_actions:
-                a_i = actions_to_i[a[0]]
-                if q_matrix[cur_pos][a_i] > q_matrix[cur_pos][action]:
-                    action = a_i
-                    action_i = c
-                c+=1
-            action = possible_actions[action_i]
-    
-        output.append(action[0])
-        next_state,reward = get_next_state(action)
-        episode_return+=reward
-        cur_pos = next_state
+            greedy_states.add(state)
+            edge = start + int(values.argmax())
+
+        state = int(model.next_states[edge])
+        token = model.tokens[state]
+        length += len(token) + 1
+        if length > max_length:
+            return None, episode_return
+
+        output.append(token)
+        episode_return += int(model.rewards[edge])
+    else:
+        return None, episode_return
 
     return ' '.join(output).strip(), episode_return
 
 
-def get_responses(text):
-    gql_client = get_gql_client(BACKEND_URL)
+async def get_responses(text):
     # busca possíveis respostas na memória de longo prazo
-    payload = Query.get_possible_responses(
-        text=remove_id(text)
-    )
+    payload = Query.get_possible_responses(text=text)
 
     try:
-        response = gql_client.execute(payload)
+        response = await backend_client.execute(payload)
     except Exception as _:
         response = {'messages': []}
 
@@ -196,16 +210,78 @@ def get_responses(text):
     return responses
 
 
-def generate_answer(text):
-    messages = filter_messages(get_responses(text))
+async def generate_answer(message):
+    """
+    Gera uma resposta a partir das possíveis respostas conhecidas para o
+    texto (sem menções) da mensagem.
+
+    O agente treinado sobre as mesmas mensagens candidatas é reaproveitado
+    do cache; senão, o treinamento roda no pool de processos e, se não
+    terminar no prazo, nenhuma resposta é gerada.
+
+    param : message : <str> or <MessageContext>
+    """
+    responses = await get_responses(MessageContext.of(message).clean_text)
+    messages = filter_messages(responses)
     if not messages:
         return
 
+    key = messages_digest(messages)
+    model = await answer_model_cache.get(key)
+    if model is not None:
+        return await run_blocking(answer_from_model, model)
+
+    trained = await cpu_executor.run('generate_answer', train_and_answer, messages)
+    if trained is None:
+        return
+
+    model, answer = trained
+    await answer_model_cache.set(key, model)
+    return answer
+
+
+def messages_digest(messages):
+    """
+    Retorna um hash das mensagens candidatas, na ordem recebida (que define
+    os estados do agente).
+    """
+    return hashlib.sha1('\n'.join(messages).encode('utf-8')).hexdigest()
+
+
+def train_answer_model(messages):
+    """
+    Treina o agente sobre as mensagens candidatas.
+
+    return : <AnswerModel>
+    """
     relations = get_relations(messages)
     i_to_actions, actions_to_i = get_map(relations)
-    environment = get_environment(relations, i_to_actions, actions_to_i)
-    q_matrix = get_q_matrix(environment)
+    indptr, next_states, rewards = get_environment(relations, actions_to_i)
     exit_states = get_exit_states(relations, actions_to_i)
-    kb = train(environment, q_matrix, actions_to_i, exit_states)
+    q_values = train(indptr, next_states, rewards, exit_states)
+
+    return AnswerModel(
+        tokens=list(i_to_actions.values()),
+        indptr=indptr,
+        next_states=next_states,
+        rewards=rewards,
+        q_values=q_values,
+        exit_states=exit_states,
+    )
+
+
+def answer_from_model(model):
+    """
+    Gera o texto da resposta com um agente treinado, ou None.
+    """
+    return gen_text(model)[0]
+
+
+def train_and_answer(messages):
+    """
+    Treina o agente sobre as mensagens candidatas e gera o texto da resposta.
 
-    return gen_text(environment, kb, exit_states, actions_to_i)[0]
+    return : <tuple> : (<AnswerModel>, <str> resposta)
+    """
+    model = train_answer_model(messages)
+    return model, answer_from_model(model)
@@ -0,0 +1,133 @@
+"""
+Respostas pré-geradas dos geradores de texto (char-RNN).
+
+Cada gerador tem um buffer circular de respostas prontas, reabastecido em
+segundo plano: quando uma pool fica abaixo da marca mínima, novas respostas
+são geradas em lote, no executor, até a marca máxima. As respostas são
+retiradas em O(1) e só são geradas na hora quando a pool está vazia.
+"""
+import asyncio
+import logging
+from collections import Counter, deque
+from luci.settings import (RESPONSE_POOL_SIZE, RESPONSE_POOL_LOW_WATERMARK,
+                           RESPONSE_POOL_REFILL_INTERVAL)
+
+log = logging.getLogger()
+
+
+class ResponsePools:
+    """
+    Pools de respostas por gerador.
+
+    param : names : <list> : nomes dos geradores;
+    param : generate : função (nome, quantidade) -> <list> respostas;
+    param : size : <int> : marca máxima (capacidade) de cada pool;
+    param : low_watermark : <int> : tamanho a partir do qual a pool é
+                                    reabastecida;
+    param : refill_interval : <float> : segundos entre as verificações
+                                        periódicas das pools;
+    param : executor : <CPUExecutor> : executa `generate`; sem ele,
+                                       `generate` roda no executor padrão;
+    """
+    def __init__(self, names, generate, size=RESPONSE_POOL_SIZE,
+                 low_watermark=RESPONSE_POOL_LOW_WATERMARK,
+                 refill_interval=RESPONSE_POOL_REFILL_INTERVAL, executor=None):
+        self.generate = generate
+        self.executor = executor
+        self.size = size
+        self.low_watermark = low_watermark
+        self.refill_interval = refill_interval
+        self.pools = {name: deque(maxlen=size) for name in names}
+        self.stats = Counter()
+        self.epoch = 0
+        self._loop = None
+        self._wakeup = None
+
+    def pop(self, name):
+        """
+        Retira uma resposta pronta do gerador, ou None se a pool estiver
+        vazia. Pode ser chamado tanto no event loop quanto nas threads do
+        executor.
+        """
+        pool = self.pools[name]
+        try:
+            response = pool.popleft()
+        except IndexError:
+            self.stats['misses'] += 1
+            response = None
+        else:
+            self.stats['hits'] += 1
+
+        if len(pool) < self.low_watermark and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+        return response
+
+    def clear(self):
+        """
+        Descarta as respostas prontas (por exemplo, de modelos recarregados).
+        Respostas de reabastecimentos em andamento também são descartadas,
+        pois foram geradas antes da limpeza.
+        """
+        self.epoch += 1
+        for pool in self.pools.values():
+            pool.clear()
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def refill(self):
+        """
+        Completa, até a marca máxima, as pools abaixo da marca mínima.
+        """
+        loop = asyncio.get_event_loop()
+        for name, pool in self.pools.items():
+            missing = self.size - len(pool)
+            if len(pool) >= self.low_watermark or missing <= 0:
+                continue
+
+            epoch = self.epoch
+            responses = None
+            try:
+                if self.executor is not None:
+                    responses = await self.executor.run(
+                        'response_pool', self.generate, name, missing
+                    )
+                else:
+                    responses = await loop.run_in_executor(
+                        None, self.generate, name, missing
+                    )
+            except Exception as err:
+                log.error('Response pool %s refill failed: %s', name, err)
+
+            if responses is None:
+                self.stats['failed_refills'] += 1
+                continue
+
+            if epoch != self.epoch:
+                # as pools foram limpas enquanto as respostas eram geradas
+                self.stats['stale_refills'] += 1
+                continue
+
+            pool.extend(responses)
+            self.stats['refills'] += 1
+            self.stats['generated'] += len(responses)
+
+    async def run(self):
+        """
+        Tarefa de segundo plano que mantém as pools abastecidas.
+        """
+        self._loop = asyncio.get_event_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            await self.refill()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['ready'] = sum(len(pool) for pool in self.pools.values())
+        stats['empty_pools'] = sum(not pool for pool in self.pools.values())
+        return stats
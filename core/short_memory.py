@@ -0,0 +1,162 @@
+"""
+Memória de curto prazo (redis).
+
+Todo o bot compartilha um único pool de conexões configurado em
+luci/settings.py, com uma variante síncrona (para código executado fora do
+event loop) e uma assíncrona (para os handlers do discord).
+
+A memória de cada server é guardada em estruturas nativas do redis, para
+que cada mensagem custe apenas operações O(1) e handlers concorrentes não
+sobrescrevam as alterações uns dos outros.
+"""
+import redis
+from redis import asyncio as aioredis
+from luci.settings import (REDIS_HOST, REDIS_PORT, REDIS_MAX_CONNECTIONS,
+                           REDIS_SOCKET_TIMEOUT)
+
+POOL_SETTINGS = {
+    'host': REDIS_HOST,
+    'port': int(REDIS_PORT or 6379),
+    'max_connections': REDIS_MAX_CONNECTIONS,
+    'socket_timeout': REDIS_SOCKET_TIMEOUT,
+    'socket_connect_timeout': REDIS_SOCKET_TIMEOUT,
+}
+
+sync_pool = redis.ConnectionPool(**POOL_SETTINGS)
+async_pool = aioredis.ConnectionPool(**POOL_SETTINGS)
+
+
+def get_redis():
+    """
+    Retorna um client redis síncrono sobre o pool compartilhado.
+    """
+    return redis.Redis(connection_pool=sync_pool)
+
+
+def get_async_redis():
+    """
+    Retorna um client redis assíncrono sobre o pool compartilhado.
+    """
+    return aioredis.Redis(connection_pool=async_pool)
+
+
+def get_pool_stats():
+    """
+    Retorna o número de conexões criadas, livres e em uso de cada pool.
+    """
+    stats = {}
+    for name, pool in (('sync', sync_pool), ('async', async_pool)):
+        stats[f'{name}_created'] = pool._created_connections
+        stats[f'{name}_available'] = len(pool._available_connections)
+        stats[f'{name}_in_use'] = len(pool._in_use_connections)
+        stats[f'{name}_max'] = pool.max_connections
+
+    return stats
+
+
+async def close_pools():
+    """
+    Fecha as conexões dos pools.
+    """
+    sync_pool.disconnect()
+    await async_pool.disconnect()
+
+
+# Estrutura da memória de curto prazo de cada server:
+#   short_memory:<server>             hash com valores escalares
+#   short_memory:<server>:chat_log    lista com as últimas mensagens do chat
+#   short_memory:<server>:last_quotes lista com os últimos quotes ditos
+CHAT_LOG_SIZE = 10
+LAST_QUOTES_SIZE = 10
+
+# Anexa uma mensagem ao chat_log de forma atômica. Caso o autor seja o mesmo
+# da mensagem anterior, o texto é concatenado a ela; caso contrário, a
+# mensagem é inserida e o texto da anterior é retornado, pois a nova
+# mensagem é assumida como uma possível resposta a ela.
+APPEND_CHAT_MESSAGE = '''
+local chat_log, memory = KEYS[1], KEYS[2]
+local author, text = ARGV[1], ARGV[2]
+local size = tonumber(ARGV[3])
+
+redis.call('HSET', memory, 'last_message_dt', ARGV[4])
+
+local previous = false
+if redis.call('LLEN', chat_log) > 1 then
+    local last = cjson.decode(redis.call('LINDEX', chat_log, -1))
+    if last['author'] == author then
+        last['text'] = last['text'] .. ' ' .. text
+        redis.call('LSET', chat_log, -1, cjson.encode(last))
+        return false
+    end
+    previous = last['text']
+end
+
+redis.call('RPUSH', chat_log, cjson.encode({author = author, text = text}))
+redis.call('LTRIM', chat_log, -size, -1)
+return previous
+'''
+
+append_chat_message_script = get_async_redis().register_script(APPEND_CHAT_MESSAGE)
+
+
+def memory_key(server, field=None):
+    """
+    Retorna a chave redis da memória de curto prazo de um server.
+    """
+    key = f'short_memory:{server}'
+    return f'{key}:{field}' if field else key
+
+
+async def append_chat_message(server, author, text, message_dt):
+    """
+    Registra uma mensagem do chat e a data da última mensagem do server.
+    Retorna o texto da mensagem anterior quando a mensagem recebida é de
+    outro autor, ou None.
+
+    param : server : <str> : referência do server;
+    param : author : <str> : nome do autor;
+    param : text : <str> : texto da mensagem;
+    param : message_dt : <str> : data da mensagem;
+    return : <str> or None
+    """
+    previous = await append_chat_message_script(
+        keys=[memory_key(server, 'chat_log'), memory_key(server)],
+        args=[author, text, CHAT_LOG_SIZE, message_dt]
+    )
+
+    return previous.decode('utf-8') if previous else None
+
+
+async def get_last_message_dt(server):
+    """
+    Retorna a data da última mensagem enviada no server, ou None.
+    """
+    value = await get_async_redis().hget(memory_key(server), 'last_message_dt')
+    return value.decode('utf-8') if value else None
+
+
+async def set_last_message_dt(server, message_dt):
+    """
+    Atualiza a data da última mensagem enviada no server.
+    """
+    await get_async_redis().hset(memory_key(server), 'last_message_dt', message_dt)
+
+
+async def get_last_quotes(server):
+    """
+    Retorna os últimos quotes ditos no server.
+    """
+    quotes = await get_async_redis().lrange(memory_key(server, 'last_quotes'), 0, -1)
+    return [quote.decode('utf-8') for quote in quotes]
+
+
+async def remember_quote(server, quote):
+    """
+    Registra um quote dito no server, mantendo apenas os últimos
+    LAST_QUOTES_SIZE quotes.
+    """
+    key = memory_key(server, 'last_quotes')
+    pipeline = get_async_redis().pipeline(transaction=True)
+    pipeline.rpush(key, quote)
+    pipeline.ltrim(key, -LAST_QUOTES_SIZE, -1)
+    await pipeline.execute()
@@ -0,0 +1,130 @@
+import asyncio
+import unittest
+from graphql.language.printer import print_ast
+from core.batching import merge_mutations, MutationBatcher
+from core.external_requests import Mutation
+
+
+class RecordingClient:
+    """
+    Stands for the backend client, answering every batch with one error.
+    """
+    def __init__(self):
+        self.documents = []
+
+    async def post(self, document):
+        self.documents.append(print_ast(document))
+        return {'data': {}, 'errors': [{'message': 'boom', 'path': ['m0']}]}
+
+
+class ValidatingClient:
+    """
+    Stands for the backend client, rejecting whole documents that contain
+    an invalid server, as GraphQL validation does.
+    """
+    def __init__(self):
+        self.documents = []
+
+    async def post(self, document):
+        query = print_ast(document)
+        self.documents.append(query)
+        if 'reference: "bad"' in query:
+            return {'data': None, 'errors': [{'message': 'invalid input'}]}
+        return {'data': {}}
+
+
+class TestMutationBatching(unittest.TestCase):
+    def test_merge_mutations(self):
+        """
+        Verify that mutations are merged into one aliased document without
+        changing the original documents.
+        """
+        emotion = Mutation.update_emotion(server='abc', aptitude=1)
+        response = Mutation.assign_response('oi', {'text': 'olá'})
+        merged = print_ast(merge_mutations([emotion, response]))
+
+        self.assertIn('m0: emotion_update', merged)
+        self.assertIn('m1: assign_response', merged)
+        self.assertNotIn('m0:', print_ast(emotion))
+
+    def test_flush_in_batches(self):
+        """
+        Verify that queued mutations are sent in batches of batch_size and
+        that batch errors are counted.
+        """
+        loop = asyncio.new_event_loop()
+        client = RecordingClient()
+        batcher = MutationBatcher(client, batch_size=2, flush_interval=60)
+
+        async def scenario():
+            for i in range(3):
+                batcher.put(Mutation.update_emotion(server=str(i), aptitude=1))
+            await batcher.close()
+
+        loop.run_until_complete(scenario())
+        loop.close()
+
+        self.assertEqual(len(client.documents), 2)
+        self.assertIn('m1: emotion_update', client.documents[0])
+        stats = batcher.get_stats()
+        # the first mutation of each batch failed
+        self.assertEqual(stats['sent'], 1)
+        self.assertEqual(stats['mutation_errors'], 2)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_rejected_batch_is_split(self):
+        """
+        Verify that a batch rejected because of one invalid mutation is sent
+        again in parts, so only the invalid mutation is lost.
+        """
+        loop = asyncio.new_event_loop()
+        client = ValidatingClient()
+        batcher = MutationBatcher(client, batch_size=4, flush_interval=60)
+
+        async def scenario():
+            for server in ('a', 'b', 'bad', 'c'):
+                batcher.put(Mutation.update_emotion(server=server, aptitude=1))
+            await batcher.close()
+
+        loop.run_until_complete(scenario())
+        loop.close()
+
+        stats = batcher.get_stats()
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(stats['rejected'], 1)
+        self.assertEqual(stats['pending'], 0)
+        # the whole batch, its halves and the quarters of the invalid half
+        self.assertEqual(len(client.documents), 5)
+
+    def test_user_update_with_many_messages(self):
+        """
+        Verify that the messages of a member are recorded in the same document
+        as the member update, carrying the deltas only once.
+        """
+        messages = [{'text': f'msg {i}'} for i in range(3)]
+        document = Mutation.update_user(
+            '42', 'fulano', 3, {'pleasantness': 2}, messages[0], messages=messages[1:]
+        )
+        merged = print_ast(merge_mutations([document]))
+
+        self.assertEqual(merged.count('update_user('), 3)
+        self.assertEqual(merged.count('friendshipness: 3'), 1)
+        self.assertEqual(merged.count('pleasantness: 2'), 1)
+        self.assertEqual(merged.count('friendshipness: 0'), 2)
+        for message in messages:
+            self.assertIn(f'text: "{message["text"]}"', merged)
+
+    def test_escaped_values(self):
+        """
+        Verify that quotes and backslashes in names and texts are escaped
+        instead of breaking the mutation.
+        """
+        texts = [r'c:\pasta', 'fim com barra \\', 'disse "oi"']
+        document = Mutation.update_user(
+            '1', 'ana "\\"', 0, {}, {'text': 'ok'},
+            messages=[{'text': text} for text in texts]
+        )
+        response = Mutation.assign_response(texts[0], {'text': texts[1]})
+
+        self.assertEqual(print_ast(document).count('update_user('), 4)
+        self.assertIn('assign_response', print_ast(response))
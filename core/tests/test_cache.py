@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch
+from core.cache import LRUCache, TieredCache, MISSING, normalize_key, text_digest
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        """
+        Verify that the cache keeps at most maxsize items, dropping the least
+        recently used one.
+        """
+        cache = LRUCache(maxsize=2)
+        cache.set('oi', 1)
+        cache.set('bom dia', 2)
+        cache.get('oi')
+        cache.set('kkkk', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.get('bom dia'), MISSING)
+        self.assertEqual(cache.get('oi'), 1)
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+        self.assertEqual(cache.get_stats()['hits'], 2)
+        self.assertEqual(cache.get_stats()['misses'], 1)
+
+    def test_expires_items(self):
+        """
+        Verify that items expire after the ttl.
+        """
+        cache = LRUCache(maxsize=2, ttl=10)
+        with patch('core.cache.monotonic', return_value=100):
+            cache.set('oi', 1)
+        with patch('core.cache.monotonic', return_value=105):
+            self.assertEqual(cache.get('oi'), 1)
+        with patch('core.cache.monotonic', return_value=111):
+            self.assertIsNone(cache.get('oi', None))
+        self.assertEqual(cache.get_stats()['expired'], 1)
+
+
+class TestTieredCache(unittest.TestCase):
+    def test_local_tier_only(self):
+        """
+        Verify that, without a redis ttl, values are kept in the local tier.
+        """
+        cache = TieredCache('test', maxsize=10)
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertIsNone(loop.run_until_complete(cache.get('oi')))
+            loop.run_until_complete(cache.set('oi', {'polarity': 0.5}))
+            self.assertEqual(
+                loop.run_until_complete(cache.get('oi')), {'polarity': 0.5}
+            )
+        finally:
+            loop.close()
+
+        self.assertEqual(cache.get_stats()['hits'], 1)
+        self.assertEqual(cache.get_stats()['misses'], 1)
+
+    def test_blocking_codec_runs_off_the_loop(self):
+        """
+        Verify that, with blocking_codec, values read from redis are decoded
+        outside the event loop thread and then kept in the local tier.
+        """
+        from fakeredis import FakeServer, aioredis
+        server = FakeServer()
+        threads = []
+
+        def decode(value):
+            threads.append(threading.get_ident())
+            return value.decode('utf-8')
+
+        writer = TieredCache('test', maxsize=10, redis_ttl=60,
+                             encode=str.encode, blocking_codec=True)
+        reader = TieredCache('test', maxsize=10, redis_ttl=60,
+                             decode=decode, blocking_codec=True)
+        loop = asyncio.new_event_loop()
+        try:
+            with patch('core.cache.get_async_redis',
+                       lambda: aioredis.FakeRedis(server=server)):
+                loop.run_until_complete(writer.set('oi', 'olá'))
+                self.assertEqual(loop.run_until_complete(reader.get('oi')), 'olá')
+                self.assertEqual(loop.run_until_complete(reader.get('oi')), 'olá')
+        finally:
+            loop.close()
+
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+        self.assertEqual(reader.get_stats()['redis_hits'], 1)
+
+    def test_normalized_keys(self):
+        """
+        Verify that case and repeated spaces do not change the key.
+        """
+        self.assertEqual(normalize_key('  Bom   DIA '), 'bom dia')
+        self.assertEqual(text_digest('Bom dia'), text_digest('bom  dia'))
+        self.assertNotEqual(
+            text_digest('Bom dia', casefold=False),
+            text_digest('bom dia', casefold=False)
+        )
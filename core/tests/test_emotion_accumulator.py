@@ -0,0 +1,49 @@
+import unittest
+from core.emotions import EmotionAccumulator
+
+
+class TestEmotionAccumulator(unittest.TestCase):
+    def test_sum_guild_deltas(self):
+        accumulator = EmotionAccumulator()
+        accumulator.add_emotion('server', {'pleasantness': 1, 'aptitude': 0.01})
+        accumulator.add_emotion('server', {'pleasantness': 0.5, 'aptitude': 0.01})
+
+        pending = accumulator.pending_emotion('server')
+        self.assertEqual(pending['pleasantness'], 1.5)
+        self.assertAlmostEqual(pending['aptitude'], 0.02)
+        self.assertEqual(pending['sensitivity'], 0)
+        self.assertEqual(accumulator.pending_emotion('other')['pleasantness'], 0)
+
+    def test_sum_user_deltas(self):
+        accumulator = EmotionAccumulator()
+        accumulator.add_user('user', 'Fulano', 0.5, {'attention': 1}, {'text': 'oi'})
+        accumulator.add_user('user', 'Fulano', -0.2, {'attention': 1}, {'text': 'tudo bem'})
+
+        friendshipness, emotions = accumulator.pending_user('user')
+        self.assertAlmostEqual(friendshipness, 0.3)
+        self.assertEqual(emotions['attention'], 2)
+
+    def test_keeps_last_user_messages(self):
+        """
+        Verify that only the most recent messages of a member are kept.
+        """
+        accumulator = EmotionAccumulator(max_messages=2)
+        for i in range(5):
+            accumulator.add_user('user', 'Fulano', 0.1, {}, {'text': str(i)})
+
+        _, users = accumulator.drain()
+        self.assertEqual(users['user']['messages'], [{'text': '3'}, {'text': '4'}])
+        self.assertAlmostEqual(users['user']['friendshipness'], 0.5)
+
+    def test_drain(self):
+        """
+        Verify that draining returns the aggregates once and resets them.
+        """
+        accumulator = EmotionAccumulator()
+        accumulator.add_emotion('server', {'pleasantness': 1})
+        accumulator.add_user('user', 'Fulano', 1, {}, {'text': 'oi'})
+
+        guilds, users = accumulator.drain()
+        self.assertEqual(guilds['server']['pleasantness'], 1)
+        self.assertEqual(users['user']['messages'], [{'text': 'oi'}])
+        self.assertEqual(accumulator.drain(), ({}, {}))
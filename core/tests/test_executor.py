@@ -0,0 +1,96 @@
+import asyncio
+import time
+import unittest
+from core.executor import CPUExecutor
+
+
+def slow_sum(values, delay=0):
+    time.sleep(delay)
+    return sum(values)
+
+
+class TestCPUExecutor(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_runs_in_process_pool(self):
+        """
+        Verify that calls run in the worker processes and are measured per
+        call type.
+        """
+        executor = CPUExecutor(workers=1, timeout=30)
+        try:
+            result = self.loop.run_until_complete(
+                executor.run('sum', slow_sum, [1, 2, 3])
+            )
+        finally:
+            executor.shutdown()
+
+        self.assertEqual(result, 6)
+        stats = executor.get_stats()
+        self.assertEqual(stats['sum calls'], 1)
+        self.assertEqual(stats['sum completed'], 1)
+        self.assertEqual(stats['sum pending'], 0)
+
+    def test_deadline_fallback(self):
+        """
+        Verify that calls over the deadline return the fallback response.
+        """
+        executor = CPUExecutor(workers=0, timeout=0.05)
+        result = self.loop.run_until_complete(
+            executor.run('sum', slow_sum, [1], delay=0.5, fallback=lambda: 'oi')
+        )
+
+        self.assertEqual(result, 'oi')
+        self.assertEqual(executor.get_stats()['sum timeouts'], 1)
+
+    def test_error_fallback(self):
+        """
+        Verify that failed calls return None without a fallback.
+        """
+        executor = CPUExecutor(workers=0)
+        result = self.loop.run_until_complete(executor.run('sum', slow_sum, None))
+
+        self.assertIsNone(result)
+        self.assertEqual(executor.get_stats()['sum errors'], 1)
+
+    def test_threadsafe_deadline_fallback(self):
+        """
+        Verify that calls made from executor threads go through the CPU
+        executor, with its deadline and fallback.
+        """
+        executor = CPUExecutor(workers=1, timeout=0.5)
+
+        async def scenario():
+            executor.start()
+            return await asyncio.gather(
+                self.loop.run_in_executor(
+                    None, lambda: executor.run_threadsafe('sum', slow_sum, [1, 2])
+                ),
+                self.loop.run_in_executor(
+                    None, lambda: executor.run_threadsafe(
+                        'slow', slow_sum, [1], delay=2, fallback=lambda: 'oi'
+                    )
+                ),
+            )
+
+        try:
+            self.assertEqual(self.loop.run_until_complete(scenario()), [3, 'oi'])
+        finally:
+            executor.shutdown()
+
+        stats = executor.get_stats()
+        self.assertEqual(stats['sum completed'], 1)
+        self.assertEqual(stats['slow timeouts'], 1)
+
+    def test_threadsafe_without_loop(self):
+        """
+        Verify that, before the executor is started, calls run directly.
+        """
+        executor = CPUExecutor(workers=1)
+        self.assertEqual(executor.run_threadsafe('sum', slow_sum, [1, 2]), 3)
+        self.assertEqual(executor.get_stats(), {})
@@ -0,0 +1,160 @@
+import unittest
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.neighbors import KNeighborsClassifier
+from core.inference import (FusedLinearClassifier, BruteForceNeighbors,
+                            CharRNNSampler, is_fusable, is_brute_forceable)
+from core.training.text_gen import initialize_parameters, sample
+
+
+class TestFusedLinearClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(0)
+        cls.x = rng.normal(size=(300, 96))
+        cls.root = LogisticRegression(max_iter=500).fit(cls.x, rng.randint(1, 5, 300))
+        cls.branches = {
+            label: LogisticRegression(max_iter=500).fit(cls.x, rng.randint(1, 4 + label, 300))
+            for label in (1, 2, 3)
+        }
+        cls.fused = FusedLinearClassifier(cls.root, cls.branches)
+
+    def test_matches_sklearn(self):
+        """
+        Verify that the fused predictions are the same as the sklearn models
+        predictions, and that labels without a branch have no branch label.
+        """
+        vectors = np.random.RandomState(1).normal(size=(500, 96)).astype(np.float32)
+        for vector in vectors:
+            root_label = self.root.predict([vector])[0]
+            branch = self.branches.get(root_label)
+            branch_label = branch.predict([vector])[0] if branch else None
+            self.assertEqual(self.fused.predict(vector), (root_label, branch_label))
+
+    def test_batch_matches_single(self):
+        """
+        Verify that batch predictions are the single predictions, in order.
+        """
+        vectors = np.random.RandomState(2).normal(size=(200, 96)).astype(np.float32)
+        root_labels, branch_labels = self.fused.predict_batch(vectors)
+        self.assertEqual(
+            list(zip(root_labels, branch_labels)),
+            [self.fused.predict(vector) for vector in vectors]
+        )
+
+    def test_near_ties_fall_back_to_sklearn(self):
+        """
+        Verify that scores within the float32 error are decided by sklearn.
+        """
+        scores = np.array([1.0, 1.0 + 1e-7, -2.0], dtype=np.float32)
+        errors = np.full(3, 1e-5, dtype=np.float32)
+        self.assertIsNone(FusedLinearClassifier._argmax(scores, errors))
+        scores[1] += 1e-3
+        self.assertEqual(FusedLinearClassifier._argmax(scores, errors), 1)
+
+    def test_is_fusable(self):
+        """
+        Verify that only multiclass linear models are fused.
+        """
+        self.assertTrue(is_fusable(self.root))
+        knn = KNeighborsClassifier().fit(self.x, np.arange(300) % 3)
+        self.assertFalse(is_fusable(knn))
+
+
+class TestBruteForceNeighbors(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(0)
+        x = rng.normal(size=(100, 96))
+        # duplicated training points, as repeated training sentences
+        cls.x = np.vstack([x, x[:20]])
+        y = rng.randint(1, 6, 100)
+        cls.model = KNeighborsClassifier(leaf_size=25, p=1).fit(
+            cls.x, np.concatenate([y, rng.randint(1, 6, 20)])
+        )
+        cls.backend = BruteForceNeighbors(cls.model)
+
+    def test_matches_sklearn(self):
+        """
+        Verify that the brute force predictions are the sklearn ones, for
+        single and batched queries, including training points.
+        """
+        rng = np.random.RandomState(1)
+        queries = np.vstack([
+            self.x[rng.randint(0, len(self.x), 300)] + rng.normal(0, 0.5, (300, 96)),
+            self.x
+        ]).astype(np.float32)
+
+        expected = self.model.predict(queries.astype(np.float64))
+        np.testing.assert_array_equal(self.backend.predict(queries), expected)
+        for query, label in zip(queries[:50], expected):
+            self.assertEqual(self.backend.predict([query])[0], label)
+
+    def test_is_brute_forceable(self):
+        """
+        Verify that only uniform L1 neighbours models are replaced.
+        """
+        self.assertTrue(is_brute_forceable(self.model))
+        euclidean = KNeighborsClassifier().fit(self.x, np.arange(len(self.x)) % 3)
+        self.assertFalse(is_brute_forceable(euclidean))
+
+
+class TestCharRNNSampler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        np.random.seed(0)
+        chars = ['\n', ' ', 'a', 'b', 'c', 'i', 'o']
+        parameters = initialize_parameters(len(chars), 32)
+        # large enough weights for the logits to be shifted before exp
+        for name in ('Whh', 'Wxh', 'Why'):
+            parameters[name] *= 1000
+        cls.parameters = parameters
+        cls.chars_to_idx = {char: idx for idx, char in enumerate(chars)}
+        cls.idx_to_chars = dict(enumerate(chars))
+        cls.model = [parameters, cls.chars_to_idx, cls.idx_to_chars]
+
+    def test_same_texts_as_sample(self):
+        """
+        Verify that, for the same seed, the sampler returns the same texts as
+        the training sample function.
+        """
+        sampler = CharRNNSampler(self.model)
+        for seed in range(50):
+            np.random.seed(seed)
+            expected = sample(self.parameters, self.idx_to_chars, self.chars_to_idx, 30)
+            np.random.seed(seed)
+            self.assertEqual(sampler.sample(30), expected)
+
+    def test_length_limit(self):
+        """
+        Verify that texts have at most n + 1 characters and no line break.
+        """
+        sampler = CharRNNSampler(self.model)
+        for _ in range(20):
+            text = sampler.sample(5)
+            self.assertLessEqual(len(text), 6)
+            self.assertNotIn('\n', text)
+
+    def test_batch_of_one_same_as_sample(self):
+        """
+        Verify that a batch of one text is the text `sample` returns for the
+        same seed.
+        """
+        sampler = CharRNNSampler(self.model)
+        for seed in range(50):
+            np.random.seed(seed)
+            expected = sample(self.parameters, self.idx_to_chars, self.chars_to_idx, 30)
+            np.random.seed(seed)
+            self.assertEqual(sampler.sample_batch(1, 30), [expected])
+
+    def test_batch_texts(self):
+        """
+        Verify that a batch has one text per candidate, each ending at its
+        own line break or length limit.
+        """
+        texts = CharRNNSampler(self.model).sample_batch(40, 5)
+        self.assertEqual(len(texts), 40)
+        self.assertGreater(len(set(texts)), 1)
+        for text in texts:
+            self.assertLessEqual(len(text), 6)
+            self.assertNotIn('\n', text)
@@ -0,0 +1,85 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+import numpy as np
+from core import classifiers
+from core.classifiers import predict_intentions, predict_intentions_batch, intention_cache
+from core.context import MessageContext
+from core.model_loader import model_registry
+
+
+class StubClassifier:
+    """
+    Stands for the classifiers, answering each call with a new prediction.
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, vector):
+        self.calls += 1
+        return ('global', self.calls)
+
+    def batch(self, vectors):
+        return [self(vector) for vector in vectors]
+
+
+def parsed_context(text):
+    """
+    Returns a message context whose spaCy document is already set.
+    """
+    context = MessageContext(text)
+    context._doc = SimpleNamespace(vector=np.zeros(4, dtype=np.float32))
+    return context
+
+
+class TestIntentionCacheReload(unittest.TestCase):
+    def setUp(self):
+        intention_cache.clear()
+        self.classifier = StubClassifier()
+        patches = [
+            patch.object(classifiers, 'classify_vector', self.classifier),
+            patch.object(classifiers, 'classify_matrix', self.classifier.batch),
+            # nothing to load: reload only bumps the generation and notifies
+            patch.object(model_registry, 'models', {}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        intention_cache.clear()
+
+    def test_cached_prediction_before_reload(self):
+        """
+        Verify that a repeated text is answered from the cache.
+        """
+        first = predict_intentions(parsed_context('oi luci'))
+        second = predict_intentions(parsed_context('oi luci'))
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.classifier.calls, 1)
+
+    def test_reload_clears_the_cache(self):
+        """
+        Verify that the reload listener empties the intention cache, so the
+        reloaded classifier answers the next message.
+        """
+        old = predict_intentions(parsed_context('oi luci'))
+        model_registry.reload()
+
+        self.assertEqual(len(intention_cache), 0)
+        new = predict_intentions(parsed_context('oi luci'))
+        self.assertNotEqual(new, old)
+        self.assertEqual(self.classifier.calls, 2)
+
+    def test_generation_skips_stale_predictions(self):
+        """
+        Verify that, even if the cache is not cleared, predictions cached
+        before a reload are not served, in the single and batch paths.
+        """
+        old = predict_intentions(parsed_context('oi luci'))
+        with patch.object(model_registry, 'reload_listeners', []):
+            model_registry.reload()
+
+        self.assertNotEqual(predict_intentions(parsed_context('oi luci')), old)
+        self.assertNotIn(old, predict_intentions_batch([parsed_context('oi luci')]))
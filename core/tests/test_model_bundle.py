@@ -0,0 +1,69 @@
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.neighbors import KNeighborsClassifier
+from core.model_bundle import export_bundle, load_bundle, bundle_path
+from core.model_loader import load_model
+
+
+class TestModelBundle(unittest.TestCase):
+    def setUp(self):
+        self.models_dir = tempfile.TemporaryDirectory()
+        self.fpath = os.path.join(self.models_dir.name, 'model')
+        rng = np.random.RandomState(0)
+        self.x = rng.normal(size=(60, 96))
+        self.y = rng.randint(1, 5, 60)
+
+    def tearDown(self):
+        self.models_dir.cleanup()
+
+    def test_char_rnn_round_trip(self):
+        """
+        Verify that a char-RNN is loaded back with memory mapped arrays.
+        """
+        parameters = {'Whh': np.ones((4, 4)), 'b': np.zeros((4, 1))}
+        chars_to_idx = {'\n': 0, 'a': 1}
+        export_bundle([parameters, chars_to_idx, {0: '\n', 1: 'a'}], self.fpath)
+
+        loaded, loaded_chars_to_idx, idx_to_chars = load_bundle(self.fpath)
+        self.assertIsInstance(loaded['Whh'], np.memmap)
+        np.testing.assert_array_equal(loaded['Whh'], parameters['Whh'])
+        self.assertEqual(loaded_chars_to_idx, chars_to_idx)
+        self.assertEqual(idx_to_chars, {0: '\n', 1: 'a'})
+
+    def test_classifiers_predict_the_same(self):
+        """
+        Verify that exported classifiers give the same predictions.
+        """
+        for model in (
+            LogisticRegression(max_iter=500).fit(self.x, self.y),
+            KNeighborsClassifier(leaf_size=25, p=1).fit(self.x, self.y),
+        ):
+            export_bundle(model, self.fpath)
+            loaded = load_bundle(self.fpath)
+            self.assertIs(type(loaded), type(model))
+            np.testing.assert_array_equal(loaded.predict(self.x), model.predict(self.x))
+
+    def test_load_model_prefers_bundle(self):
+        """
+        Verify that the bundle is loaded instead of the pickle when both
+        exist, and that the pickle is still loaded without a bundle.
+        """
+        with open(self.fpath, 'wb') as model_file:
+            pickle.dump([{'b': np.zeros(2)}, {'a': 0}, {0: 'a'}], model_file)
+        self.assertEqual(load_model(self.fpath)[1], {'a': 0})
+
+        export_bundle([{'b': np.ones(2)}, {'b': 0}, {0: 'b'}], self.fpath)
+        self.assertEqual(load_model(self.fpath)[1], {'b': 0})
+
+    def test_rejects_arrays_not_matching_the_manifest(self):
+        """
+        Verify that a bundle whose arrays were changed is not loaded.
+        """
+        export_bundle([{'b': np.ones(2)}, {'a': 0}, {0: 'a'}], self.fpath)
+        np.save(os.path.join(bundle_path(self.fpath), 'b.npy'), np.ones(3))
+        with self.assertRaises(ValueError):
+            load_bundle(self.fpath)
@@ -0,0 +1,165 @@
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from core.model_loader import ModelRegistry, RegisteredModel
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.models_dir = tempfile.TemporaryDirectory()
+        for name in ('classifier', 'gan_a', 'gan_b', 'gan_c'):
+            with open(f'{self.models_dir.name}/{name}', 'wb') as model:
+                pickle.dump({'weights': np.zeros(1024)}, model)
+
+        # room for two 8 KB generators
+        self.registry = ModelRegistry(self.models_dir.name, generators_memory=20 * 1024)
+        self.registry.register('classifier', 'classifier', ModelRegistry.CLASSIFIER)
+        for name in ('gan_a', 'gan_b', 'gan_c'):
+            self.registry.register(name, name, ModelRegistry.GENERATOR)
+
+    def tearDown(self):
+        self.models_dir.cleanup()
+
+    def test_loads_on_first_access(self):
+        """
+        Verify that models are loaded only when accessed, once.
+        """
+        self.assertEqual(self.registry.get_stats()['loaded'], 0)
+        model = self.registry.get('classifier')
+        self.assertIs(self.registry.get('classifier'), model)
+        self.assertEqual(self.registry.get_stats()['loads'], 1)
+
+    def test_unloads_least_recently_used_generators(self):
+        """
+        Verify that generators over the memory cap are unloaded, least
+        recently used first, and loaded again when needed.
+        """
+        self.registry.get('classifier')
+        self.registry.get('gan_a')
+        self.registry.get('gan_b')
+        self.registry.get('gan_a')
+        self.registry.get('gan_c')
+
+        self.assertEqual(list(self.registry.generators), ['gan_a', 'gan_c'])
+        self.assertIn('classifier', self.registry.models)
+        self.assertEqual(self.registry.get_stats()['unloads'], 1)
+
+        self.registry.get('gan_b')
+        self.assertEqual(self.registry.get_stats()['loads'], 5)
+
+    def test_derived_objects_follow_the_model(self):
+        """
+        Verify that derived objects are built once, counted in the generators
+        memory and dropped with their unloaded generator.
+        """
+        build = lambda model: {'copy': model['weights'].copy()}
+        derived = self.registry.get_derived('gan_a', build)
+
+        self.assertIs(self.registry.get_derived('gan_a', build), derived)
+        self.assertEqual(self.registry.sizes['gan_a'], 2 * 8192)
+
+        # gan_a with its derived copy and gan_b no longer fit in 20 KB
+        self.registry.get('gan_b')
+        self.assertEqual(list(self.registry.generators), ['gan_b'])
+        self.assertNotIn('gan_a', self.registry.derived)
+        self.assertIsNot(self.registry.get_derived('gan_a', build), derived)
+
+    def test_registered_model_attribute(self):
+        """
+        Verify that class attributes resolve to models of the registry.
+        """
+        registry = ModelRegistry(self.models_dir.name)
+
+        class Models:
+            CLASSIFIER = RegisteredModel('classifier', ModelRegistry.CLASSIFIER, registry)
+
+        self.assertEqual(registry.get_stats()['loaded'], 0)
+        self.assertEqual(Models.CLASSIFIER['weights'].shape, (1024,))
+
+
+class TestModelReload(unittest.TestCase):
+    def setUp(self):
+        from sklearn.linear_model import LogisticRegression
+        from core.training.text_gen import initialize_parameters
+
+        self.models_dir = tempfile.TemporaryDirectory()
+        rng = np.random.RandomState(0)
+        self.classifier = LogisticRegression().fit(rng.normal(size=(30, 4)), np.arange(30) % 3)
+        chars = ['\n', 'a', 'b']
+        self.generator = [
+            initialize_parameters(len(chars), 8),
+            {char: idx for idx, char in enumerate(chars)},
+            dict(enumerate(chars)),
+        ]
+        self.dump('classifier', self.classifier)
+        self.dump('gan', self.generator)
+
+        self.registry = ModelRegistry(self.models_dir.name)
+        self.registry.register('classifier', 'classifier', ModelRegistry.CLASSIFIER)
+        self.registry.register('gan', 'gan', ModelRegistry.GENERATOR)
+
+    def tearDown(self):
+        self.models_dir.cleanup()
+
+    def dump(self, name, model):
+        with open(f'{self.models_dir.name}/{name}', 'wb') as model_file:
+            pickle.dump(model, model_file)
+
+    def test_swaps_loaded_models(self):
+        """
+        Verify that the loaded models are replaced by the new files, the
+        generation is bumped and the reload listeners are called.
+        """
+        from core.model_loader import get_model_generation
+
+        old = self.registry.get('classifier')
+        self.registry.get('gan')
+        calls = []
+        self.registry.add_reload_listener(lambda: calls.append(True))
+        generation = get_model_generation()
+
+        self.assertEqual(sorted(self.registry.reload()), ['classifier', 'gan'])
+        self.assertIsNot(self.registry.get('classifier'), old)
+        self.assertEqual(get_model_generation(), generation + 1)
+        self.assertEqual(calls, [True])
+        self.assertEqual(self.registry.get_stats()['reloads'], 1)
+
+    def test_drops_derived_objects(self):
+        """
+        Verify that objects derived from a reloaded model are built again
+        from the new model.
+        """
+        derived = self.registry.get_derived('gan', lambda model: [model])
+        self.registry.reload()
+
+        self.assertNotIn('gan', self.registry.derived)
+        rebuilt = self.registry.get_derived('gan', lambda model: [model])
+        self.assertIs(rebuilt[0], self.registry.get('gan'))
+        self.assertIsNot(rebuilt[0], derived[0])
+
+    def test_keeps_models_on_invalid_files(self):
+        """
+        Verify that models failing the smoke validation are not swapped in.
+        """
+        from sklearn.linear_model import LogisticRegression
+
+        old = self.registry.get('classifier')
+        rng = np.random.RandomState(0)
+        self.dump('classifier', LogisticRegression().fit(rng.normal(size=(30, 5)), np.arange(30) % 3))
+
+        with self.assertRaises(ValueError):
+            self.registry.reload()
+        self.assertIs(self.registry.get('classifier'), old)
+        self.assertEqual(self.registry.get_stats()['failed_reloads'], 1)
+
+    def test_fingerprint_changes_with_files(self):
+        """
+        Verify that rewriting a model file changes the fingerprint.
+        """
+        import os
+
+        fingerprint = self.registry.fingerprint()
+        path = f'{self.models_dir.name}/classifier'
+        os.utime(path, (0, 0))
+        self.assertNotEqual(self.registry.fingerprint(), fingerprint)
@@ -0,0 +1,25 @@
+import unittest
+from core.pipeline import normalize_text, rejection_reason
+
+
+class TestMessagePipelineGates(unittest.TestCase):
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('"oi"\nluci'), 'oi  luci')
+
+    def test_reject_cheap_messages(self):
+        """
+        Verify that messages without learnable content are rejected before
+        any model or network work.
+        """
+        self.assertEqual(rejection_reason(''), 'empty')
+        self.assertEqual(rejection_reason('😂😂 👍🏽'), 'emoji')
+        self.assertEqual(rejection_reason('<:pepe:123456> <a:dance:42>'), 'emoji')
+        self.assertEqual(rejection_reason('!status'), 'command')
+        self.assertEqual(rejection_reason('> citação qualquer'), 'command')
+        self.assertEqual(rejection_reason('https://discord.com'), 'hyperlink')
+        self.assertEqual(rejection_reason('kkkkkk'), 'single token')
+
+    def test_accept_chat_messages(self):
+        self.assertIsNone(rejection_reason('bom dia pessoal'))
+        self.assertIsNone(rejection_reason('<@123456> quantos anos você tem?'))
+        self.assertIsNone(rejection_reason('😂 que isso'))
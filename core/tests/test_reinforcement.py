@@ -0,0 +1,206 @@
+import asyncio
+import random
+import unittest
+from unittest.mock import patch
+import numpy as np
+from core import reinforcement
+from core.reinforcement import (answer_model_cache, generate_answer, messages_digest,
+                                get_relations, get_map, get_exit_states, gen_text,
+                                train_answer_model)
+from core.types import AnswerModel
+
+
+class RecordingExecutor:
+    """
+    Stands for the CPU executor, running the calls in the test process.
+    """
+    def __init__(self):
+        self.calls = []
+
+    async def run(self, kind, func, *args, **kwargs):
+        self.calls.append(args)
+        return func(*args)
+
+
+class TestAnswerModelCache(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.executor = RecordingExecutor()
+        self.candidates = ['bom dia pessoal', 'bom dia luci']
+        answer_model_cache.local.clear()
+
+        async def get_responses(text):
+            return list(self.candidates)
+
+        patches = [
+            patch.object(reinforcement, 'cpu_executor', self.executor),
+            patch.object(reinforcement, 'get_responses', get_responses),
+            patch.object(answer_model_cache, 'redis_ttl', 0),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        answer_model_cache.local.clear()
+        self.loop.close()
+
+    def test_hit_skips_the_executor(self):
+        """
+        Verify that a second message with the same candidates is answered by
+        the cached agent, without training it again.
+        """
+        first = self.loop.run_until_complete(generate_answer('oi'))
+        second = self.loop.run_until_complete(generate_answer('olá'))
+
+        self.assertEqual(len(self.executor.calls), 1)
+        self.assertIn(first, ('dia pessoal', 'dia luci'))
+        self.assertIn(second, ('dia pessoal', 'dia luci'))
+        self.assertEqual(answer_model_cache.get_stats()['hits'], 1)
+
+    def test_keys_follow_the_candidates(self):
+        """
+        Verify that other candidate messages, or the same ones in another
+        order, train a new agent.
+        """
+        self.loop.run_until_complete(generate_answer('oi'))
+        self.candidates = ['boa noite pessoal', 'boa noite luci']
+        self.loop.run_until_complete(generate_answer('oi'))
+        self.candidates = ['bom dia luci', 'bom dia pessoal']
+        self.loop.run_until_complete(generate_answer('oi'))
+
+        self.assertEqual(len(self.executor.calls), 3)
+        self.assertNotEqual(
+            messages_digest(['bom dia pessoal', 'bom dia luci']),
+            messages_digest(['bom dia luci', 'bom dia pessoal'])
+        )
+
+
+def dense_reference(messages, seed):
+    """
+    The Q-table agent replaced by the CSR graph: one dense row of Q values
+    per state and actions drawn with random.choice. Only terminates on
+    acyclic token graphs.
+
+    return : <tuple> : (<np.array> Q table, <str> answer)
+    """
+    random.seed(seed)
+    relations = get_relations(messages)
+    i_to_actions, actions_to_i = get_map(relations)
+    environment = {
+        state: [
+            (actions_to_i[fate], random.randint(-3, 0))
+            for fate in relations[token] if fate != 'EOS'
+        ]
+        for state, token in i_to_actions.items()
+    }
+    exits = {
+        actions_to_i[token] for token, fates in relations.items()
+        if sorted(fates, key=fates.get)[-1] == 'EOS'
+    }
+
+    q_table = np.zeros((len(environment), len(environment)))
+    for _ in range(200):
+        state = 0
+        while state not in exits and environment[state]:
+            next_state, reward = random.choice(environment[state])
+            next_values = [q_table[next_state][action] for action, _ in environment[next_state]]
+            max_value = max(next_values) if next_values else 0
+            q_table[state][next_state] += 0.1 * (
+                reward + 0.99 * max_value - q_table[state][next_state]
+            )
+            state = next_state
+
+    random.seed(seed + 1)
+    state, output = 0, []
+    while state not in exits:
+        if not q_table[state].any():
+            state = random.choice(environment[state])[0]
+        else:
+            state = max(environment[state], key=lambda action: q_table[state][action[0]])[0]
+        output.append(i_to_actions[state])
+
+    return q_table, ' '.join(output)
+
+
+def cycle_model(q_values, tokens=('a', 'b', 'c')):
+    """
+    Agent over a -> b -> a, where only c (reached from b) is a final state.
+    """
+    return AnswerModel(
+        tokens=list(tokens),
+        indptr=np.array([0, 1, 3, 3], dtype=np.int64),
+        next_states=np.array([1, 0, 2], dtype=np.int32),
+        rewards=np.array([-1, -1, 0], dtype=np.int8),
+        q_values=np.array(q_values, dtype=np.float64),
+        exit_states=np.array([False, False, True]),
+    )
+
+
+class TestAnswerGeneration(unittest.TestCase):
+    def test_exit_states(self):
+        """
+        Verify that final states are the tokens mostly followed by the end
+        of the message, and that answers stop at them.
+        """
+        messages = ['bom dia pessoal', 'bom dia luci', 'dia lindo']
+        relations = get_relations(messages)
+        _, actions_to_i = get_map(relations)
+        exit_states = get_exit_states(relations, actions_to_i)
+
+        self.assertEqual(
+            sorted(token for token, i in actions_to_i.items() if exit_states[i]),
+            ['lindo', 'luci', 'pessoal']
+        )
+        random.seed(0)
+        model = train_answer_model(messages)
+        text, _ = gen_text(model)
+        self.assertIn(text, ('dia pessoal', 'dia luci', 'dia lindo'))
+
+    def test_greedy_cycle_has_no_answer(self):
+        """
+        Verify that a trained cycle is detected on its first repeated state
+        instead of running until max_steps.
+        """
+        # b prefers going back to a over reaching c
+        model = cycle_model([-1, -0.5, -2])
+        self.assertEqual(gen_text(model, max_steps=10 ** 6), (None, -2))
+
+    def test_limits_have_no_answer(self):
+        """
+        Verify that walks end without an answer when they exceed the step or
+        character limits.
+        """
+        model = cycle_model([0, 0, 0])
+        random.seed(1)
+        self.assertIsNone(gen_text(model, max_steps=1)[0])
+
+        long_tokens = cycle_model([-1, -2, -0.5], tokens=('a' * 1500, 'b' * 1500, 'c'))
+        self.assertIsNone(gen_text(long_tokens, max_length=1000)[0])
+        self.assertEqual(gen_text(long_tokens)[0], 'b' * 1500 + ' c')
+
+    def test_matches_the_dense_q_table(self):
+        """
+        Verify that, for the same seed, the CSR agent learns the same Q values
+        and answers the same text as the dense Q-table agent.
+        """
+        rng = random.Random(0)
+        messages = [
+            ' '.join(f'w{i}' for i in sorted(rng.sample(range(40), rng.randint(2, 6))))
+            for _ in range(30)
+        ]
+        for seed in range(10):
+            q_table, expected = dense_reference(messages, seed)
+
+            random.seed(seed)
+            model = train_answer_model(messages)
+            random.seed(seed + 1)
+            text, _ = gen_text(model)
+
+            dense = np.zeros_like(q_table)
+            for state in range(len(model.tokens)):
+                for edge in range(model.indptr[state], model.indptr[state + 1]):
+                    dense[state, model.next_states[edge]] = model.q_values[edge]
+            np.testing.assert_array_equal(dense, q_table)
+            self.assertEqual(text, expected)
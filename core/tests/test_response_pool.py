@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+from core.response_pool import ResponsePools
+
+
+class TestResponsePools(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+
+        def generate(name, count):
+            self.requests.append((name, count))
+            return [f'{name} {i}' for i in range(count)]
+
+        self.pools = ResponsePools(
+            ['greeting', 'praise'], generate, size=4, low_watermark=2, refill_interval=60
+        )
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_refills_up_to_size(self):
+        """
+        Verify that empty pools are filled up to their size, in one batch.
+        """
+        self.loop.run_until_complete(self.pools.refill())
+
+        self.assertEqual(self.requests, [('greeting', 4), ('praise', 4)])
+        self.assertEqual(self.pools.pop('greeting'), 'greeting 0')
+        self.assertEqual(self.pools.get_stats()['ready'], 7)
+
+    def test_refills_below_low_watermark(self):
+        """
+        Verify that pools are only refilled below the low watermark.
+        """
+        self.loop.run_until_complete(self.pools.refill())
+        self.pools.pop('greeting')
+        self.pools.pop('greeting')
+        self.loop.run_until_complete(self.pools.refill())
+        self.assertEqual(len(self.requests), 2)
+
+        self.pools.pop('greeting')
+        self.loop.run_until_complete(self.pools.refill())
+        self.assertEqual(self.requests[-1], ('greeting', 3))
+
+    def test_empty_pool(self):
+        """
+        Verify that an empty pool returns None, so the caller generates the
+        response itself.
+        """
+        self.assertIsNone(self.pools.pop('praise'))
+        self.assertEqual(self.pools.get_stats()['misses'], 1)
+
+        self.loop.run_until_complete(self.pools.refill())
+        self.pools.clear()
+        self.assertIsNone(self.pools.pop('praise'))
+
+    def test_clear_drops_refills_in_flight(self):
+        """
+        Verify that responses generated before a clear (a models reload) are
+        not added to the pools.
+        """
+        def generate(name, count):
+            if name == 'greeting':
+                pools.clear()
+            return [f'{name} {i}' for i in range(count)]
+
+        pools = ResponsePools(
+            ['greeting', 'praise'], generate, size=4, low_watermark=2, refill_interval=60
+        )
+        self.loop.run_until_complete(pools.refill())
+
+        self.assertIsNone(pools.pop('greeting'))
+        self.assertEqual(pools.pop('praise'), 'praise 0')
+        self.assertEqual(pools.get_stats()['stale_refills'], 1)
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+from fakeredis import FakeServer, aioredis
+from core import short_memory
+from core.short_memory import (APPEND_CHAT_MESSAGE, CHAT_LOG_SIZE, LAST_QUOTES_SIZE,
+                               append_chat_message, remember_quote, memory_key,
+                               get_last_quotes, get_last_message_dt)
+
+
+class TestShortMemory(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = FakeServer()
+        redis = aioredis.FakeRedis(server=self.server)
+        patches = [
+            patch.object(short_memory, 'get_async_redis',
+                         lambda: aioredis.FakeRedis(server=self.server)),
+            patch.object(short_memory, 'append_chat_message_script',
+                         redis.register_script(APPEND_CHAT_MESSAGE)),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def chat_log(self, server):
+        redis = aioredis.FakeRedis(server=self.server)
+        entries = self.run_async(redis.lrange(memory_key(server, 'chat_log'), 0, -1))
+        return [json.loads(entry) for entry in entries]
+
+    def test_previous_text_is_returned(self):
+        """
+        Verify that a message from another author returns the text of the
+        previous message and that the last message date is stored.
+        """
+        self.assertIsNone(self.run_async(append_chat_message('s', 'ana', 'oi', 'd1')))
+        self.assertIsNone(self.run_async(append_chat_message('s', 'bia', 'olá', 'd2')))
+        previous = self.run_async(append_chat_message('s', 'ana', 'tudo bem?', 'd3'))
+
+        self.assertEqual(previous, 'olá')
+        self.assertEqual(self.run_async(get_last_message_dt('s')), 'd3')
+        self.assertEqual(
+            [entry['author'] for entry in self.chat_log('s')],
+            ['ana', 'bia', 'ana']
+        )
+
+    def test_same_author_is_merged(self):
+        """
+        Verify that consecutive messages of the same author are merged into
+        the last chat log entry, returning no previous text.
+        """
+        self.run_async(append_chat_message('s', 'ana', 'oi', 'd1'))
+        self.run_async(append_chat_message('s', 'bia', 'olá', 'd2'))
+        previous = self.run_async(append_chat_message('s', 'bia', 'tudo bem?', 'd3'))
+
+        self.assertIsNone(previous)
+        self.assertEqual(self.chat_log('s')[-1], {'author': 'bia', 'text': 'olá tudo bem?'})
+        self.assertEqual(len(self.chat_log('s')), 2)
+
+    def test_chat_log_is_trimmed(self):
+        """
+        Verify that the chat log keeps only the last CHAT_LOG_SIZE messages.
+        """
+        for i in range(CHAT_LOG_SIZE + 5):
+            self.run_async(append_chat_message('s', f'user {i}', f'msg {i}', str(i)))
+
+        chat_log = self.chat_log('s')
+        self.assertEqual(len(chat_log), CHAT_LOG_SIZE)
+        self.assertEqual(chat_log[-1]['text'], f'msg {CHAT_LOG_SIZE + 4}')
+        self.assertEqual(chat_log[0]['text'], 'msg 5')
+
+    def test_remember_quote_is_trimmed(self):
+        """
+        Verify that only the last LAST_QUOTES_SIZE quotes are remembered, per
+        server.
+        """
+        for i in range(LAST_QUOTES_SIZE + 3):
+            self.run_async(remember_quote('s', f'quote {i}'))
+        self.run_async(remember_quote('other', 'quote'))
+
+        quotes = self.run_async(get_last_quotes('s'))
+        self.assertEqual(len(quotes), LAST_QUOTES_SIZE)
+        self.assertEqual(quotes[0], 'quote 3')
+        self.assertEqual(quotes[-1], f'quote {LAST_QUOTES_SIZE + 2}')
+        self.assertEqual(self.run_async(get_last_quotes('other')), ['quote'])
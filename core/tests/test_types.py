@@ -0,0 +1,97 @@
+import unittest
+import json
+import numpy as np
+from core.types import CompressedDict, TextAnalysis, AnswerModel
+
+
+class TestTextAnalysis(unittest.TestCase):
+    def test_from_lisa(self):
+        """
+        Verify that a combined LISA answer is read into a single result.
+        """
+        analysis = TextAnalysis.from_lisa({
+            'textOffenseLevel': {'average': 0.8, 'isOffensive': True},
+            'sentimentExtraction': -0.5,
+        })
+        self.assertTrue(analysis.is_offensive)
+        self.assertEqual(analysis.polarity, -0.5)
+        self.assertIsNone(analysis.part_of_speech)
+
+    def test_from_partial_or_failed_lisa_answer(self):
+        """
+        Verify that missing or failed fields are taken as neutral.
+        """
+        self.assertEqual(TextAnalysis.from_lisa(None), TextAnalysis())
+        analysis = TextAnalysis.from_lisa({
+            'textOffenseLevel': None,
+            'sentimentExtraction': None,
+            'partOfSpeech': [{'token': 'luci', 'description': 'nome próprio'}]
+        })
+        self.assertFalse(analysis.is_offensive)
+        self.assertEqual(analysis.polarity, 0)
+        self.assertEqual(analysis.part_of_speech[0]['token'], 'luci')
+
+
+class TestCompressedDict(unittest.TestCase):
+    def setUp(self):
+        self.memory = {
+            'last_message_dt': '2021-06-12 20:13:41.532000',
+            'last_quotes': ['Tudo vale a pena se a alma não é pequena'] * 10,
+            'chat_log': [{'author': 'luci', 'text': 'olá, tudo bem?'}] * 10
+        }
+
+    def test_round_trip(self):
+        """
+        Verify that small and large values are encoded with the expected
+        header and decoded back to the same data.
+        """
+        small = CompressedDict({'aptitude': 1})
+        self.assertEqual(small.bit_string[0], CompressedDict.RAW)
+        self.assertEqual(small.decompress(), {'aptitude': 1})
+
+        large = CompressedDict(self.memory)
+        self.assertEqual(large.bit_string[0], CompressedDict.ZLIB)
+        self.assertLess(len(large.bit_string), len(json.dumps(self.memory)))
+        self.assertEqual(CompressedDict.decode(large.bit_string), self.memory)
+
+    def test_reads_legacy_json(self):
+        """
+        Verify that values stored as plain json are still readable.
+        """
+        legacy = json.dumps(self.memory).encode('utf-8')
+        self.assertEqual(CompressedDict.decode(legacy), self.memory)
+        self.assertEqual(CompressedDict.decompress_bytes(b'')['missing'], 0)
+        self.assertEqual(
+            CompressedDict.from_bytes(legacy)['last_message_dt'],
+            self.memory['last_message_dt']
+        )
+
+    def test_decodes_once(self):
+        """
+        Verify that the payload is decoded only on the first access.
+        """
+        compressed = CompressedDict.from_bytes(CompressedDict(self.memory).bit_string)
+        self.assertIs(compressed.decompress(), compressed.decompress())
+
+
+class TestAnswerModel(unittest.TestCase):
+    def test_json_round_trip(self):
+        """
+        Verify that a trained answer model survives the CompressedDict codec.
+        """
+        model = AnswerModel(
+            tokens=['oi', 'tudo', 'bem'],
+            indptr=np.array([0, 2, 3, 3]),
+            next_states=np.array([1, 2, 2], dtype=np.int32),
+            rewards=np.array([-2, 0, -1], dtype=np.int8),
+            q_values=np.array([-0.2, 0.1, -0.1]),
+            exit_states=np.array([False, False, True]),
+        )
+        decoded = AnswerModel.from_json(CompressedDict.decode(
+            CompressedDict.encode(model.to_json())
+        ))
+
+        self.assertEqual(decoded.tokens, model.tokens)
+        for field in ('indptr', 'next_states', 'rewards', 'q_values', 'exit_states'):
+            np.testing.assert_array_equal(getattr(decoded, field), getattr(model, field))
+            self.assertEqual(getattr(decoded, field).dtype, getattr(model, field).dtype)
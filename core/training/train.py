@@ -1,10 +1,8 @@
 from os import listdir
-import pickle
 import logging
 import json
 import requests
 import numpy as np
-import spacy
 from halo import Halo
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
@@ -17,6 +15,8 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn import metrics
 from luci.settings import LISA_URL
 from core.training.text_gen import model as lstm_model
+from core.nlp import get_nlp
+from core.model_bundle import export_bundle
 
 
 logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
@@ -24,7 +24,7 @@ logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
 
 @Halo(text='Loading spacy', spinner='dots')
 def load_spacy():
-    return spacy.load('pt')
+    return get_nlp()
 
 
 def train_bot():
@@ -85,6 +85,7 @@ def train_bot():
 
 
 def get_data_from_json(path):
+    nlp = load_spacy()
     datasets = listdir(path)
     samples = []
     targets = []
@@ -92,8 +93,9 @@ def get_data_from_json(path):
     for dataset in datasets:
         with open(f'{path}{dataset}', 'r') as f:
             raw_data = json.load(f)
-            for data in raw_data:
-                samples.append(nlp(data['text']).vector)
+            docs = nlp.pipe(data['text'] for data in raw_data)
+            for data, doc in zip(raw_data, docs):
+                samples.append(doc.vector)
                 targets.append(data['intention'])
 
     return samples, targets
@@ -122,8 +124,7 @@ def train_who_am_i_gan():
         700,
         0.01
     )
-    with open('luci/models/who_am_i_gan', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/who_am_i_gan')
 
     logging.info('\nwho_am_i GAN total loss: %s\n', loss[-1])
 
@@ -151,8 +152,7 @@ def train_goodbye_gan():
         700,
         0.01
     )
-    with open('luci/models/goodbye', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/goodbye')
 
     logging.info('\goodbye GAN total loss: %s\n', loss[-1])
 
@@ -180,8 +180,7 @@ def train_acknowledgement_gan():
         500,
         0.01
     )
-    with open('luci/models/acknowledgement', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/acknowledgement')
 
     logging.info('\nacknowledgement GAN total loss: %s\n', loss[-1])
 
@@ -209,8 +208,7 @@ def train_forbidden_gan():
         500,
         0.01
     )
-    with open('luci/models/forbidden', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/forbidden')
 
     logging.info('\nforbidden GAN total loss: %s\n', loss[-1])
 
@@ -238,8 +236,7 @@ def train_funny_gan():
         500,
         0.01
     )
-    with open('luci/models/funny', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/funny')
 
     logging.info('\nfunny GAN total loss: %s\n', loss[-1])
 
@@ -267,8 +264,7 @@ def train_greeting_gan():
         500,
         0.01
     )
-    with open('luci/models/greeting', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/greeting')
 
     logging.info('\ngreeting GAN total loss: %s\n', loss[-1])
 
@@ -296,8 +292,7 @@ def train_helpful_gan():
         500,
         0.01
     )
-    with open('luci/models/helpful', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/helpful')
 
     logging.info('\nhelpful GAN total loss: %s\n', loss[-1])
 
@@ -325,8 +320,7 @@ def train_illegal_stuff():
         500,
         0.01
     )
-    with open('luci/models/illegal_stuff', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/illegal_stuff')
 
     logging.info('\nillegal_stuff GAN total loss: %s\n', loss[-1])
 
@@ -354,8 +348,7 @@ def train_music_gan():
         500,
         0.01
     )
-    with open('luci/models/music', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/music')
 
     logging.info('\nmusic GAN total loss: %s\n', loss[-1])
 
@@ -383,8 +376,7 @@ def train_age_gan():
         500,
         0.01
     )
-    with open('luci/models/my_age', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/my_age')
 
     logging.info('\nmy_age GAN total loss: %s\n', loss[-1])
 
@@ -412,8 +404,7 @@ def train_gender_gan():
         500,
         0.01
     )
-    with open('luci/models/my_gender', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/my_gender')
 
     logging.info('\nmy_gender GAN total loss: %s\n', loss[-1])
 
@@ -441,8 +432,7 @@ def train_praise_gan():
         500,
         0.01
     )
-    with open('luci/models/praise', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/praise')
 
     logging.info('\npraise GAN total loss: %s\n', loss[-1])
 
@@ -470,8 +460,7 @@ def train_racism_xenophobia_gan():
         500,
         0.01
     )
-    with open('luci/models/racism_xenophobia', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/racism_xenophobia')
 
     logging.info('racism_xenophobia GAN total loss: %s', loss[-1])
 
@@ -501,8 +490,7 @@ def train_sexual_abuse_gan():
         500,
         0.01
     )
-    with open('luci/models/sexual_abuse', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/sexual_abuse')
 
     logging.info('sexual_abuse GAN total loss: %s', loss[-1])
 
@@ -530,8 +518,7 @@ def train_sorry_gan():
         500,
         0.01
     )
-    with open('luci/models/sorry', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/sorry')
 
     logging.info('\nsorry GAN total loss: %s', loss[-1])
 
@@ -559,8 +546,7 @@ def train_suicide_gan():
         500,
         0.01
     )
-    with open('luci/models/suicide', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/suicide')
 
     logging.info('\nsuicide GAN total loss: %s', loss[-1])
 
@@ -588,8 +574,7 @@ def train_sports_and_playing_gan():
         500,
         0.01
     )
-    with open('luci/models/sports_and_playing', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/sports_and_playing')
 
     logging.info('\nsports_and_playing GAN total loss: %s', loss[-1])
 
@@ -617,8 +602,7 @@ def train_threat_gan():
         500,
         0.01
     )
-    with open('luci/models/threat', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/threat')
 
     logging.info('\nthreat GAN total loss: %s\n', loss[-1])
 
@@ -646,8 +630,7 @@ def train_verbal_offense_gan():
         500,
         0.01
     )
-    with open('luci/models/verbal_offense', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/verbal_offense')
 
     logging.info('\nverbal_offense GAN total loss: %s\n', loss[-1])
 
@@ -675,8 +658,7 @@ def train_what_am_i_gan():
         500,
         0.01
     )
-    with open('luci/models/what_am_i', 'wb') as fpath:
-        pickle.dump([parameters, chars_to_idx, idx_to_chars], fpath)
+    export_bundle([parameters, chars_to_idx, idx_to_chars], 'luci/models/what_am_i')
 
     logging.info('\nwhat_am_i GAN total loss: %s', loss[-1])
 
@@ -691,8 +673,7 @@ def train_global_intentions():
     samples, targets = get_data_from_json(path)
 
     model.fit(samples, targets)
-    with open('luci/models/global_intentions', 'wb') as fpath:
-        pickle.dump(model, fpath)
+    export_bundle(model, 'luci/models/global_intentions')
 
     # returns the number o data samples learned
     return len(targets)
@@ -708,8 +689,7 @@ def train_myself_intentions():
     samples, targets = get_data_from_json(path)
 
     model.fit(samples, targets)
-    with open('luci/models/myself_intentions', 'wb') as fpath:
-        pickle.dump(model, fpath)
+    export_bundle(model, 'luci/models/myself_intentions')
 
     return len(targets)
 
@@ -724,8 +704,7 @@ def train_bad_intentions():
     samples, targets = get_data_from_json(path)
 
     model.fit(samples, targets)
-    with open('luci/models/bad_intentions', 'wb') as fpath:
-        pickle.dump(model, fpath)
+    export_bundle(model, 'luci/models/bad_intentions')
 
     return len(targets)
 
@@ -740,8 +719,7 @@ def train_good_intentions():
     samples, targets = get_data_from_json(path)
 
     model.fit(samples, targets)
-    with open('luci/models/good_intentions', 'wb') as fpath:
-        pickle.dump(model, fpath)
+    export_bundle(model, 'luci/models/good_intentions')
 
     return len(targets)
 
@@ -756,8 +734,7 @@ def train_about_my_friends_intentions():
     samples, targets = get_data_from_json(path)
     
     model.fit(samples, targets)
-    with open('luci/models/friends_intentions', 'wb') as fpath:
-        pickle.dump(model, fpath)
+    export_bundle(model, 'luci/models/friends_intentions')
 
     return len(targets)
 
@@ -772,8 +749,7 @@ def train_about_my_parents_intentions():
     samples, targets = get_data_from_json(path)
 
     model.fit(samples, targets)
-    with open('luci/models/parents_intentions', 'wb') as fpath:
-        pickle.dump(model, fpath)
+    export_bundle(model, 'luci/models/parents_intentions')
 
     return len(targets)
 
@@ -788,8 +764,7 @@ def train_stuff_i_like_intentions():
     samples, targets = get_data_from_json(path)
 
     model.fit(samples, targets)
-    with open('luci/models/stuff_i_like_intentions', 'wb') as fpath:
-        pickle.dump(model, fpath)
+    export_bundle(model, 'luci/models/stuff_i_like_intentions')
 
     return len(targets)
 
@@ -880,7 +855,3 @@ def no_free_lunch():
     # print(f"test set score: {np.mean(pred == y_test):.2f}")
     # print(metrics.precision_score(y_test, pred, average='weighted'))
 
-
-logging.info('Loading spacy...')
-nlp = load_spacy()
-logging.info('... done!')
@@ -1,28 +1,147 @@
 import json
-from typing import Optional, DefaultDict, Dict
+import zlib
+from typing import Optional, DefaultDict, Dict, List, NamedTuple
 from collections import defaultdict
+import numpy as np
 
 
 class CompressedDict:
     """
     Comprime um dicionário em formato binário para armazenamento robusto.
+
+    O valor binário começa com um byte de cabeçalho indicando o formato:
+        0x01 : json compacto (utf-8);
+        0x02 : json compacto comprimido com zlib.
+
+    A compressão só é aplicada a partir de COMPRESSION_THRESHOLD bytes, onde
+    passa a compensar. Valores antigos, gravados como json puro, não possuem
+    cabeçalho e continuam sendo lidos normalmente.
+
+    O conteúdo é decodificado apenas uma vez por objeto, no primeiro acesso.
     """
+    RAW = 0x01
+    ZLIB = 0x02
+    COMPRESSION_THRESHOLD = 256
+    COMPRESSION_LEVEL = 1
+
     def __init__(self, data: Dict[str, int]) -> None:
+        self._data = None
         self._compress(data)
 
     def _compress(self, data: Dict[str, int]) -> None:
-        self.bit_string = json.dumps(data).encode('utf-8')
+        self.bit_string = CompressedDict.encode(data)
 
     def decompress(self) -> DefaultDict[str, int]:
-        return json.loads(self.bit_string.decode('utf-8'))
+        if self._data is None:
+            self._data = CompressedDict.decode(self.bit_string)
+        return self._data
+
+    @staticmethod
+    def from_bytes(bit_string: bytes) -> 'CompressedDict':
+        """
+        Instancia o objeto a partir de um valor já codificado, sem
+        decodificá-lo.
+        """
+        compressed = CompressedDict.__new__(CompressedDict)
+        compressed._data = None
+        compressed.bit_string = bit_string
+        return compressed
+
+    @staticmethod
+    def encode(data: Dict[str, int]) -> bytes:
+        payload = json.dumps(
+            data, separators=(',', ':'), ensure_ascii=False
+        ).encode('utf-8')
+
+        if len(payload) >= CompressedDict.COMPRESSION_THRESHOLD:
+            compressed = zlib.compress(payload, CompressedDict.COMPRESSION_LEVEL)
+            if len(compressed) < len(payload):
+                return bytes([CompressedDict.ZLIB]) + compressed
+
+        return bytes([CompressedDict.RAW]) + payload
+
+    @staticmethod
+    def decode(bit_string: bytes) -> Dict[str, int]:
+        if not bit_string:
+            return {}
+
+        header, payload = bit_string[0], bit_string[1:]
+        if header == CompressedDict.ZLIB:
+            payload = zlib.decompress(payload)
+        elif header != CompressedDict.RAW:
+            # formato antigo: json puro, sem cabeçalho
+            payload = bit_string
+
+        return json.loads(payload.decode('utf-8'))
 
     @staticmethod
     def decompress_bytes(bit_string: bytes) -> Dict[str, int]:
-        data = json.loads(bit_string.decode('utf-8')) if bit_string else {}
-        return defaultdict(int, data)
+        return defaultdict(int, CompressedDict.decode(bit_string))
 
     def __repr__(self) -> str:
         return repr(self.decompress())
 
     def __getitem__(self, key: str) -> Optional:
-        return self.decompress().get(key)
\ No newline at end of file
+        return self.decompress().get(key)
+
+
+class TextAnalysis(NamedTuple):
+    """
+    Resultado da análise de um texto pela LISA. Campos não solicitados ou
+    que falharam assumem valores neutros.
+    """
+    is_offensive: bool = False
+    polarity: float = 0
+    part_of_speech: Optional[List[Dict[str, str]]] = None
+
+    @staticmethod
+    def from_lisa(data: Optional[dict]) -> 'TextAnalysis':
+        data = data or {}
+        offense = data.get('textOffenseLevel') or {}
+
+        return TextAnalysis(
+            is_offensive=bool(offense.get('isOffensive', False)),
+            polarity=data.get('sentimentExtraction') or 0,
+            part_of_speech=data.get('partOfSpeech')
+        )
+
+
+class AnswerModel(NamedTuple):
+    """
+    Agente de geração de respostas treinado sobre um conjunto de mensagens
+    candidatas (ver core.reinforcement), com o grafo de transições entre os
+    tokens em formato CSR e um valor Q por aresta.
+    """
+    tokens: List[str]
+    indptr: np.ndarray
+    next_states: np.ndarray
+    rewards: np.ndarray
+    q_values: np.ndarray
+    exit_states: np.ndarray
+
+    def to_json(self) -> dict:
+        """
+        Retorna o agente em formato serializável em json.
+        """
+        return {
+            'tokens': self.tokens,
+            'indptr': self.indptr.tolist(),
+            'next_states': self.next_states.tolist(),
+            'rewards': self.rewards.tolist(),
+            'q_values': self.q_values.tolist(),
+            'exit_states': np.flatnonzero(self.exit_states).tolist(),
+        }
+
+    @staticmethod
+    def from_json(data: dict) -> 'AnswerModel':
+        exit_states = np.zeros(len(data['tokens']), dtype=bool)
+        exit_states[data['exit_states']] = True
+
+        return AnswerModel(
+            tokens=data['tokens'],
+            indptr=np.array(data['indptr'], dtype=np.int64),
+            next_states=np.array(data['next_states'], dtype=np.int32),
+            rewards=np.array(data['rewards'], dtype=np.int8),
+            q_values=np.array(data['q_values'], dtype=np.float64),
+            exit_states=exit_states,
+        )
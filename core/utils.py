@@ -1,22 +1,29 @@
 from string import ascii_letters
-from typing import Optional
+from functools import partial
+import asyncio
+import logging
 import re
 import base64
 import pickle
 from random import choice
-import spacy
 import wikipedia
-from redis import Redis
-from gql import Client
 from deep_translator import GoogleTranslator
-from gql.transport.requests import RequestsHTTPTransport
-from core.external_requests import Query
+from core.external_requests import Query, lisa_client
 from core.output_vectors import (intention_responses, opinions,
                                  propositions)
-from core.types import CompressedDict
-from luci.settings import REDIS_HOST, REDIS_PORT
+from core.types import CompressedDict, TextAnalysis
+from core.cache import TieredCache, text_digest
+from core.nlp import get_nlp
+from luci.settings import LISA_CACHE_SIZE, LISA_CACHE_TTL, LISA_CACHE_REDIS_TTL
 
-nlp = spacy.load('pt')
+log = logging.getLogger()
+
+# Análises da LISA já obtidas, por texto normalizado e campos solicitados
+lisa_cache = TieredCache(
+    'lisa', LISA_CACHE_SIZE, ttl=LISA_CACHE_TTL, redis_ttl=LISA_CACHE_REDIS_TTL,
+    encode=lambda analysis: CompressedDict.encode(analysis._asdict()),
+    decode=lambda value: TextAnalysis(**CompressedDict.decode(value))
+)
 
 
 def known_language_codes():
@@ -32,49 +39,66 @@ def known_language_codes():
             'hi', 'ur', 'hu', 'vi', 'is', 'cy', 'id', 'yi']
 
 
-def validate_text_offense(text):
+async def analyze_text(text, offense=True, sentiment=True, pos=False):
     """
-    Verify if an text message is offensive or not. Returns Tru if it is
-    offensive text. Returns False if its not offensive.
+    Requests LISA, in a single round trip, every analysis the caller needs.
+    Fields that fail are taken as neutral, so a partial answer is still used.
 
     param : text : <str> : Text input;
-    return: : <bool>
+    return : <TextAnalysis>
     """
-    request_offenssivnes = Query.get_text_offense(text)
-    if not request_offenssivnes:
-        return False
+    if not (offense or sentiment or pos):
+        return TextAnalysis()
+
+    # a análise morfológica depende da grafia original e não é guardada
+    cache_key = None
+    if not pos:
+        cache_key = f'{int(offense)}{int(sentiment)}:{text_digest(text)}'
+        cached = await lisa_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
     try:
-        is_offensive = request_offenssivnes['data']['textOffenseLevel']['isOffensive']
-    except KeyError:
-        # In case of failure, like an naive child, take as False
-        return False
-    else:
-        # Otherwise return the value calculated by LISA
-        return is_offensive
+        response = await lisa_client.post(
+            Query.get_text_analysis(text, offense, sentiment, pos)
+        )
+    except Exception as err:
+        log.error(f'Erro: {str(err)}\n\n')
+        return TextAnalysis()
+
+    analysis = TextAnalysis.from_lisa(response.get('data'))
+
+    if response.get('errors'):
+        log.error(f'Erro: {str(response["errors"])}\n\n')
+    elif cache_key:
+        # apenas respostas completas são guardadas
+        await lisa_cache.set(cache_key, analysis)
 
+    return analysis
 
-def extract_sentiment(text):
+
+def validate_text_offense(analysis):
     """
-    Extracts sentiment polarity from text, returning a integer value
-    between -1 and 1. In any failure case, consider it neutral (0).
+    Verify if an text message is offensive or not. Returns Tru if it is
+    offensive text. Returns False if its not offensive.
 
-    param : text : <str>
-    return : <int>
+    In case of failure, like an naive child, take as False.
+
+    param : analysis : <TextAnalysis> : LISA analysis of the text;
+    return: : <bool>
     """
-    request_sentiment = Query.get_text_sentiment(text)
+    return analysis.is_offensive
 
-    if not request_sentiment:
-        return 0
 
-    try:
-        polarity = request_sentiment['data']['sentimentExtraction']
-    except KeyError:
-        return 0
-    else:
-        return polarity if polarity else 0
+def extract_sentiment(analysis):
+    """
+    Extracts sentiment polarity from text, returning a integer value
+    between -1 and 1. In any failure case, consider it neutral (0).
 
-    return 0
+    param : analysis : <TextAnalysis> : LISA analysis of the text;
+    return : <int>
+    """
+    return analysis.polarity
 
 
 def make_hash(descriptor, _id):
@@ -88,33 +112,20 @@ def make_hash(descriptor, _id):
     return base64.b64encode(b'%s' % f'{descriptor}:{_id}'.encode('utf-8'))
 
 
-def get_gql_client(url, auth=None):
+async def run_blocking(func, *args, **kwargs):
     """
-    Retorna um client de execução de requisições graphql.
-    param : auth : <str> : hash de autorização.
+    Executa uma função bloqueante (CPU ou I/O síncrono) no executor padrão do
+    event loop, sem travar o processamento das demais mensagens.
     """
-    if not auth:
-        transport = RequestsHTTPTransport(url=url, use_json=True)
-    else:
-        headers = {
-            'content-type': 'application/json',
-            'auth': '{}'.format(auth)
-        }
-        transport = RequestsHTTPTransport(
-            url=url,
-            use_json=True,
-            headers=headers
-    )
-
-    client = Client(transport=transport, fetch_schema_from_transport=False)
-    return client
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, partial(func, *args, **kwargs))
 
 
 def get_text_vector(text):
     """
     Receives a string text input and returns its vector.
     """
-    return nlp(text).vector
+    return get_nlp()(text).vector
 
 
 def remove_id(string):
@@ -127,26 +138,33 @@ def remove_id(string):
     return string
 
 
-def get_wiki(text):
+async def get_wiki(text):
     """
     Return a list of explanations for a each term inputed.
     """
     error_response = ['N-não..', 'Não sei...']
-    data = Query.get_pos(text)
+    analysis = await analyze_text(text, offense=False, sentiment=False, pos=True)
 
-    wiki = wikipedia
-    wiki.set_lang('pt')
-
-    if not data:
+    if not analysis.part_of_speech:
         return error_response
 
-    tokens = [token['token'] for token in data['data']['partOfSpeech']
+    tokens = [token['token'] for token in analysis.part_of_speech
               if token['description'] == 'substantivo'
               or token['description'] == 'nome próprio']
 
     if len(tokens) > 3:
         return [get_random_blahblahblah()]
 
+    return await run_blocking(get_wiki_summaries, tokens, error_response)
+
+
+def get_wiki_summaries(tokens, error_response):
+    """
+    Consulta na wikipedia o resumo de cada termo (bloqueante).
+    """
+    wiki = wikipedia
+    wiki.set_lang('pt')
+
     try:
         response = [wiki.summary(token, sentences=2) for token in tokens]
     except (wiki.exceptions.DisambiguationError, wiki.exceptions.PageError):
@@ -235,38 +253,6 @@ def translate_text(text, lang):
     return GoogleTranslator(target=lang).translate(text)
 
 
-def get_short_memory_value(key: str) -> dict:
-    """
-    Recupera um valor da memória de curto prazo.
-    Caso o valor não exista, retorna uma estrutura default
-    """
-    short_memory = Redis(REDIS_HOST, REDIS_PORT)
-    memory = short_memory.get(key)
-
-    if memory:
-        return CompressedDict.decompress_bytes(memory)
-
-    # Se não houver memórias vamos instanciar uma nova memória
-    memory = {
-        'last_message_dt': None,
-        'last_quotes': [],
-        'chat_log': []
-    }
-    short_memory.set(key, CompressedDict(memory).bit_string)
-
-    return memory
-
-
-def set_short_memory_value(key: str, value: Optional) -> bool:
-    """
-    Atualiza um valor da memória de curto prazo.
-    """
-    short_memory = Redis(REDIS_HOST, REDIS_PORT)
-    result = short_memory.set(key, CompressedDict(value).bit_string)
-
-    return result
-
-
 def dist(a, b):
     """ Verifica a distancia entre duas letras do alfabeto """
     b_value = ascii_letters.index(b) + 1
@@ -1,7 +1,7 @@
 """
 LUCI settings module.
 """
-from decouple import config
+from decouple import config, Csv
 
 __version__ = '0.2.12'
 
@@ -14,3 +14,76 @@ REDIS_HOST = config('REDIS_HOST', 'localhost')
 REDIS_PORT = config('REDIS_PORT', '')
 
 MAIN_CHANNEL = config('MAIN_CHANNEL', '')
+
+# Modelo de linguagem e componentes desabilitados (apenas vetores são usados)
+SPACY_MODEL = config('SPACY_MODEL', 'pt')
+SPACY_DISABLED_PIPES = config('SPACY_DISABLED_PIPES', 'parser,ner', cast=Csv())
+
+# Pool de conexões http com LISA e backend (um pool por upstream)
+HTTP_TIMEOUT = config('HTTP_TIMEOUT', 10, cast=float)
+HTTP_POOL_SIZE = config('HTTP_POOL_SIZE', 20, cast=int)
+HTTP_MAX_CONCURRENCY = config('HTTP_MAX_CONCURRENCY', 50, cast=int)
+HTTP_KEEPALIVE_TIMEOUT = config('HTTP_KEEPALIVE_TIMEOUT', 30, cast=float)
+HTTP_RETRIES = config('HTTP_RETRIES', 2, cast=int)
+HTTP_BACKOFF = config('HTTP_BACKOFF', 0.2, cast=float)
+
+# Envio em lote (write-behind) das mutações para o backend
+WRITE_BEHIND_BATCH_SIZE = config('WRITE_BEHIND_BATCH_SIZE', 50, cast=int)
+WRITE_BEHIND_FLUSH_INTERVAL = config('WRITE_BEHIND_FLUSH_INTERVAL', 5, cast=float)
+WRITE_BEHIND_MAX_PENDING = config('WRITE_BEHIND_MAX_PENDING', 5000, cast=int)
+
+# Intervalo (segundos) para envio dos deltas de humor acumulados
+EMOTION_FLUSH_INTERVAL = config('EMOTION_FLUSH_INTERVAL', 60, cast=float)
+# Máximo de mensagens de um membro registradas por intervalo (as mais recentes)
+EMOTION_MESSAGES_PER_USER = config('EMOTION_MESSAGES_PER_USER', 5, cast=int)
+
+# Pool de conexões com o redis (memória de curto prazo)
+REDIS_MAX_CONNECTIONS = config('REDIS_MAX_CONNECTIONS', 50, cast=int)
+REDIS_SOCKET_TIMEOUT = config('REDIS_SOCKET_TIMEOUT', 5, cast=float)
+
+# Cache das análises da LISA: itens e validade (segundos) da memória local e
+# validade da camada compartilhada no redis (0 desativa a camada)
+LISA_CACHE_SIZE = config('LISA_CACHE_SIZE', 10000, cast=int)
+LISA_CACHE_TTL = config('LISA_CACHE_TTL', 3600, cast=float)
+LISA_CACHE_REDIS_TTL = config('LISA_CACHE_REDIS_TTL', 86400, cast=int)
+
+# Quantidade de previsões de intenção guardadas em cache
+INTENTION_CACHE_SIZE = config('INTENTION_CACHE_SIZE', 10000, cast=int)
+
+# Busca de vizinhos do modelo de intenções sobre a Luci: "brute" (NumPy
+# vetorizado, float32) ou "sklearn"
+NEIGHBORS_BACKEND = config('NEIGHBORS_BACKEND', 'brute')
+
+# Modelos treinados: diretório, memória máxima (MB) ocupada pelos geradores
+# de texto carregados e carregamento antecipado na inicialização do bot
+MODELS_DIR = config('MODELS_DIR', 'luci/models')
+MODELS_GENERATORS_MEMORY_MB = config('MODELS_GENERATORS_MEMORY_MB', 64, cast=float)
+MODELS_WARM_UP = config('MODELS_WARM_UP', True, cast=bool)
+
+# Carrega os arrays dos modelos exportados como bundle mapeados em memória,
+# compartilhando as páginas entre os processos do mesmo host
+MODELS_MMAP = config('MODELS_MMAP', True, cast=bool)
+
+# Intervalo (segundos) da verificação de modelos retreinados em disco, que
+# são recarregados sem reiniciar o bot. 0 desativa a verificação.
+MODELS_WATCH_INTERVAL = config('MODELS_WATCH_INTERVAL', 0, cast=float)
+
+# Respostas pré-geradas por gerador de texto: capacidade de cada pool, tamanho
+# abaixo do qual ela é reabastecida e intervalo (segundos) das verificações.
+# RESPONSE_POOL_SIZE 0 desativa as pools.
+RESPONSE_POOL_SIZE = config('RESPONSE_POOL_SIZE', 20, cast=int)
+RESPONSE_POOL_LOW_WATERMARK = config('RESPONSE_POOL_LOW_WATERMARK', 5, cast=int)
+RESPONSE_POOL_REFILL_INTERVAL = config('RESPONSE_POOL_REFILL_INTERVAL', 30, cast=float)
+
+# Pool de processos das respostas pesadas de CPU (aprendizado por reforço e
+# geradores de texto): número de processos (0 usa as threads do event loop)
+# e prazo padrão, em segundos, antes de usar uma resposta mais barata
+CPU_EXECUTOR_WORKERS = config('CPU_EXECUTOR_WORKERS', 2, cast=int)
+CPU_EXECUTOR_TIMEOUT = config('CPU_EXECUTOR_TIMEOUT', 5, cast=float)
+
+# Cache dos agentes de resposta treinados por aprendizado por reforço, pelas
+# mensagens candidatas: itens e validade (segundos) locais, e validade no
+# redis (0 desativa a camada compartilhada)
+ANSWER_MODEL_CACHE_SIZE = config('ANSWER_MODEL_CACHE_SIZE', 256, cast=int)
+ANSWER_MODEL_CACHE_TTL = config('ANSWER_MODEL_CACHE_TTL', 3600, cast=float)
+ANSWER_MODEL_CACHE_REDIS_TTL = config('ANSWER_MODEL_CACHE_REDIS_TTL', 86400, cast=int)
@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import sys
 from luci.settings import TOKEN, SETTINGS_MODULE, __version__
 from core.commands import client
@@ -20,4 +21,9 @@ if __name__ == '__main__':
     )
     log.info('Running LUCI version: %s\n', __version__)
 
+    # os processos do executor de CPU partem de um servidor de fork sem
+    # threads, que já importou os módulos das tarefas
+    multiprocessing.set_start_method('forkserver')
+    multiprocessing.set_forkserver_preload(['core.gans', 'core.reinforcement'])
+
     client.run(TOKEN)
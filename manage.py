@@ -1,6 +1,10 @@
 import sys
 from luci.settings import __version__
 from core.training.train import train_bot, no_free_lunch
+from core.model_loader import model_registry
+from core.benchmarks import (benchmark_compressed_dict, benchmark_intentions,
+                             benchmark_intentions_batch, benchmark_neighbors,
+                             benchmark_generators, benchmark_generators_batch)
 
 
 def help_message():
@@ -20,6 +24,34 @@ interface = {
         'runner': no_free_lunch,
         'help': 'Test models scores.'
     },
+    'benchmark_memory': {
+        'runner': benchmark_compressed_dict,
+        'help': 'Benchmark short memory serialization (size and speed).'
+    },
+    'benchmark_intentions': {
+        'runner': benchmark_intentions,
+        'help': 'Benchmark intention classification (µs per message).'
+    },
+    'benchmark_intentions_batch': {
+        'runner': benchmark_intentions_batch,
+        'help': 'Benchmark batched intention classification (texts per second).'
+    },
+    'benchmark_neighbors': {
+        'runner': benchmark_neighbors,
+        'help': 'Benchmark the myself intentions nearest neighbours backends.'
+    },
+    'benchmark_generators': {
+        'runner': benchmark_generators,
+        'help': 'Benchmark the char-RNN response samplers (µs per reply).'
+    },
+    'benchmark_generators_batch': {
+        'runner': benchmark_generators_batch,
+        'help': 'Benchmark batched generation of response candidates (µs per call).'
+    },
+    'export_models': {
+        'runner': model_registry.export_bundles,
+        'help': 'Export the trained models to the memory mappable bundle format.'
+    },
     'help': {
         'runner': help_message,
         'help': 'Shows this message.'